@@ -42,6 +42,8 @@ from pitivi.shortcuts import show_shortcuts
 from pitivi.undo.project import ProjectObserver
 from pitivi.undo.undo import UndoableActionLog
 from pitivi.utils import loggable
+from pitivi.utils.compression import read_project_file
+from pitivi.utils.encoderpresets import UnusedPresetsCollector
 from pitivi.utils.loggable import Loggable
 from pitivi.utils.misc import path_from_uri
 from pitivi.utils.misc import quote_uri
@@ -139,6 +141,7 @@ class Pitivi(Gtk.Application, Loggable):
         self.info('starting up')
         self._setup()
         self._checkVersion()
+        self.__removeUnusedEncoderPresets()
 
     def _setup(self):
         self.settings = GlobalSettings()
@@ -158,6 +161,12 @@ class Pitivi(Gtk.Application, Loggable):
         self._createActions()
         self._syncDoUndo()
 
+    def __removeUnusedEncoderPresets(self):
+        uris = [item.get_uri() for item in self.recent_manager.get_items()
+                if item.get_uri().endswith(".xges") and
+                Gst.uri_get_protocol(item.get_uri()) == "file"]
+        self.threads.addThread(UnusedPresetsCollector, uris)
+
     def _createActions(self):
         self.shortcuts.register_group("app", _("General"), position=10)
         self.undo_action = Gio.SimpleAction.new("undo", None)
@@ -261,16 +270,16 @@ class Pitivi(Gtk.Application, Loggable):
 
         if project_path and not project_path.endswith(".scenario"):
             # It's an xges file probably.
-            with open(project_path) as project:
-                content = project.read().replace("\n", "")
-                self.write_action("load-project",
-                                  serialized_content=content)
+            content = read_project_file(project_path).decode().replace("\n", "")
+            self.write_action("load-project",
+                              serialized_content=content)
 
     def _newProjectLoadingCb(self, unused_project_manager, project):
-        self._setScenarioFile(project.get_uri())
+        # The project might be loaded from an uncompressed copy.
+        self._setScenarioFile(project.uri)
 
     def _newProjectLoaded(self, unused_project_manager, project):
-        uri = project.get_uri()
+        uri = project.uri
         if uri:
             # We remove the project from recent projects list
             # and then re-add it to this list to make sure it
@@ -287,6 +296,7 @@ class Pitivi(Gtk.Application, Loggable):
         self.action_log.connect("commit", self._actionLogCommit)
         self.action_log.connect("move", self._action_log_move_cb)
         self.project_observer = ProjectObserver(project, self.action_log)
+        self.project_manager.startJournal(self.action_log)
 
     def __project_saved_cb(self, unused_project_manager, unused_project, uri):
         if uri:
@@ -18,10 +18,11 @@
 # Boston, MA 02110-1301, USA.
 # TODO reimplement after GES port
 """Automatic alignment of `Clip`s."""
-import array
 import os
 import time
 
+from gi.repository import GES
+from gi.repository import GLib
 from gi.repository import Gst
 from gi.repository import Gtk
 
@@ -37,6 +38,8 @@ import pitivi.configure as configure
 
 from pitivi.utils.ui import beautify_ETA
 from pitivi.utils.misc import call_false
+from pitivi.utils.extract import AudioExtractionPool
+from pitivi.utils.extract import AudioExtractor
 from pitivi.utils.extract import Extractee
 from pitivi.utils.loggable import Loggable
 
@@ -128,50 +131,71 @@ def rigidalign(reference, targets):
     return shifts
 
 
-def _findslope(a):
+def _windowxcorr(segment, window):
     # Helper function for affinealign
-    # The provided matrix a contains a bright line whose slope we want to know,
-    # against a noisy background.
-    # The line starts at 0,0.  If the slope is positive, it runs toward the
-    # center of the matrix (i.e. toward (-1,-1))
-    # If the slope is negative, it wraps from 0,0 to 0,-1 and continues toward
-    # the center, (i.e. toward (-1,0)).
-    # The line segment terminates at the midline along the X direction.
-    # We locate the line by simply checking the sum along each possible line
-    # up to the Y-max edge of a.  The caller sets the limit by choosing the
-    # size of a.
-    # The function returns a floating-point slope assuming that the matrix
-    # has "square pixels".
-    Y, X = a.shape
-    X /= 2
-    x_pos = numpy.arange(1, X)
-    x_neg = numpy.arange(2 * X - 1, X, -1)
-    best_end = 0
-    max_sum = 0
-    for end in range(Y):
-        y = (x_pos * end) // X
-        s = numpy.sum(a[y, x_pos])
-        if s > max_sum:
-            max_sum = s
-            best_end = end
-        s = numpy.sum(a[y, x_neg])
-        if s > max_sum:
-            max_sum = s
-            best_end = -end
-    return float(best_end) / X
-
-
-def affinealign(reference, targets, max_drift=0.02):
-    """ EXPERIMENTAL FUNCTION.
-
-    Perform an affine registration between a reference and a number of
-    targets.  Designed for aligning the amplitude envelopes of recordings of
-    the same event by different devices.
-
-    NOTE: This method is currently NOT USED by Pitivi, as it has proven both
-    unnecessary and unusable.  So far every test case has been registered
-    successfully by rigidalign, and until Pitivi supports time-stretching of
-    audio, the drift calculation cannot actually be used.
+    # Returns the position in segment at which window fits best, with
+    # subsample precision, and the normalized correlation at that position.
+    # segment must be at least as long as window, and both must have
+    # their mean removed.
+    W = len(window)
+    lags = len(segment) - W + 1
+    L = nextpow2(len(segment) + W - 1)
+    xcorr = numpy.fft.irfft(numpy.fft.rfft(segment, L) *
+                            numpy.fft.rfft(window, L).conj(), L)[:lags]
+    lag = int(numpy.argmax(xcorr))
+    if 0 < lag < lags - 1:
+        sublag = lag + submax(xcorr[lag - 1], xcorr[lag], xcorr[lag + 1])
+    else:
+        sublag = lag
+    # The energy of segment[lag:lag + W], from the running sum of squares.
+    energies = numpy.concatenate(([0.0], numpy.cumsum(segment ** 2)))
+    energy = energies[lag + W] - energies[lag]
+    norm = numpy.sqrt(energy * numpy.sum(window ** 2))
+    if norm <= 0:
+        return sublag, 0.0
+    return sublag, xcorr[lag] / norm
+
+
+def _robustlinefit(x, y, weights, iterations=3):
+    # Helper function for affinealign
+    # Fits y = intercept + slope * x by weighted least squares, discarding
+    # the points which lie far from the line, as windows falling on silence
+    # or on repetitive material produce spurious matches.
+    keep = numpy.ones(len(x), dtype=bool)
+    for unused_i in range(iterations):
+        if numpy.count_nonzero(keep) < 2:
+            return None
+        slope, intercept = numpy.polyfit(x[keep], y[keep], 1,
+                                         w=weights[keep])
+        residuals = numpy.abs(y - (intercept + slope * x))
+        # Accept one sample of error in any case.
+        threshold = max(3 * numpy.median(residuals[keep]), 1.0)
+        new_keep = keep & (residuals <= threshold)
+        if numpy.array_equal(new_keep, keep):
+            break
+        keep = new_keep
+    if numpy.count_nonzero(keep) < 2:
+        return None
+    return intercept, slope
+
+
+def affinealign(reference, targets, max_drift=0.02, window_size=None):
+    """
+    Perform an affine registration between a reference and targets.
+
+    Designed for aligning the amplitude envelopes of recordings of the
+    same event by different devices, whose clocks drift relative to each
+    other.
+
+    The coarse position of each target is found first with
+    L{rigidalign}.  The target is then cut into windows, and each window
+    is correlated only against the part of the reference where it can
+    possibly be found, given the coarse position and max_drift.  A line
+    is fitted through the positions where the windows matched: its
+    intercept is the offset and its slope gives the drift.  For a target
+    of length M{N} cut into M{K} windows of size M{W}, the running time
+    of the windowed part is M{O(K*S*log(S))}, with M{S=W+2*max_drift*N},
+    instead of M{O(K*N*log(N))} for correlating full-length signals.
 
     @param reference: the reference signal to which others will be registered
     @type reference: array(number)
@@ -180,110 +204,68 @@ def affinealign(reference, targets, max_drift=0.02):
     @param max_drift: the maximum absolute clock drift rate
                   (i.e. stretch factor) that will be considered during search
     @type max_drift: positive L{float}
+    @param window_size: the number of samples in each window, or None to
+                  pick one based on the length of each target
+    @type window_size: L{int}
     @return: (offsets, drifts).  offsets[i] is the point in reference at which
            targets[i] starts.  drifts[i] is the speed of targets[i] relative to
            the reference (positive is faster, meaning the target should be
-           slowed down to be in sync with the reference)
+           slowed down to be in sync with the reference).  Sample n of
+           targets[i] corresponds to the position
+           offsets[i] + (1 + drifts[i]) * n in reference.
     """
-    L = len(reference) + max(len(t) for t in targets) - 1
-    L2 = nextpow2(L)
-    bsize = int(20. / max_drift)  # NEEDS TUNING
-    num_blocks = nextpow2(1.0 * len(reference) // bsize)  # NEEDS TUNING
-    bspace = (len(reference) - bsize) // num_blocks
-    reference -= numpy.mean(reference)
-
-    # Construct FFT'd reference blocks
-    freference_blocks = numpy.zeros((L2 / 2 + 1, num_blocks),
-                                    dtype=numpy.complex)
-    for i in range(num_blocks):
-        s = i * bspace
-        tmp = numpy.zeros((L2,))
-        tmp[s:s + bsize] = reference[s:s + bsize]
-        freference_blocks[:, i] = numpy.fft.rfft(tmp, L2).conj()
-    freference_blocks[:10, :] = 0  # High-pass to ignore slow volume variations
+    reference = numpy.asarray(reference, dtype=numpy.float64)
+    reference = reference - numpy.mean(reference)
+    targets = [numpy.asarray(t, dtype=numpy.float64) for t in targets]
+    coarse_offsets = rigidalign(reference, targets)
 
     offsets = []
     drifts = []
-    for t in targets:
-        t -= numpy.mean(t)
-        ft = numpy.fft.rfft(t, L2)
-        # fxcorr is the FFT'd cross-correlation with the reference blocks
-        fxcorr_blocks = numpy.zeros((L2 / 2 + 1, num_blocks),
-                                    dtype=numpy.complex)
-        for i in range(num_blocks):
-            fxcorr_blocks[:, i] = ft * freference_blocks[:, i]
-            fxcorr_blocks[:, i] /= numpy.sqrt(
-                numpy.sum(fxcorr_blocks[:, i] ** 2))
-        del ft
-        # At this point xcorr_blocks would show a distinct bright line, nearly
-        # orthogonal to time, indicating where each of these blocks found their
-        # peak.  Each point on this line represents the time in t where block i
-        # found its match.  The time-intercept gives the time in b at which the
-        # reference starts, and the slope gives the amount by which the
-        # reference is faster relative to b.
-
-        # The challenge now is to find this line.  Our strategy is to reduce the
-        # search to one dimension by first finding the slope.
-        # The Fourier Transform of a smooth real line in 2D is an orthogonal
-        # line through the origin, with phase that gives its position.
-        # Unfortunately this line is not clearly visible in fxcorr_blocks, so
-        # we discard the phase (by taking the absolute value) and then inverse
-        # transform.  This places the line at the origin, so we can find its
-        # slope.
-
-        # Construct the half-autocorrelation matrix
-        # (A true autocorrelation matrix would be ifft(abs(fft(x))**2), but this
-        # is just ifft(abs(fft(x))).)
-        # Construction is stepwise partly in an attempt to save memory
-        # The width is 2*num_blocks in order to avoid overlapping positive and
-        # negative correlations
-        halfautocorr = numpy.fft.fft(fxcorr_blocks, 2 * num_blocks, 1)
-        halfautocorr = numpy.abs(halfautocorr)
-        halfautocorr = numpy.fft.ifft(halfautocorr, None, 1)
-        halfautocorr = numpy.fft.irfft(halfautocorr, None, 0)
-        # Now it's actually the half-autocorrelation.
-        # Chop out the bit we don't care about
-        halfautocorr = halfautocorr[:bspace * num_blocks * max_drift, :]
-        # Remove the local-correlation peak.
-        halfautocorr[-1:2, -1:2] = 0  # NEEDS TUNING
-        # Normalize each column (appears to be necessary)
-        for i in range(2 * num_blocks):
-            halfautocorr[:, i] /= numpy.sqrt(
-                numpy.sum(halfautocorr[:, i] ** 2))
-        drift = _findslope(halfautocorr) / bspace
-        del halfautocorr
-
-        # inverse transform and shift everything into alignment
-        xcorr_blocks = numpy.fft.irfft(fxcorr_blocks, None, 0)
-        del fxcorr_blocks
-        # TODO: see if phase ramps are worthwhile here
-        for i in range(num_blocks):
-            blockcenter = i * bspace + bsize / 2
-            shift = int(blockcenter * drift)
-            if shift > 0:
-                temp = xcorr_blocks[:shift, i].copy()
-                xcorr_blocks[:-shift, i] = xcorr_blocks[shift:, i].copy()
-                xcorr_blocks[-shift:, i] = temp
-            elif shift < 0:
-                temp = xcorr_blocks[shift:, i].copy()
-                xcorr_blocks[-shift:, i] = xcorr_blocks[:shift, i].copy()
-                xcorr_blocks[:-shift, i] = temp
-
-        # xcorr is the drift-compensated cross-correlation
-        xcorr = numpy.sum(xcorr_blocks, axis=1)
-        del xcorr_blocks
-
-        offset = numpy.argmax(xcorr)
-        del xcorr
-        if offset >= len(t):
-            offset -= L2
-
-        # now offset is the point in target at which reference starts and
-        # drift is the speed with which the reference drifts relative to the
-        # target.  We reverse these relationships for the caller.
-        slope = 1 + drift
-        offsets.append(-offset / slope)
-        drifts.append(1 / slope - 1)
+    for t, coarse_offset in zip(targets, coarse_offsets):
+        t = t - numpy.mean(t)
+        if window_size:
+            W = min(window_size, len(t))
+        else:
+            W = min(max(64, len(t) // 16), 1500)  # NEEDS TUNING
+        num_windows = max(2, min(64, len(t) // W))
+        # The furthest a window can be from the position predicted by the
+        # coarse offset.  The drift is accumulated on both sides of the
+        # point where the rigid alignment is exact.
+        radius = int(numpy.ceil(max_drift * len(t))) + W // 2
+
+        starts = numpy.linspace(0, len(t) - W, num_windows).astype(int)
+        centers = []
+        matches = []
+        weights = []
+        for start in starts:
+            window = t[start:start + W]
+            if not numpy.any(window):
+                continue
+            predicted = int(coarse_offset) + start
+            low = max(0, predicted - radius)
+            high = min(len(reference), predicted + W + radius)
+            if high - low < W:
+                # This part of the target is outside of the reference.
+                continue
+            position, correlation = _windowxcorr(reference[low:high], window)
+            if correlation <= 0:
+                continue
+            centers.append(start + W / 2)
+            matches.append(low + position + W / 2)
+            weights.append(correlation)
+
+        line = None
+        if len(centers) >= 2:
+            line = _robustlinefit(numpy.array(centers), numpy.array(matches),
+                                  numpy.array(weights))
+        if line is None or abs(line[1] - 1) > max_drift:
+            # Not enough reliable windows, stick to the rigid alignment.
+            offsets.append(coarse_offset)
+            drifts.append(0.0)
+            continue
+        intercept, slope = line
+        offsets.append(float(intercept))
+        drifts.append(float(slope - 1))
     return offsets, drifts
 
 
@@ -296,9 +278,9 @@ def getAudioTrack(clip):
     @returns: An audio track from clip, or None if clip has no audio track
     @rtype: audio L{TrackElement} or L{NoneType}
     """
-    for track in clip.track_elements:
-        if track.stream_type == AudioStream:
-            return track
+    for track_element in clip.get_children(False):
+        if track_element.get_track_type() == GES.TrackType.AUDIO:
+            return track_element
     return None
 
 
@@ -407,16 +389,15 @@ class EnvelopeExtractee(Extractee, Loggable):
         self._cb = callback
         self._cbargs = cbargs
         self._blocks = numpy.zeros((0,), dtype=numpy.float32)
-        self._empty = array.array('f', [])
         # self._samples buffers up to self._threshold samples, before
         # their envelope is computed and store in self._blocks, in order
         # to amortize some of the function call overheads.
-        self._samples = array.array('f', [])
+        self._samples = numpy.zeros((0,), dtype=numpy.float32)
         self._threshold = 2000 * blocksize
         self._progress_watchers = []
 
     def receive(self, a):
-        self._samples.extend(a)
+        self._samples = numpy.concatenate((self._samples, a))
         if len(self._samples) < self._threshold:
             return
         else:
@@ -439,10 +420,12 @@ class EnvelopeExtractee(Extractee, Loggable):
             self._samples = self._samples[-excess:]
         else:
             samples_to_process = self._samples
-            self._samples = array.array('f', [])
+            self._samples = numpy.zeros((0,), dtype=numpy.float32)
         self.debug("Adding %s samples to %s blocks",
                    len(samples_to_process), len(self._blocks))
         newblocks = len(samples_to_process) // self._blocksize
+        if not newblocks:
+            return
         samples_abs = numpy.abs(
             samples_to_process).reshape((newblocks, self._blocksize))
         self._blocks.resize((len(self._blocks) + newblocks,))
@@ -458,6 +441,11 @@ class EnvelopeExtractee(Extractee, Loggable):
         self._cb(self._blocks, *self._cbargs)
 
 
+class AlignmentMode:
+    RIGID = "rigid"
+    AFFINE = "affine"
+
+
 class AutoAligner(Loggable):
 
     """
@@ -486,7 +474,33 @@ class AutoAligner(Loggable):
 
     """
 
-    def __init__(self, clips, callback):
+    SAMPLERATE = 44100
+    """
+    @ivar SAMPLERATE: The samplerate at which the audio is extracted.
+
+    It is a multiple of BLOCKRATE, so each block contains the same number
+    of samples.
+
+    """
+
+    MAX_EXTRACTIONS = 2
+    """
+    @ivar MAX_EXTRACTIONS: The number of envelopes extracted concurrently.
+
+    """
+
+    MAX_DRIFT = 0.002
+    """
+    @ivar MAX_DRIFT: The maximum clock drift rate considered in
+    L{AlignmentMode.AFFINE} mode.
+
+    Consumer devices drift by tens of milliseconds per hour, i.e. a rate
+    in the order of 1e-5.  The search range is proportional to this
+    value, so it should not be much larger than needed.
+
+    """
+
+    def __init__(self, clips, callback, mode=AlignmentMode.RIGID):
         """
         @param clips: an iterable of L{Clip}s.
             In this implementation, only L{Clip}s with at least one
@@ -495,18 +509,21 @@ class AutoAligner(Loggable):
         @param callback: A function to call when alignment is complete.  No
             arguments will be provided.
         @type callback: function
+        @param mode: whether to estimate the clock drift of each clip
+            relative to the reference (L{AlignmentMode.AFFINE}) or only
+            its offset (L{AlignmentMode.RIGID}).
+        @type mode: L{str}
 
         """
         Loggable.__init__(self)
+        self._mode = mode
         # self._clips maps each object to its envelope.  The values
         # are initially None prior to envelope extraction.
         self._clips = dict.fromkeys(clips)
         self._callback = callback
-        # stack of (Track, Extractee) pairs waiting to be processed
-        # When start() is called, the stack will be populated, and then
-        # processed sequentially.  Only one item from the stack will be
-        # actively in process at a time.
-        self._extraction_stack = []
+        # The extractions of the envelopes, which run concurrently.
+        self._extraction_pool = AudioExtractionPool(self.MAX_EXTRACTIONS)
+        self._remaining_extractions = 0
 
     @staticmethod
     def canAlign(clips):
@@ -527,23 +544,19 @@ class AutoAligner(Loggable):
         # use the AutoAligner, which will crash immediately.
         return all(getAudioTrack(t) is not None for t in clips)
 
-    def _extractNextEnvelope(self):
-        audiotrack, extractee = self._extraction_stack.pop()
-        r = RandomAccessAudioExtractor(audiotrack.factory,
-                                       audiotrack.stream)
-        r.extract(extractee, audiotrack.in_point,
-                  audiotrack.out_point - audiotrack.in_point)
-        return False
-
     def _envelopeCb(self, array, clip):
         self.debug("Receiving envelope for %s", clip)
         self._clips[clip] = array
-        if self._extraction_stack:
-            self._extractNextEnvelope()
-        else:  # This was the last envelope
+        self._remaining_extractions -= 1
+        if not self._remaining_extractions:  # This was the last envelope
             self._performShifts()
             self._callback()
 
+    def _extractionErrorCb(self, error):
+        self.error("Aborting the alignment: %s", error)
+        self._extraction_pool.cancel()
+        self._callback()
+
     def start(self):
         """
         Initiate the auto-alignment process.
@@ -562,29 +575,28 @@ class AutoAligner(Loggable):
             else:  # forget any Clip without an audio track
                 self._clips.pop(clip)
         if len(pairs) >= 2:
+            self._remaining_extractions = len(pairs)
+            # blocksize is the number of samples per block
+            blocksize = self.SAMPLERATE // self.BLOCKRATE
             for clip, audiotrack in pairs:
-                # blocksize is the number of samples per block
-                blocksize = audiotrack.stream.rate // self.BLOCKRATE
                 extractee = EnvelopeExtractee(
                     blocksize, self._envelopeCb, clip)
                 # numsamples is the total number of samples in the track,
                 # which is used by progress_aggregator to determine
                 # the percent completion.
                 numsamples = ((audiotrack.duration / Gst.SECOND) *
-                              audiotrack.stream.rate)
+                              self.SAMPLERATE)
                 extractee.addWatcher(
                     progress_aggregator.getPortionCB(numsamples))
-                self._extraction_stack.append((audiotrack, extractee))
-            # After we return, start the extraction cycle.
-            # This GLib.idle_add call should not be necessary;
-            # we should be able to invoke _extractNextEnvelope directly
-            # here.  However, there is some as-yet-unexplained
-            # race condition between the Python GIL, GTK UI updates,
-            # GLib mainloop, and pygst multithreading, resulting in
-            # occasional deadlocks during autoalignment.
-            # This call to idle_add() reportedly eliminates the deadlock.
-            # No one knows why.
-            GLib.idle_add(self._extractNextEnvelope)
+                asset = clip.get_asset()
+                extractor = AudioExtractor(asset.get_id(),
+                                           audiotrack.in_point,
+                                           audiotrack.duration,
+                                           rate=self.SAMPLERATE,
+                                           channels=1,
+                                           block_size=2000 * blocksize)
+                self._extraction_pool.add(extractor, extractee,
+                                          self._extractionErrorCb)
         else:  # We can't do anything without at least two audio tracks
             # After we return, call the callback function (once)
             GLib.idle_add(call_false, self._callback)
@@ -618,23 +630,38 @@ class AutoAligner(Loggable):
         # (In python 3, dict.items() returns an unordered dictview)
         pairs = list(self._clips.items())
         envelopes = [p[1] for p in pairs]
-        offsets = rigidalign(reference_envelope, envelopes)
-        for (movable, envelope), offset in zip(pairs, offsets):
-            # tshift is the offset rescaled to units of nanoseconds
-            tshift = int((offset * Gst.SECOND) / self.BLOCKRATE)
-            self.debug("Shifting %s to %i ns from %i",
-                       movable, tshift, reference.start)
-            newstart = reference.start + tshift
-            if newstart >= 0:
-                movable.start = newstart
-            else:
-                # Timeline objects always must have a positive start point, so
-                # if alignment would move an object to start at negative time,
-                # we instead make it start at zero and chop off the required
-                # amount at the beginning.
-                movable.start = 0
-                movable.in_point = movable.in_point - newstart
-                movable.duration += newstart
+        if self._mode == AlignmentMode.AFFINE:
+            offsets, drifts = affinealign(reference_envelope, envelopes,
+                                          self.MAX_DRIFT)
+            # The clips cannot be time-stretched, so the drift is compensated
+            # by aligning the middle of each clip instead of its start,
+            # which halves the maximum desynchronization.
+            offsets = [offset + drift * len(envelope) / 2
+                       for offset, drift, envelope
+                       in zip(offsets, drifts, envelopes)]
+            for (movable, unused_envelope), drift in zip(pairs, drifts):
+                self.info("Estimated clock drift of %s: %f", movable, drift)
+        else:
+            offsets = rigidalign(reference_envelope, envelopes)
+        for (movable, unused_envelope), offset in zip(pairs, offsets):
+            self._shiftClip(reference, movable, offset)
+
+    def _shiftClip(self, reference, movable, offset):
+        # tshift is the offset rescaled to units of nanoseconds
+        tshift = int((offset * Gst.SECOND) / self.BLOCKRATE)
+        self.debug("Shifting %s to %i ns from %i",
+                   movable, tshift, reference.start)
+        newstart = reference.start + tshift
+        if newstart >= 0:
+            movable.start = newstart
+        else:
+            # Timeline objects always must have a positive start point, so
+            # if alignment would move an object to start at negative time,
+            # we instead make it start at zero and chop off the required
+            # amount at the beginning.
+            movable.start = 0
+            movable.in_point = movable.in_point - newstart
+            movable.duration += newstart
 
 
 class AlignmentProgressDialog:
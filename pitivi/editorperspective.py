@@ -24,6 +24,7 @@ from urllib.parse import unquote
 from gi.repository import Gdk
 from gi.repository import GES
 from gi.repository import Gio
+from gi.repository import GLib
 from gi.repository import Gtk
 
 from pitivi.clipproperties import ClipProperties
@@ -71,6 +72,21 @@ GlobalSettings.addConfigOption('lastProjectFolder',
                                environment="PITIVI_PROJECT_FOLDER",
                                default=os.path.expanduser("~"))
 
+PreferencesDialog.add_section("project", _("Project"))
+PreferencesDialog.addTogglePreference("compressProjects",
+                                      section="project",
+                                      label=_("Compress the project files"),
+                                      description=_(
+                                          "Whether the project files are compressed when saved. "
+                                          "Compressed project files are smaller and faster to write, "
+                                          "but older versions of Pitivi cannot open them."))
+PreferencesDialog.addTogglePreference("compressBackups",
+                                      section="project",
+                                      label=_("Compress the automatic backups"),
+                                      description=_(
+                                          "Whether the backups of the projects, saved automatically "
+                                          "after each change, are compressed."))
+
 
 class EditorPerspective(Perspective, Loggable):
     """Pitivi's Editor perspective.
@@ -85,10 +101,17 @@ class EditorPerspective(Perspective, Loggable):
 
         self.app = app
         self.settings = app.settings
+        # The (dialog, progressbar) showing the progress of the exports,
+        # by archiver.
+        self.__export_dialogs = {}
 
         self.builder = Gtk.Builder()
 
         pm = self.app.project_manager
+        pm.connect("new-project-loading",
+                   self._projectManagerNewProjectLoadingCb)
+        pm.connect("new-project-failed",
+                   self._projectManagerNewProjectFailedCb)
         pm.connect("new-project-loaded",
                    self._projectManagerNewProjectLoadedCb)
         pm.connect("save-project-failed",
@@ -407,15 +430,47 @@ class EditorPerspective(Perspective, Loggable):
         return self.app.project_manager.revertToSavedProject()
 
     def _exportProjectAsTarCb(self, unused_action):
-        uri = self._showExportDialog(self.app.project_manager.current_project)
-        result = None
+        uri, used_only, use_proxies = self._showExportDialog(
+            self.app.project_manager.current_project)
+        archiver = None
         if uri:
-            result = self.app.project_manager.exportProject(
-                self.app.project_manager.current_project, uri)
+            archiver = self.app.project_manager.exportProject(
+                self.app.project_manager.current_project, uri,
+                used_only=used_only, use_proxies=use_proxies,
+                progress_cb=self.__exportProgressCb,
+                done_cb=self.__exportDoneCb)
 
-        if not result:
+        if not archiver:
             self.log("Project couldn't be exported")
-        return result
+            return False
+
+        self.__showExportProgressDialog(archiver)
+        return True
+
+    def __showExportProgressDialog(self, archiver):
+        dialog = Gtk.Dialog(title=_("Exporting Project"),
+                            transient_for=self.app.gui)
+        dialog.add_buttons(_("Cancel"), Gtk.ResponseType.CANCEL)
+        progressbar = Gtk.ProgressBar()
+        progressbar.props.show_text = True
+        progressbar.props.margin = SPACING
+        dialog.get_content_area().pack_start(progressbar, True, True, 0)
+        dialog.connect("response", lambda unused_dialog, unused_response: archiver.abort())
+        dialog.show_all()
+        self.__export_dialogs[archiver] = (dialog, progressbar)
+
+    def __exportProgressCb(self, archiver):
+        unused_dialog, progressbar = self.__export_dialogs[archiver]
+        if archiver.total:
+            progressbar.set_fraction(archiver.written / archiver.total)
+        progressbar.set_text(_("%s of %s") % (
+            GLib.format_size(archiver.written), GLib.format_size(archiver.total)))
+
+    def __exportDoneCb(self, archiver, error):
+        dialog, unused_progressbar = self.__export_dialogs.pop(archiver)
+        dialog.destroy()
+        if error:
+            self.log("Project couldn't be exported: %s", error)
 
     def _projectSettingsCb(self, unused_action):
         self.showProjectSettingsDialog()
@@ -431,6 +486,14 @@ class EditorPerspective(Perspective, Loggable):
 
 # Project management callbacks
 
+    def _projectManagerNewProjectLoadingCb(self, unused_project_manager, project):
+        if project.uri:
+            # Show where the clips are until the assets are loaded.
+            self.timeline_ui.timeline.showSkeleton(project.uri)
+
+    def _projectManagerNewProjectFailedCb(self, unused_project_manager, unused_uri, unused_reason):
+        self.timeline_ui.timeline.hideSkeleton()
+
     def _projectManagerNewProjectLoadedCb(self, project_manager, project):
         """Starts connecting the UI to the specified project.
 
@@ -698,6 +761,16 @@ class EditorPerspective(Perspective, Loggable):
         chooser.set_select_multiple(False)
         chooser.props.do_overwrite_confirmation = True
 
+        options = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        used_only_check = Gtk.CheckButton.new_with_label(
+            _("Include only the media used in the timeline"))
+        use_proxies_check = Gtk.CheckButton.new_with_label(
+            _("Include the proxies instead of the original media"))
+        options.pack_start(used_only_check, False, False, 0)
+        options.pack_start(use_proxies_check, False, False, 0)
+        options.show_all()
+        chooser.set_extra_widget(options)
+
         asset = GES.Formatter.get_default()
         asset_extension = asset.get_meta(GES.META_FORMATTER_EXTENSION)
 
@@ -725,8 +798,10 @@ class EditorPerspective(Perspective, Loggable):
             self.log("User didn't choose a URI to export project to")
             ret = None
 
+        used_only = used_only_check.get_active()
+        use_proxies = use_proxies_check.get_active()
         chooser.destroy()
-        return ret
+        return ret, used_only, use_proxies
 
     def saveProjectAs(self):
         uri = self._showSaveAsDialog()
@@ -19,7 +19,10 @@
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
 import os
+import queue
+import threading
 import time
+from collections import OrderedDict
 from gettext import gettext as _
 from gettext import ngettext
 from hashlib import md5
@@ -50,8 +53,11 @@ from pitivi.utils.misc import path_from_uri
 from pitivi.utils.misc import PathWalker
 from pitivi.utils.misc import quote_uri
 from pitivi.utils.proxy import get_proxy_target
+from pitivi.utils.proxy import ProxyJobPriority
 from pitivi.utils.proxy import ProxyingStrategy
 from pitivi.utils.proxy import ProxyManager
+from pitivi.utils.search import SearchIndex
+from pitivi.utils.ui import asset_search_text
 from pitivi.utils.ui import beautify_asset
 from pitivi.utils.ui import beautify_ETA
 from pitivi.utils.ui import beautify_length
@@ -96,6 +102,9 @@ STORE_MODEL_STRUCTURE = (
  COL_SEARCH_TEXT,
  COL_THUMB_DECORATOR) = list(range(len(STORE_MODEL_STRUCTURE)))
 
+# The value of GTK_TREE_SORTABLE_UNSORTED_SORT_COLUMN_ID, not introspectable.
+UNSORTED_SORT_COLUMN_ID = -2
+
 # This whitelist is made from personal knowledge of file extensions in the wild,
 # from gst-inspect |grep demux,
 # http://en.wikipedia.org/wiki/Comparison_of_container_formats and
@@ -114,6 +123,23 @@ for category, mime_types in SUPPORTED_FILE_FORMATS.items():
     for mime in mime_types:
         SUPPORTED_MIMETYPES.append(category + "/" + mime)
 
+# Whether the files are supported, by lowercase extension.
+_supported_extensions = {}
+
+
+def is_supported_filename(name):
+    """Returns whether the file seems supported, judging by its name.
+
+    Can be called in any thread.
+    """
+    extension = os.path.splitext(name)[1].lower()
+    supported = _supported_extensions.get(extension)
+    if supported is None:
+        content_type, unused_uncertain = Gio.content_type_guess(name, None)
+        supported = Gio.content_type_get_mime_type(content_type) in SUPPORTED_MIMETYPES
+        _supported_extensions[extension] = supported
+    return supported
+
 
 class FileChooserExtraWidget(Gtk.Grid, Loggable):
     def __init__(self, app):
@@ -170,8 +196,152 @@ class FileChooserExtraWidget(Gtk.Grid, Loggable):
             self.app.settings.proxyingStrategy = ProxyingStrategy.AUTOMATIC
 
 
+class ThumbnailLoader(Loggable):
+    """Loads the thumbnails of the files in worker threads.
+
+    The thumbnails are taken from the user's cache dir or, for images, are
+    created by decoding the image at the thumbnail size. The loaded
+    thumbnails are kept in a LRU cache keyed by (uri, mtime, size), so
+    they are loaded again only when the file changes.
+    """
+
+    MAX_WORKERS = min(4, os.cpu_count() or 1)
+    # The maximum number of (small, large) thumbnails kept.
+    CACHE_SIZE = 1000
+
+    def __init__(self):
+        Loggable.__init__(self)
+        # The (small, large) thumbnails, by key, most recently used last.
+        self.__cache = OrderedDict()
+        # The callbacks of the requests being processed, by key.
+        self.__callbacks = {}
+        self.__requests = queue.Queue()
+        self.__workers = []
+
+    @staticmethod
+    def __key(uri):
+        try:
+            stat = os.stat(Gst.uri_get_location(uri))
+        except (OSError, TypeError):
+            return uri, None, None
+        return uri, stat.st_mtime_ns, stat.st_size
+
+    def __cached(self, key):
+        thumbnails = self.__cache.get(key)
+        if thumbnails is not None:
+            self.__cache.move_to_end(key)
+        return thumbnails
+
+    def __store(self, key, thumbnails):
+        self.__cache[key] = thumbnails
+        self.__cache.move_to_end(key)
+        while len(self.__cache) > self.CACHE_SIZE:
+            self.__cache.popitem(last=False)
+
+    def load_sync(self, uri, is_image):
+        """Gets the thumbnails of the specified file, in the calling thread.
+
+        Args:
+            uri (str): The URI of the file.
+            is_image (bool): Whether the file is an image.
+
+        Returns:
+            List[GdkPixbuf.Pixbuf]: The small and the large thumbnails,
+            or (None, None) if not available.
+        """
+        key = self.__key(uri)
+        thumbnails = self.__cached(key)
+        if thumbnails is None:
+            thumbnails = self.load_thumbnails(uri, is_image)
+            self.__store(key, thumbnails)
+        return thumbnails
+
+    def load(self, uri, is_image, callback):
+        """Gets the thumbnails of the specified file in a worker thread.
+
+        Args:
+            uri (str): The URI of the file.
+            is_image (bool): Whether the file is an image.
+            callback (function): Called in the main thread with the small
+                and the large thumbnails, which are None if not available.
+                Called right away if the thumbnails are cached.
+        """
+        key = self.__key(uri)
+        thumbnails = self.__cached(key)
+        if thumbnails is not None:
+            callback(*thumbnails)
+            return
+
+        if key in self.__callbacks:
+            self.__callbacks[key].append(callback)
+            return
+
+        self.__callbacks[key] = [callback]
+        self.__requests.put((key, is_image))
+        if len(self.__workers) < min(self.MAX_WORKERS, len(self.__callbacks)):
+            worker = threading.Thread(target=self.__work, daemon=True)
+            self.__workers.append(worker)
+            worker.start()
+
+    def __work(self):
+        while True:
+            key, is_image = self.__requests.get()
+            uri = key[0]
+            try:
+                thumbnails = self.load_thumbnails(uri, is_image)
+            except Exception as e:  # pylint: disable=broad-except
+                self.error("Failed loading the thumbnails of %s: %s", uri, e)
+                thumbnails = (None, None)
+            GLib.idle_add(self.__loadedCb, key, thumbnails)
+
+    def __loadedCb(self, key, thumbnails):
+        self.__store(key, thumbnails)
+        for callback in self.__callbacks.pop(key, []):
+            callback(*thumbnails)
+        return False
+
+    def load_thumbnails(self, uri, is_image):
+        """Loads the thumbnails of the specified file.
+
+        Can be called in any thread.
+
+        Returns:
+            List[GdkPixbuf.Pixbuf]: The small and the large thumbnails,
+            or (None, None) if not available.
+        """
+        small_thumb, large_thumb = AssetThumbnail.get_thumbnails_from_xdg_cache(uri)
+        if small_thumb or not is_image:
+            return small_thumb, large_thumb
+
+        try:
+            # Decoding at the thumbnail size is much faster for big images.
+            large_thumb = GdkPixbuf.Pixbuf.new_from_file_at_scale(
+                Gst.uri_get_location(uri), LARGE_THUMB_WIDTH, -1, True)
+        except GLib.Error as error:
+            self.debug("Failed loading thumbnail because: %s", error)
+            return None, None
+
+        width = large_thumb.props.width
+        height = large_thumb.props.height
+        small_thumb = large_thumb.scale_simple(
+            SMALL_THUMB_WIDTH,
+            SMALL_THUMB_WIDTH * height / width,
+            GdkPixbuf.InterpType.BILINEAR)
+        return small_thumb, large_thumb
+
+
 class AssetThumbnail(Loggable):
-    """Provider of decorated thumbnails for an asset."""
+    """Provider of decorated thumbnails for an asset.
+
+    Args:
+        asset (GES.UriClipAsset): The asset.
+        proxy_manager (ProxyManager): The proxy manager.
+        lazy (Optional[bool]): Whether to use placeholder icons until
+            `load` is called, instead of loading the thumbnails.
+
+    Attributes:
+        loaded (bool): Whether the thumbnails of the asset have been loaded.
+    """
 
     EMBLEMS = {}
     PROXIED = "asset-proxied"
@@ -189,13 +359,78 @@ class AssetThumbnail(Loggable):
             EMBLEMS[status].append(GdkPixbuf.Pixbuf.new_from_file_at_size(
                 os.path.join(get_pixmap_dir(), "%s.svg" % status), size, size))
 
-    def __init__(self, asset, proxy_manager):
+    # Shared by all the instances, so the thumbnails are cached.
+    loader = ThumbnailLoader()
+
+    def __init__(self, asset, proxy_manager, lazy=False):
         Loggable.__init__(self)
         self.__asset = asset
-        self.src_small, self.src_large = self.__get_thumbnails()
+        self.__loading = False
+        self.loaded = not lazy
+        if lazy:
+            self.src_small, self.src_large = self.__get_placeholders()
+        else:
+            self.src_small, self.src_large = self.__get_thumbnails()
         self.proxy_manager = proxy_manager
         self.decorate()
 
+    @property
+    def asset(self):
+        return self.__asset
+
+    def load(self, callback=None):
+        """Replaces the placeholder icons with the thumbnails of the asset.
+
+        Args:
+            callback (Optional[function]): If specified, the thumbnails are
+                loaded in the background and the callback is called with
+                this AssetThumbnail when they are loaded.
+        """
+        if self.loaded or self.__loading:
+            return
+
+        if not callback:
+            self.src_small, self.src_large = self.__get_thumbnails()
+            self.loaded = True
+            self.decorate()
+            return
+
+        real_uri = self.__get_thumbnails_uri()
+        if not real_uri:
+            self.loaded = True
+            callback(self)
+            return
+
+        self.__loading = True
+
+        def loaded_cb(small_thumb, large_thumb):
+            self.__loading = False
+            self.src_small, self.src_large = self.__complete_thumbnails(
+                small_thumb, large_thumb)
+            self.loaded = True
+            self.decorate()
+            callback(self)
+
+        self.loader.load(real_uri, self.__asset.is_image(), loaded_cb)
+
+    def __get_placeholders(self):
+        """Gets the generic icons representing the type of the asset."""
+        if self.__asset.is_image():
+            return self.__get_icons("image-x-generic")
+        if self.__asset.get_info().get_video_streams():
+            return self.__get_icons("video-x-generic")
+        return self.__get_icons("audio-x-generic")
+
+    def __get_thumbnails_uri(self):
+        """Gets the URI of the file providing the thumbnails, if any."""
+        video_streams = [
+            stream_info
+            for stream_info in self.__asset.get_info().get_stream_list()
+            if isinstance(stream_info, GstPbutils.DiscovererVideoInfo)]
+        if not video_streams:
+            return None
+        return get_proxy_target(self.__asset).props.id
+
     def __get_thumbnails(self):
         """Gets the base source thumbnails.
 
@@ -203,52 +438,39 @@ class AssetThumbnail(Loggable):
             List[GdkPixbuf.Pixbuf]: The small thumbnail and the large thumbnail
             to be decorated.
         """
-        video_streams = [
-            stream_info
-            for stream_info in self.__asset.get_info().get_stream_list()
-            if isinstance(stream_info, GstPbutils.DiscovererVideoInfo)]
-        if video_streams:
-            # Check if the files have thumbnails in the user's cache directory.
-            real_uri = get_proxy_target(self.__asset).props.id
-            small_thumb, large_thumb = self.get_thumbnails_from_xdg_cache(real_uri)
-            if not small_thumb:
-                if self.__asset.is_image():
-                    path = Gst.uri_get_location(real_uri)
-                    try:
-                        pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
-                        width = pixbuf.props.width
-                        height = pixbuf.props.height
-                        small_thumb = pixbuf.scale_simple(
-                            SMALL_THUMB_WIDTH,
-                            SMALL_THUMB_WIDTH * height / width,
-                            GdkPixbuf.InterpType.BILINEAR)
-                        large_thumb = pixbuf.scale_simple(
-                            LARGE_THUMB_WIDTH,
-                            LARGE_THUMB_WIDTH * height / width,
-                            GdkPixbuf.InterpType.BILINEAR)
-                    except GLib.Error as error:
-                        self.debug("Failed loading thumbnail because: %s", error)
-                        small_thumb, large_thumb = self.__get_icons("image-x-generic")
-                else:
-                    # Build or reuse a ThumbnailCache.
-                    thumb_cache = ThumbnailCache.get(self.__asset)
-                    small_thumb = thumb_cache.get_preview_thumbnail()
-                    if not small_thumb:
-                        small_thumb, large_thumb = self.__get_icons("video-x-generic")
-                    else:
-                        width = small_thumb.props.width
-                        height = small_thumb.props.height
-                        large_thumb = small_thumb.scale_simple(
-                            LARGE_THUMB_WIDTH,
-                            LARGE_THUMB_WIDTH * height / width,
-                            GdkPixbuf.InterpType.BILINEAR)
-                        if width > SMALL_THUMB_WIDTH:
-                            small_thumb = small_thumb.scale_simple(
-                                SMALL_THUMB_WIDTH,
-                                SMALL_THUMB_WIDTH * height / width,
-                                GdkPixbuf.InterpType.BILINEAR)
-        else:
-            small_thumb, large_thumb = self.__get_icons("audio-x-generic")
+        real_uri = self.__get_thumbnails_uri()
+        if not real_uri:
+            return self.__get_icons("audio-x-generic")
+
+        # Check if the files have thumbnails in the user's cache directory.
+        small_thumb, large_thumb = self.loader.load_sync(real_uri, self.__asset.is_image())
+        return self.__complete_thumbnails(small_thumb, large_thumb)
+
+    def __complete_thumbnails(self, small_thumb, large_thumb):
+        """Provides the thumbnails when the loader did not find any."""
+        if small_thumb:
+            return small_thumb, large_thumb
+
+        if self.__asset.is_image():
+            return self.__get_icons("image-x-generic")
+
+        # Build or reuse a ThumbnailCache.
+        thumb_cache = ThumbnailCache.get(self.__asset)
+        small_thumb = thumb_cache.get_preview_thumbnail()
+        if not small_thumb:
+            return self.__get_icons("video-x-generic")
+
+        width = small_thumb.props.width
+        height = small_thumb.props.height
+        large_thumb = small_thumb.scale_simple(
+            LARGE_THUMB_WIDTH,
+            LARGE_THUMB_WIDTH * height / width,
+            GdkPixbuf.InterpType.BILINEAR)
+        if width > SMALL_THUMB_WIDTH:
+            small_thumb = small_thumb.scale_simple(
+                SMALL_THUMB_WIDTH,
+                SMALL_THUMB_WIDTH * height / width,
+                GdkPixbuf.InterpType.BILINEAR)
         return small_thumb, large_thumb
 
     @staticmethod
@@ -367,6 +589,15 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         app (Pitivi): The app.
     """
 
+    # The number of rows inserted right away. The remaining pending rows
+    # are inserted when idle, see `_flushPendingAssets`.
+    ROWS_CHUNK_SIZE = 50
+    # How long the UI can be blocked by inserting rows or loading
+    # thumbnails when idle, in seconds.
+    IDLE_TIME_SLICE = 0.01
+    # How long to wait after the last change of the search query, in ms.
+    SEARCH_DELAY = 150
+
     __gsignals__ = {
         'play': (GObject.SignalFlags.RUN_LAST, None,
                  (GObject.TYPE_PYOBJECT,))}
@@ -376,6 +607,22 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         Loggable.__init__(self)
 
         self._pending_assets = []
+        # The iters of the storemodel rows, by asset. The iters of a
+        # Gtk.ListStore stay valid until the row is removed, unlike the
+        # Gtk.TreeRowReferences which are all updated at each change.
+        self.__rows = {}
+        # The displayed assets which are not ready yet.
+        self.__unready_assets = set()
+        self.__insert_rows_id = None
+        self.__load_thumbnails_id = None
+        # The displayed assets, by the words describing them.
+        self.__search_index = SearchIndex()
+        self.__search_query = ""
+        # The assets matching the search query, None if all are visible.
+        self.__visible_assets = None
+        self.__search_id = None
+        # The threads scanning the dropped folders.
+        self.__path_walkers = []
 
         self.app = app
         self._errors = []
@@ -419,7 +666,6 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         self._import_button = builder.get_object("media_import_button")
         self._clipprops_button = builder.get_object("media_props_button")
         self._listview_button = builder.get_object("media_listview_button")
-        searchEntry = builder.get_object("media_search_entry")
 
         # Store
         self.storemodel = Gtk.ListStore(*STORE_MODEL_STRUCTURE)
@@ -445,12 +691,16 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         self.iconview_scrollwin.set_shadow_type(Gtk.ShadowType.ETCHED_IN)
         self.iconview_scrollwin.get_accessible().set_name(
             "media_iconview_scrollwindow")
+        for scrollwin in (self.treeview_scrollwin, self.iconview_scrollwin):
+            # The thumbnails are loaded when the rows become visible.
+            vadjustment = scrollwin.get_vadjustment()
+            vadjustment.connect("value-changed", self.__scheduleThumbnailsLoading)
+            vadjustment.connect("changed", self.__scheduleThumbnailsLoading)
 
         # Filtering model for the search box.
         # Use this instead of using self.storemodel directly
         self.modelFilter = self.storemodel.filter_new()
-        self.modelFilter.set_visible_func(
-            self._setRowVisible, data=searchEntry)
+        self.modelFilter.set_visible_func(self._setRowVisible)
 
         # TreeView
         # Displays icon, name, type, length
@@ -527,6 +777,21 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         self._progressbar = Gtk.ProgressBar()
         self._progressbar.set_show_text(True)
 
+        # The progress of scanning the dropped folders.
+        self.__scan_progressbar = Gtk.ProgressBar()
+        self.__scan_progressbar.set_show_text(True)
+        scan_cancel_button = Gtk.Button.new_from_icon_name("process-stop-symbolic",
+                                                           Gtk.IconSize.BUTTON)
+        scan_cancel_button.set_tooltip_text(_("Stop looking for files to import"))
+        scan_cancel_button.set_relief(Gtk.ReliefStyle.NONE)
+        scan_cancel_button.connect("clicked", self.__cancelScanningCb)
+        self.__scan_box = Gtk.Box(spacing=SPACING)
+        self.__scan_box.pack_start(self.__scan_progressbar, True, True, 0)
+        self.__scan_box.pack_start(scan_cancel_button, False, False, 0)
+        self.__scan_box.show_all()
+        self.__scan_box.set_no_show_all(True)
+        self.__scan_box.hide()
+
         # Connect to project.  We must remove and reset the callbacks when
         # changing project.
         project_manager = self.app.project_manager
@@ -580,6 +845,7 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         self.pack_start(self.iconview_scrollwin, True, True, 0)
         self.pack_start(self.treeview_scrollwin, True, True, 0)
         self.pack_start(self._progressbar, False, False, 0)
+        self.pack_start(self.__scan_box, False, False, 0)
 
     def finalize(self):
         self.debug("Finalizing %s", self)
@@ -681,8 +947,32 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         # ellipsizing, doing needless searches is very expensive.
         # Realistically, nobody expects to search for only one character,
         # and skipping that makes a huge difference in responsiveness.
-        if len(entry.get_text()) != 1:
-            self.modelFilter.refilter()
+        if len(entry.get_text()) == 1:
+            return
+
+        # Search only when the user stops typing.
+        if self.__search_id:
+            GLib.source_remove(self.__search_id)
+        self.__search_id = GLib.timeout_add(self.SEARCH_DELAY, self.__searchCb, entry)
+
+    def __searchCb(self, entry):
+        self.__search_id = None
+        self.search(entry.get_text())
+        return False
+
+    def search(self, query):
+        """Shows only the assets matching the specified query.
+
+        Args:
+            query (str): The words to look for. Each must be the start of
+                a word of the name, path, duration, codecs or tags.
+        """
+        self.__search_query = query
+        if query.strip():
+            self.__visible_assets = self.__search_index.search(query)
+        else:
+            self.__visible_assets = None
+        self.modelFilter.refilter()
 
     def _searchEntryIconClickedCb(self, entry, icon_pos, unused_event):
         if icon_pos == Gtk.EntryIconPosition.SECONDARY:
@@ -695,22 +985,20 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
             elif self.clip_view == SHOW_ICONVIEW:
                 self.iconview.grab_focus()
 
-    def _setRowVisible(self, model, iter, data):
+    def _setRowVisible(self, model, iter, unused_data):
         """Toggles the visibility of a liststore row."""
-        text = data.get_text().lower()
-        if not text:
-            # Avoid silly warnings.
+        if self.__visible_assets is None:
             return True
-        # We must convert to markup form to be able to search for &, ', etc.
-        text = GLib.markup_escape_text(text)
-        return text in model.get_value(iter, COL_INFOTEXT).lower()
+        return model.get_value(iter, COL_ASSET) in self.__visible_assets
 
     def _connectToProject(self, project):
         """Connects signal handlers to the specified project."""
         project.connect("asset-added", self._assetAddedCb)
         project.connect("asset-loading-progress", self._assetLoadingProgressCb)
+        project.connect("asset-progress-changed", self.__assetProgressChangedCb)
         project.connect("asset-removed", self._assetRemovedCb)
         project.connect("error-loading-asset", self._errorCreatingAssetCb)
+        project.connect("cached-loading-error", self.__cachedLoadingErrorCb)
         project.connect("proxying-error", self._proxyingErrorCb)
         project.connect("settings-set-from-imported-asset", self.__projectSettingsSetFromImportedAssetCb)
 
@@ -727,6 +1015,7 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         # Now that we've got all the info, we can actually change the view type
         self.clip_view = view_type
         self._displayClipView()
+        self.__scheduleThumbnailsLoading()
         for path in paths:
             self._viewSelectPath(path)
 
@@ -801,38 +1090,174 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
             self._flushPendingAssets()
 
     def _flushPendingAssets(self):
+        """Inserts the rows of the pending assets.
+
+        The first rows are inserted right away, the rest is inserted in
+        time slices when idle, with the views detached from the model.
+        The rows show placeholder icons until they become visible.
+        """
         self.debug("Flushing %d pending model rows", len(self._pending_assets))
-        for asset in self._pending_assets:
-            thumbs_decorator = AssetThumbnail(asset, self.app.proxy_manager)
+        if self.__insert_rows_id:
+            # The pending rows are already being inserted.
+            return
+
+        self.__insertRows(self.ROWS_CHUNK_SIZE)
+        if not self._pending_assets:
+            return
+
+        self.__detachViews()
+        self.__insert_rows_id = GLib.idle_add(self.__insertRowsCb)
+
+    def __insertRowsCb(self):
+        deadline = time.monotonic() + self.IDLE_TIME_SLICE
+        while self._pending_assets and time.monotonic() < deadline:
+            self.__insertRows(10)
+        if self._pending_assets:
+            return True
+
+        self.__insert_rows_id = None
+        self.__attachViews()
+        self._selectLastImportedUris()
+        return False
+
+    def __detachViews(self):
+        """Detaches the views from the model, for inserting many rows."""
+        self.treeview.set_model(None)
+        self.iconview.set_model(None)
+        # Sort the rows at the end instead of at each insertion.
+        self.storemodel.set_sort_column_id(UNSORTED_SORT_COLUMN_ID,
+                                           Gtk.SortType.ASCENDING)
+
+    def __attachViews(self):
+        self.storemodel.set_sort_column_id(COL_URI, Gtk.SortType.ASCENDING)
+        self.treeview.set_model(self.modelFilter)
+        self.iconview.set_model(self.modelFilter)
+        self.__scheduleThumbnailsLoading()
+
+    def __insertRows(self, count):
+        """Inserts the rows of the specified number of pending assets."""
+        assets = self._pending_assets[:count]
+        del self._pending_assets[:count]
+        for asset in assets:
+            thumbs_decorator = AssetThumbnail(asset, self.app.proxy_manager, lazy=True)
             name = info_name(asset)
 
-            self.storemodel.append((thumbs_decorator.small_thumb,
-                                    thumbs_decorator.large_thumb,
-                                    beautify_asset(asset),
-                                    asset,
-                                    asset.props.id,
-                                    name,
-                                    thumbs_decorator))
+            self.__search_index.add(asset, asset_search_text(asset))
+            if self.__visible_assets is not None and \
+                    self.__search_index.matches(asset, self.__search_query):
+                self.__visible_assets.add(asset)
+
+            row_iter = self.storemodel.append((thumbs_decorator.small_thumb,
+                                               thumbs_decorator.large_thumb,
+                                               beautify_asset(asset),
+                                               asset,
+                                               asset.props.id,
+                                               name,
+                                               thumbs_decorator))
+            self.__rows[asset] = row_iter
+            if not asset.ready:
+                self.__unready_assets.add(asset)
+
+        if self.treeview.get_model():
+            self.__scheduleThumbnailsLoading()
 
+    def __scheduleThumbnailsLoading(self, *unused_args):
+        if self.__load_thumbnails_id is None:
+            self.__load_thumbnails_id = GLib.idle_add(self.__loadThumbnailsCb)
+
+    def __loadThumbnailsCb(self):
+        """Loads the thumbnails of the visible rows."""
+        if self.clip_view == SHOW_TREEVIEW:
+            view = self.treeview
+        else:
+            view = self.iconview
+        if not view.get_model():
+            self.__load_thumbnails_id = None
+            return False
+        res, start_path, end_path = view.get_visible_range()
+        if not res:
+            self.__load_thumbnails_id = None
+            return False
+
+        deadline = time.monotonic() + self.IDLE_TIME_SLICE
+        for index in range(start_path.get_indices()[0], end_path.get_indices()[0] + 1):
+            path = self.modelFilter.convert_path_to_child_path(
+                Gtk.TreePath.new_from_indices([index]))
+            if not path:
+                continue
+            row = self.storemodel[path]
+            thumbs_decorator = row[COL_THUMB_DECORATOR]
+            if thumbs_decorator.loaded:
+                continue
+
+            if time.monotonic() > deadline:
+                # Continue at the next iteration of the main loop.
+                return True
+
+            thumbs_decorator.load(self.__thumbnailsLoadedCb)
+
+        self.__load_thumbnails_id = None
+        return False
+
+    def __thumbnailsLoadedCb(self, thumbs_decorator):
+        row_iter = self.__rows.get(thumbs_decorator.asset)
+        if not row_iter:
+            return
+
+        row = self.storemodel[row_iter]
+        if row[COL_THUMB_DECORATOR] is not thumbs_decorator:
+            # The row has been updated meanwhile.
+            return
+        row[COL_ICON_64] = thumbs_decorator.small_thumb
+        row[COL_ICON_128] = thumbs_decorator.large_thumb
+
+    def __clearRows(self):
+        if self.__insert_rows_id:
+            GLib.source_remove(self.__insert_rows_id)
+            self.__insert_rows_id = None
+            self.__attachViews()
         del self._pending_assets[:]
+        self.storemodel.clear()
+        self.__rows = {}
+        self.__unready_assets = set()
+        self.__search_index.clear()
+        if self.__visible_assets is not None:
+            self.__visible_assets = set()
 
     # medialibrary callbacks
 
+    def __assetProgressChangedCb(self, unused_project, asset):
+        """Updates the row of the asset, if displayed."""
+        if self._project.loaded and asset in self._project.loading_assets:
+            # Select the asset once the assets are loaded.
+            self._last_imported_uris.add(asset.props.id)
+
+        row_iter = self.__rows.get(asset)
+        if not row_iter:
+            return
+
+        row = self.storemodel[row_iter]
+        row[COL_INFOTEXT] = beautify_asset(asset)
+        if asset.ready:
+            self.__unready_assets.discard(asset)
+            return
+
+        self.__unready_assets.add(asset)
+        if row[COL_THUMB_DECORATOR].state != AssetThumbnail.IN_PROGRESS:
+            thumbs_decorator = AssetThumbnail(asset, self.app.proxy_manager,
+                                              lazy=not row[COL_THUMB_DECORATOR].loaded)
+            row[COL_ICON_64] = thumbs_decorator.small_thumb
+            row[COL_ICON_128] = thumbs_decorator.large_thumb
+            row[COL_THUMB_DECORATOR] = thumbs_decorator
+            if not thumbs_decorator.loaded:
+                self.__scheduleThumbnailsLoading()
+
     def _assetLoadingProgressCb(self, project, progress, estimated_time):
         self._progressbar.set_fraction(progress / 100)
 
-        proxying_files = []
-        for row in self.storemodel:
-            asset = row[COL_ASSET]
-            row[COL_INFOTEXT] = beautify_asset(asset)
-
-            if not asset.ready:
-                proxying_files.append(asset)
-                if row[COL_THUMB_DECORATOR].state != AssetThumbnail.IN_PROGRESS:
-                    thumbs_decorator = AssetThumbnail(asset, self.app.proxy_manager)
-                    row[COL_ICON_64] = thumbs_decorator.small_thumb
-                    row[COL_ICON_128] = thumbs_decorator.large_thumb
-                    row[COL_THUMB_DECORATOR] = thumbs_decorator
+        # The rows are updated as the assets change, see
+        # __assetProgressChangedCb.
+        proxying_files = self.__unready_assets
 
         if progress == 0:
             self._startImporting(project)
@@ -856,8 +1281,6 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
                 len(proxying_files), progress,
                 self.__last_proxying_estimate_time)
             self._progressbar.set_text(progress_message)
-            self._last_imported_uris.update([asset.props.id for asset in
-                                             project.loading_assets])
 
         if progress == 100:
             self._doneImporting()
@@ -889,7 +1312,7 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
 
     def _assetAddedCb(self, unused_project, asset):
         """Checks whether the asset added to the project should be shown."""
-        if asset in [row[COL_ASSET] for row in self.storemodel]:
+        if asset in self.__rows:
             self.info("Asset %s already in!", asset.props.id)
             return
 
@@ -915,13 +1338,29 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
     def __removeAsset(self, asset):
         """Removes the specified asset."""
         uri = asset.get_id()
-        # Find the corresponding line in the storemodel and remove it.
+        self.__unready_assets.discard(asset)
+        self.__search_index.remove(asset)
+        if self.__visible_assets is not None:
+            self.__visible_assets.discard(asset)
+        if asset in self._pending_assets:
+            self._pending_assets.remove(asset)
+            return
+
         found = False
-        for row in self.storemodel:
-            if uri == row[COL_URI]:
-                self.storemodel.remove(row.iter)
-                found = True
-                break
+        row_iter = self.__rows.pop(asset, None)
+        if row_iter:
+            self.storemodel.remove(row_iter)
+            found = True
+        else:
+            # Find the corresponding line in the storemodel and remove it.
+            for row in self.storemodel:
+                if uri == row[COL_URI]:
+                    self.__rows.pop(row[COL_ASSET], None)
+                    self.__unready_assets.discard(row[COL_ASSET])
+                    self.__search_index.remove(row[COL_ASSET])
+                    self.storemodel.remove(row.iter)
+                    found = True
+                    break
 
         if not found:
             self.info("Failed to remove %s as it was not found"
@@ -942,6 +1381,9 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
             error = (id, str(error.domain), error)
             self._errors.append(error)
 
+    def __cachedLoadingErrorCb(self, project, error, uri):
+        self._errorCreatingAssetCb(project, error, uri, GES.UriClip)
+
     def _startImporting(self, project):
         self.__last_proxying_estimate_time = _("Unknown")
         self.import_start_time = time.time()
@@ -978,7 +1420,9 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         self._project_settings_infobar.show()
 
     def _selectLastImportedUris(self):
-        if not self._last_imported_uris:
+        if not self._last_imported_uris or self.__insert_rows_id:
+            # When the rows are being inserted, the URIs are selected
+            # after all the rows are inserted.
             return
         self._selectSources(self._last_imported_uris)
         self._last_imported_uris = set()
@@ -1003,7 +1447,9 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
             self.app.settings.lastImportFolder = lastfolder
             dialogbox.props.extra_widget.saveValues()
             filenames = dialogbox.get_uris()
-            self._project.addUris(filenames)
+            # The files chosen explicitly are discovered even if they
+            # failed before, for example because a plugin was missing.
+            self._project.addUris(filenames, rediscover=True)
             if self.app.settings.closeImportDialog:
                 dialogbox.destroy()
         else:
@@ -1325,6 +1771,9 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
 
     def _viewSelectionChangedCb(self, unused):
         self._updateActions()
+        # The user is probably going to use the selected assets soon.
+        for asset in self.getSelectedAssets():
+            self.app.proxy_manager.set_job_priority(asset, ProxyJobPriority.HIGH)
 
     def _updateActions(self):
         selected_count = len(self.getSelectedPaths())
@@ -1380,9 +1829,11 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
     def __disconnectFromProject(self):
         self._project.disconnect_by_func(self._assetAddedCb)
         self._project.disconnect_by_func(self._assetLoadingProgressCb)
+        self._project.disconnect_by_func(self.__assetProgressChangedCb)
         self._project.disconnect_by_func(self._assetRemovedCb)
         self._project.disconnect_by_func(self._proxyingErrorCb)
         self._project.disconnect_by_func(self._errorCreatingAssetCb)
+        self._project.disconnect_by_func(self.__cachedLoadingErrorCb)
         self._project.disconnect_by_func(self.__projectSettingsSetFromImportedAssetCb)
 
     def _new_project_loading_cb(self, unused_project_manager, project):
@@ -1390,7 +1841,7 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
 
         self._project = project
         self._resetErrorList()
-        self.storemodel.clear()
+        self.__clearRows()
         self._welcome_infobar.show_all()
         self._connectToProject(project)
 
@@ -1399,22 +1850,24 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         self._flushPendingAssets()
 
     def _newProjectFailedCb(self, unused_project_manager, unused_uri, unused_reason):
-        self.storemodel.clear()
+        self.__clearRows()
         self._project = None
 
     def _projectClosedCb(self, unused_project_manager, unused_project):
+        self.__cancelScanningCb(None)
         self.__disconnectFromProject()
         self._project_settings_infobar.hide()
-        self.storemodel.clear()
+        self.__clearRows()
         self._project = None
 
     def __paths_walked_cb(self, uris):
-        """Handles the end of the path walking when importing files and dirs."""
+        """Handles a batch of files found when importing files and dirs."""
         if not uris:
             return
         if not self._project:
             self.warning("Cannot add URIs, project missing")
-        self._last_imported_uris = set(uris)
+            return
+        self._last_imported_uris.update(uris)
         assets = self._project.assetsForUris(uris)
         if assets:
             # All the files have already been added.
@@ -1422,6 +1875,24 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         else:
             self._project.addUris(uris)
 
+    def __paths_walking_progress_cb(self, unused_walker):
+        scanned_dirs = sum(walker.scanned_dirs for walker in self.__path_walkers)
+        found_files = sum(walker.found_files for walker in self.__path_walkers)
+        self.__scan_progressbar.pulse()
+        self.__scan_progressbar.set_text(
+            ngettext("Looking for files to import: %d found in %d folder",
+                     "Looking for files to import: %d found in %d folders",
+                     scanned_dirs) % (found_files, scanned_dirs))
+
+    def __paths_walking_done_cb(self, walker):
+        self.__path_walkers.remove(walker)
+        if not self.__path_walkers:
+            self.__scan_box.hide()
+
+    def __cancelScanningCb(self, unused_button):
+        for walker in self.__path_walkers:
+            walker.abort()
+
     def _drag_data_received_cb(self, unused_widget, unused_context, unused_x,
                                unused_y, selection, targettype, unused_time):
         """Handles data being dragged onto self."""
@@ -1430,7 +1901,13 @@ class MediaLibraryWidget(Gtk.Box, Loggable):
         uris = selection.get_uris()
         # Scan in the background what was dragged and
         # import whatever can be imported.
-        self.app.threads.addThread(PathWalker, uris, self.__paths_walked_cb)
+        walker = self.app.threads.addThread(PathWalker, uris, self.__paths_walked_cb,
+                                            accept=is_supported_filename,
+                                            progress_cb=self.__paths_walking_progress_cb,
+                                            done_cb=self.__paths_walking_done_cb)
+        self.__path_walkers.append(walker)
+        self.__scan_progressbar.set_text(_("Looking for files to import"))
+        self.__scan_box.show()
 
     # Used with TreeView and IconView
     def _dndDragDataGetCb(self, unused_view, unused_context, data, unused_info, unused_timestamp):
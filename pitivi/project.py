@@ -22,9 +22,9 @@ import datetime
 import os
 import pwd
 import shutil
-import tarfile
+import tempfile
+import threading
 import time
-import uuid
 from gettext import gettext as _
 from hashlib import md5
 
@@ -43,10 +43,24 @@ from pitivi.preset import AudioPresetManager
 from pitivi.preset import VideoPresetManager
 from pitivi.render import Encoders
 from pitivi.settings import get_dir
+from pitivi.settings import GlobalSettings
 from pitivi.settings import xdg_cache_home
 from pitivi.timeline.previewers import ThumbnailCache
 from pitivi.undo.project import AssetAddedIntention
+from pitivi.undo.journal import ActionJournal
+from pitivi.undo.journal import get_snapshot_seq
+from pitivi.undo.journal import read_journal
+from pitivi.undo.journal import tag_snapshot
 from pitivi.undo.project import AssetProxiedIntention
+from pitivi.utils.archive import ProjectArchiver
+from pitivi.utils.compression import decompress_file
+from pitivi.utils.compression import is_compressed
+from pitivi.utils.compression import read_project_file
+from pitivi.utils.discovery import DiscoveryCache
+from pitivi.utils.discovery import DiscoveryQueue
+from pitivi.utils.encoderpresets import preset_name
+from pitivi.utils.encoderpresets import presets_lock
+from pitivi.utils.encoderpresets import session_presets
 from pitivi.utils.loggable import Loggable
 from pitivi.utils.misc import fixate_caps_with_default_values
 from pitivi.utils.misc import isWritable
@@ -54,7 +68,9 @@ from pitivi.utils.misc import path_from_uri
 from pitivi.utils.misc import quote_uri
 from pitivi.utils.misc import scale_pixbuf
 from pitivi.utils.misc import unicode_error_dialog
+from pitivi.utils.misc import write_file_atomically
 from pitivi.utils.pipeline import Pipeline
+from pitivi.utils.proxy import ProxyLadderSwitcher
 from pitivi.utils.ripple_update_group import RippleUpdateGroup
 from pitivi.utils.ui import audio_channels
 from pitivi.utils.ui import audio_rates
@@ -84,6 +100,16 @@ for i in range(2, GLib.MAXINT):
     except ValueError:
         break
 
+GlobalSettings.addConfigSection("project")
+GlobalSettings.addConfigOption("compressProjects",
+                               section="project",
+                               key="compress-projects",
+                               default=False)
+GlobalSettings.addConfigOption("compressBackups",
+                               section="project",
+                               key="compress-backups",
+                               default=False)
+
 # Properties of encoders that should be ignored when saving/loading
 # a project.
 IGNORED_PROPS = ["name", "parent"]
@@ -126,10 +152,93 @@ class ProjectManager(GObject.Object, Loggable):
         self.current_project = None
         self.disable_save = False
         self._backup_lock = 0
+        # The thread writing the backup file, if any.
+        self.__backup_thread = None
+        # Whether another backup has been requested meanwhile.
+        self.__backup_requested = False
+        # The pipeline which must stop playing before saving the backup.
+        self.__backup_deferred_pipeline = None
+        # Protects the backup files from being written after being cleaned.
+        self.__backup_files_lock = threading.Lock()
+        # Incremented when the backup files are cleaned.
+        self.__backup_generation = 0
+        # The journal of the operations done on the current project.
+        self.journal = None
+        self.__journal_action_log = None
+        # The uncompressed copy of the project file being loaded, if any.
+        self.__decompressed_path = None
         self.exitcode = 0
         self.__start_loading_time = 0
 
+    def _tryUsingJournal(self, uri):
+        """Proposes to restore the project from the journal, if any.
+
+        Returns:
+            Tuple[bool, Optional[str]]: Whether there is something to restore
+            and the URI of the scenario restoring the project, if wanted.
+        """
+        if not has_validate:
+            # Replaying the journal requires GstValidate.
+            return False, None
+
+        path = path_from_uri(uri)
+        backup_path = path_from_uri(self._makeBackupURI(uri))
+        journal_path = self._makeJournalPath(uri)
+        try:
+            project_mtime = os.path.getmtime(path)
+            journal_mtime = os.path.getmtime(journal_path)
+        except OSError:
+            return False, None
+
+        # The actions are replayed on the most recent snapshot.
+        base_path = path
+        seq = 0
+        try:
+            if os.path.getmtime(backup_path) > project_mtime:
+                base_path = backup_path
+        except OSError:
+            pass
+        try:
+            content = read_project_file(base_path)
+        except OSError as e:
+            self.warning("Cannot read the project to restore: %s", e)
+            return False, None
+        if base_path == backup_path:
+            seq = get_snapshot_seq(content)
+            if seq is None:
+                # The backup has not been saved along with the journal.
+                return False, None
+
+        actions = read_journal(journal_path, seq)
+        if not actions:
+            return False, None
+
+        self.debug("Journal has %d actions to replay on %s", len(actions), base_path)
+        if not self._restoreFromBackupDialog(journal_mtime - project_mtime):
+            return True, None
+
+        cache_dir = get_dir(os.path.join(xdg_cache_home(), "scenarios"))
+        scenario_path = os.path.join(
+            cache_dir, "recovery-%s.scenario" % os.path.basename(path))
+        load_project = Gst.Structure.new_empty("load-project")
+        load_project["serialized-content"] = content.decode().replace("\n", "")
+        with open(scenario_path, "w") as scenario:
+            scenario.write("description, seek=true, handles-states=true\n")
+            for action in [load_project] + actions:
+                scenario.write(action.to_string() + "\n")
+        return True, Gst.filename_to_uri(scenario_path)
+
     def _tryUsingBackupFile(self, uri):
+        found, recovery_uri = self._tryUsingJournal(uri)
+        if found:
+            if recovery_uri:
+                self.debug("Restoring project from the journal: %s", recovery_uri)
+                # Force the user to use "Save as".
+                self.disable_save = True
+                return recovery_uri
+            self.disable_save = False
+            return uri
+
         backup_path = self._makeBackupURI(path_from_uri(uri))
         use_backup = False
         try:
@@ -243,20 +352,29 @@ class ProjectManager(GObject.Object, Loggable):
         is_validate_scenario = self._isValidateScenario(uri)
         if not is_validate_scenario:
             uri = self._tryUsingBackupFile(uri)
+            # The project might be restored from the journal.
+            is_validate_scenario = self._isValidateScenario(uri)
+
+        if not is_validate_scenario:
             scenario = None
+            load_uri = self._decompressProject(uri)
         else:
             scenario = path_from_uri(uri)
             uri = None
+            load_uri = None
 
         # Load the project:
         self.__start_loading_time = time.time()
-        project = Project(self.app, uri=uri, scenario=scenario)
+        project = Project(self.app, uri=load_uri, scenario=scenario)
+        # Saving overwrites the original file, not its uncompressed copy.
+        project.uri = uri
         self.emit("new-project-loading", project)
 
         project.connect_after("missing-uri", self._missingURICb)
         project.connect("loaded", self._projectLoadedCb)
 
         if not project.createTimeline():
+            self.__removeDecompressedProject()
             self.emit("new-project-failed", uri,
                       _('This might be due to a bug or an unsupported project file format. '
                         'If you were trying to add a media file to your project, '
@@ -273,6 +391,55 @@ class ProjectManager(GObject.Object, Loggable):
 
         return True
 
+    def _decompressProject(self, uri):
+        """Decompresses the project file, if compressed, since GES cannot load it.
+
+        The project is decompressed next to the original file, because GES
+        looks for the moved assets relative to the project file.
+
+        Returns:
+            str: The URI of the file to be loaded by GES.
+        """
+        path = path_from_uri(uri)
+        try:
+            if not is_compressed(path):
+                return uri
+        except OSError as e:
+            # Let GES report the error.
+            self.warning("Cannot read the project file %s: %s", path, e)
+            return uri
+
+        directory, name = os.path.split(path)
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".%s." % name, suffix=".xges",
+                                            dir=directory)
+        except OSError as e:
+            # For example on read-only media.
+            self.warning("Cannot decompress the project next to %s, the moved"
+                         " assets will not be found relative to it: %s", path, e)
+            try:
+                fd, tmp_path = tempfile.mkstemp(suffix=".xges",
+                                                dir=GLib.get_user_runtime_dir())
+            except OSError as e:
+                self.error("Cannot decompress the project file %s: %s", path, e)
+                return uri
+        os.close(fd)
+
+        self.__decompressed_path = tmp_path
+        try:
+            decompress_file(path, tmp_path)
+        except OSError as e:
+            self.error("Failed decompressing the project file %s: %s", path, e)
+            self.__removeDecompressedProject()
+            return uri
+        self.debug("Decompressed %s to %s", path, tmp_path)
+        return Gst.filename_to_uri(tmp_path)
+
+    def __removeDecompressedProject(self):
+        if self.__decompressed_path:
+            os.remove(self.__decompressed_path)
+            self.__decompressed_path = None
+
     def _restoreFromBackupDialog(self, time_diff):
         """Asks if we need to load the autosaved project backup.
 
@@ -376,13 +543,21 @@ class ProjectManager(GObject.Object, Loggable):
                           _("You do not have permissions to write to this folder."))
                 return False
 
+        if backup:
+            compress = self.app.settings.compressBackups
+        else:
+            compress = self.app.settings.compressProjects
         try:
-            # "overwrite" is always True: our GTK filechooser save dialogs are
-            # set to always ask the user on our behalf about overwriting, so
-            # if saveProject is actually called, that means overwriting is OK.
-            saved = self.current_project.save(
-                self.current_project.ges_timeline, uri,
-                formatter_type, overwrite=True)
+            if compress:
+                saved = self.current_project.save_compressed(
+                    self.current_project.ges_timeline, uri)
+            else:
+                # "overwrite" is always True: our GTK filechooser save dialogs are
+                # set to always ask the user on our behalf about overwriting, so
+                # if saveProject is actually called, that means overwriting is OK.
+                saved = self.current_project.save(
+                    self.current_project.ges_timeline, uri,
+                    formatter_type, overwrite=True)
         except Exception as e:
             saved = False
             self.emit("save-project-failed", uri, e)
@@ -395,73 +570,91 @@ class ProjectManager(GObject.Object, Loggable):
                 # Update the project instance's uri,
                 # otherwise, subsequent saves will be to the old uri.
                 self.info("Setting the project instance's URI to: %s", uri)
+                previous_uri = self.current_project.uri
                 self.current_project.uri = uri
                 self.disable_save = False
+                self.__journalProjectSaved(previous_uri)
                 self.emit("project-saved", self.current_project, uri)
             else:
                 self.debug('Saved backup: %s', uri)
 
         return saved
 
-    def exportProject(self, project, uri):
-        """Exports a project and all its media files to a *.tar archive."""
-        # Save the project to a temporary file.
+    def exportProject(self, project, uri, used_only=False, use_proxies=False,
+                      progress_cb=None, done_cb=None):
+        """Exports a project and its media files to a *.tar archive.
+
+        The project is serialized right away and the archive is written
+        in a thread, see `ProjectArchiver`.
+
+        Args:
+            project (Project): The project to export.
+            uri (str): The URI of the archive to create.
+            used_only (Optional[bool]): Whether to include only the media
+                files used in the timeline.
+            use_proxies (Optional[bool]): Whether to include the proxies
+                instead of the original media files, when available. The
+                proxies are stored under the names of the original files,
+                so the project can be relocated as usual.
+            progress_cb (Optional[function]): Called with the archiver
+                while the files are being archived.
+            done_cb (Optional[function]): Called with the archiver and
+                the error, if any, when the export is over.
+
+        Returns:
+            ProjectArchiver: The thread writing the archive, or None if the
+            project could not be serialized.
+        """
         project_name = project.name if project.name else _("project")
         asset = GES.Formatter.get_default()
         project_extension = asset.get_meta(GES.META_FORMATTER_EXTENSION)
-        tmp_name = "%s.%s" % (project_name, project_extension)
+        # top directory in tar-file
+        top = "%s-export" % project_name
 
-        directory = os.path.dirname(uri)
-        tmp_uri = os.path.join(directory, tmp_name)
         try:
-            # saveProject updates the project URI... so we better back it up:
-            _old_uri = self.current_project.uri
-            self.saveProject(tmp_uri)
-            self.current_project.uri = _old_uri
-
-            # create tar file
-            with tarfile.open(path_from_uri(uri), mode="w") as tar:
-                # top directory in tar-file
-                top = "%s-export" % project_name
-                # add temporary project file
-                tar.add(path_from_uri(tmp_uri), os.path.join(top, tmp_name))
-
-                # get common path
-                sources = project.listSources()
-                if self._allSourcesInHomedir(sources):
-                    common = os.path.expanduser("~")
-                else:
-                    common = "/"
-
-                # add all sources
-                for source in sources:
-                    path = path_from_uri(source.get_id())
-                    tar.add(
-                        path, os.path.join(top, os.path.relpath(path, common)))
-                tar.close()
-        # This catches errors with tarring; the GUI already shows errors while
-        # saving projects (ex: permissions), so probably no GUI needed here.
-        # Keep the exception generic enough to catch programming errors:
+            data = project.save_snapshot(project.ges_timeline)
         except Exception as e:
-            everything_ok = False
-            self.error(e)
-            tar_file = path_from_uri(uri)
-            if os.path.isfile(tar_file):
-                renamed = os.path.splitext(tar_file)[
-                    0] + " (CORRUPT)" + "." + project_extension + "_tar"
-                self.warning(
-                    'An error occurred, will save the tarball as "%s"', renamed)
-                os.rename(tar_file, renamed)
-        else:
-            everything_ok = True
+            data = None
+            self.error("Failed serializing the project: %s", e)
+        if data is None:
+            return None
 
-        # Ensure we remove the temporary project file no matter what:
-        try:
-            os.remove(path_from_uri(tmp_uri))
-        except OSError:
-            pass
+        sources = [source for source in project.listSources()
+                   if not self.app.proxy_manager.is_proxy_asset(source)]
+        if used_only:
+            used_ids = set()
+            for layer in project.ges_timeline.get_layers():
+                for clip in layer.get_clips():
+                    clip_asset = clip.get_asset()
+                    target = clip_asset.get_proxy_target()
+                    if target:
+                        clip_asset = target
+                    used_ids.add(clip_asset.get_id())
+            sources = [source for source in sources
+                       if source.get_id() in used_ids]
+
+        # get common path
+        if self._allSourcesInHomedir(sources):
+            common = os.path.expanduser("~")
+        else:
+            common = "/"
 
-        return everything_ok
+        files = []
+        for source in sources:
+            path = path_from_uri(source.get_id())
+            source_path = path
+            proxy = source.get_proxy()
+            if use_proxies and proxy and \
+                    not self.app.proxy_manager.is_asset_queued(source):
+                proxy_path = path_from_uri(proxy.get_id())
+                if os.path.isfile(proxy_path):
+                    source_path = proxy_path
+            files.append((source_path, os.path.join(top, os.path.relpath(path, common))))
+
+        project_file = os.path.join(top, "%s.%s" % (project_name, project_extension))
+        return self.app.threads.addThread(ProjectArchiver, path_from_uri(uri),
+                                          project_file, data, files,
+                                          progress_cb=progress_cb, done_cb=done_cb)
 
     def _allSourcesInHomedir(self, sources):
         """Checks if all sources are located in the user's home directory."""
@@ -575,17 +768,166 @@ class ProjectManager(GObject.Object, Loggable):
             self._backup_lock -= 5
             return True
         else:
-            self.saveProject(backup=True)
+            self.saveBackup()
             self._backup_lock = 0
         return False
 
+    def saveBackup(self):
+        """Saves a backup of the current project without blocking.
+
+        The project is serialized in memory and the backup file is written
+        in a thread. If a backup is being written, another one is saved
+        when it's done. While playing, the backup is saved when the playback
+        stops, since serializing the project blocks the main thread.
+
+        Returns:
+            bool: Whether the backup is being saved.
+        """
+        if self.disable_save or self.current_project is None or \
+                self.current_project.uri is None:
+            return False
+
+        if self.__backup_thread:
+            self.__backup_requested = True
+            return True
+
+        pipeline = self.current_project.pipeline
+        if pipeline and pipeline.playing():
+            if not self.__backup_deferred_pipeline:
+                self.debug("Saving the backup when the playback stops")
+                self.__backup_deferred_pipeline = pipeline
+                pipeline.connect("state-change", self.__deferredBackupStateChangeCb)
+            return True
+
+        uri = self._makeBackupURI(self.current_project.uri)
+        seq = self.journal.snapshot() if self.journal else None
+        try:
+            data = self.current_project.save_snapshot(self.current_project.ges_timeline)
+        except Exception as e:
+            data = None
+            self.emit("save-project-failed", uri, e)
+        if data is None:
+            return False
+
+        if seq is not None:
+            data = tag_snapshot(data, seq)
+        # The compression and the compaction of the journal are done
+        # in the thread as well.
+        self.__backup_thread = threading.Thread(
+            target=self.__writeBackup,
+            args=(path_from_uri(uri), data, self.app.settings.compressBackups,
+                  self.__backup_generation, self.journal, seq))
+        self.__backup_thread.start()
+        return True
+
+    def __deferredBackupStateChangeCb(self, unused_pipeline, state, unused_prev):
+        if state == Gst.State.PLAYING:
+            return
+        self.__cancelDeferredBackup()
+        GLib.idle_add(self.__saveDeferredBackupCb, priority=GLib.PRIORITY_LOW)
+
+    def __saveDeferredBackupCb(self):
+        self.saveBackup()
+        return False
+
+    def __cancelDeferredBackup(self):
+        if not self.__backup_deferred_pipeline:
+            return
+        self.__backup_deferred_pipeline.disconnect_by_func(self.__deferredBackupStateChangeCb)
+        self.__backup_deferred_pipeline = None
+
+    def is_saving_backup(self):
+        """Returns whether a backup file is being written."""
+        return self.__backup_thread is not None
+
+    def __writeBackup(self, path, data, compress, generation, journal, seq):
+        error = None
+        written = False
+        try:
+            with self.__backup_files_lock:
+                if generation == self.__backup_generation:
+                    write_file_atomically(path, data, compress=compress)
+                    written = True
+        except OSError as e:
+            error = e
+        if written and journal:
+            self.__compactJournal(journal, seq)
+        GLib.idle_add(self.__backupWrittenCb, path, error)
+
+    def __backupWrittenCb(self, path, error):
+        self.__backup_thread.join()
+        self.__backup_thread = None
+        if error:
+            self.error("Failed saving backup %s: %s", path, error)
+            self.emit("save-project-failed", Gst.filename_to_uri(path), error)
+        else:
+            self.debug("Saved backup: %s", path)
+
+        if self.__backup_requested:
+            self.__backup_requested = False
+            self.saveBackup()
+        return False
+
+    def startJournal(self, action_log):
+        """Starts journaling the operations done on the current project.
+
+        Args:
+            action_log (UndoableActionLog): The log of the operations.
+        """
+        self.__stopJournal()
+        self.__journal_action_log = action_log
+        project = self.current_project
+        if project is None or project.uri is None or self.disable_save:
+            return
+
+        try:
+            self.journal = ActionJournal(self._makeJournalPath(project.uri),
+                                         action_log, self.__journalBrokenCb)
+        except OSError as e:
+            self.warning("Cannot journal the operations: %s", e)
+
+    def __stopJournal(self, remove=False):
+        if not self.journal:
+            return
+
+        self.journal.close()
+        if remove and os.path.exists(self.journal.path):
+            os.remove(self.journal.path)
+            self.debug("Removed journal file: %s", self.journal.path)
+        self.journal = None
+
+    def __journalBrokenCb(self):
+        # The next operations cannot be replayed until the next snapshot.
+        GLib.idle_add(self.__saveDeferredBackupCb, priority=GLib.PRIORITY_LOW)
+
+    def __compactJournal(self, journal, seq):
+        try:
+            journal.compact(seq)
+        except OSError as e:
+            self.error("Failed compacting the journal: %s", e)
+
+    def __journalProjectSaved(self, previous_uri):
+        if self.journal and self.current_project.uri == previous_uri:
+            self.__compactJournal(self.journal, self.journal.snapshot())
+        elif self.__journal_action_log:
+            # The project has been saved to a new location.
+            self.__stopJournal(remove=True)
+            self.startJournal(self.__journal_action_log)
+
     def _cleanBackup(self, uri):
+        self.__stopJournal(remove=True)
+        self.__journal_action_log = None
         if uri is None:
             return
-        path = path_from_uri(self._makeBackupURI(uri))
-        if os.path.exists(path):
-            os.remove(path)
-            self.debug('Removed backup file: %s', path)
+        with self.__backup_files_lock:
+            # The backup being written, if any, is obsolete.
+            self.__backup_generation += 1
+            self.__backup_requested = False
+            self.__cancelDeferredBackup()
+            path = path_from_uri(self._makeBackupURI(uri))
+            if os.path.exists(path):
+                os.remove(path)
+                self.debug('Removed backup file: %s', path)
 
     def _makeBackupURI(self, uri):
         """Generates a corresponding backup URI or path.
@@ -602,6 +944,10 @@ class ProjectManager(GObject.Object, Loggable):
         name, ext = os.path.splitext(uri)
         return name + ext + "~"
 
+    def _makeJournalPath(self, uri):
+        """Generates the path of the journal of the specified project URI."""
+        return path_from_uri(uri) + ".journal~"
+
     def _missingURICb(self, project, error, asset):
         new_uri = self.emit("missing-uri", project, error, asset)
         if not new_uri:
@@ -613,6 +959,7 @@ class ProjectManager(GObject.Object, Loggable):
 
     def _projectLoadedCb(self, project, unused_timeline):
         self.debug("Project loaded %s", project.props.uri)
+        self.__removeDecompressedProject()
         if not self.current_project == project:
             self.debug("Project is obsolete %s", project.props.uri)
             return
@@ -622,6 +969,62 @@ class ProjectManager(GObject.Object, Loggable):
         self.info("Loaded in %s", self.time_loaded - self.__start_loading_time)
 
 
+class AssetsLoadingProgress(object):
+    """Running totals of the progress of the assets being loaded.
+
+    The totals are updated with the changes of each asset, so the
+    overall progress is computed without going through all the assets.
+
+    Args:
+        cached_duration (Optional[function]): Called with the URI of an
+            asset not discovered yet to get its previously found duration.
+    """
+
+    def __init__(self, cached_duration=None):
+        self.__cached_duration = cached_duration
+        # The (duration, creation_progress) counted in the totals, by asset.
+        self.__assets = {}
+        self.total_duration = 0
+        # The sum of the durations weighted by the creation progress.
+        self.weighted_progress = 0
+        # The number of assets whose creation progress is below 100.
+        self.unfinished = 0
+
+    def __len__(self):
+        return len(self.__assets)
+
+    def update(self, asset):
+        """Counts the current duration and creation progress of the asset."""
+        self.discard(asset)
+        duration = asset.get_duration()
+        if not duration and self.__cached_duration:
+            duration = self.__cached_duration(asset.props.id)
+        progress = asset.creation_progress
+        self.__assets[asset] = (duration, progress)
+        self.total_duration += duration
+        self.weighted_progress += duration * progress
+        if progress < 100:
+            self.unfinished += 1
+
+    def discard(self, asset):
+        """Stops counting the specified asset."""
+        try:
+            duration, progress = self.__assets.pop(asset)
+        except KeyError:
+            return
+        self.total_duration -= duration
+        self.weighted_progress -= duration * progress
+        if progress < 100:
+            self.unfinished -= 1
+
+    def clear(self):
+        """Stops counting all the assets."""
+        self.__assets = {}
+        self.total_duration = 0
+        self.weighted_progress = 0
+        self.unfinished = 0
+
+
 class Project(Loggable, GES.Project):
     """A Pitivi project.
 
@@ -640,10 +1043,16 @@ class Project(Loggable, GES.Project):
     Signals:
         project-changed: Modifications were made to the project.
         start-importing: Started to import files.
+        asset-progress-changed: The creation progress or the readiness of
+            an asset being loaded changed.
+        cached-loading-error: A file being added is not discovered because
+            its discovery failed previously, see `DiscoveryCache`.
     """
 
     __gsignals__ = {
         "asset-loading-progress": (GObject.SignalFlags.RUN_LAST, None, (object, int)),
+        "asset-progress-changed": (GObject.SignalFlags.RUN_LAST, None, (GES.Asset,)),
+        "cached-loading-error": (GObject.SignalFlags.RUN_LAST, None, (object, str)),
         # Working around the fact that PyGObject does not let us emit error-loading-asset
         # and bugzilla does not let me file a bug right now :/
         "proxying-error": (GObject.SignalFlags.RUN_LAST, None,
@@ -662,12 +1071,20 @@ class Project(Loggable, GES.Project):
         GES.Project.__init__(self, uri=uri, extractable_type=GES.Timeline)
         self.log("uri:%s", uri)
         self.pipeline = None
+        # Switches the clips between the proxy ladder levels while playing.
+        self.proxy_ladder = None
         self.ges_timeline = None
         self.uri = uri
         self.loaded = False
         self.at_least_one_asset_missing = False
         self.app = app
         self.loading_assets = set()
+        self.discovery_cache = DiscoveryCache(
+            os.path.join(xdg_cache_home(), "discovery-cache.json"))
+        self.__loading_progress = AssetsLoadingProgress(self.discovery_cache.get_duration)
+        # The files being added, discovered a few at a time. The number
+        # of jobs is set when files are added, see `addUris`.
+        self.__discovery = DiscoveryQueue(self.__create_uri_asset, 1)
 
         self.relocated_assets = {}
         self.app.proxy_manager.connect("progress", self.__assetTranscodingProgressCb)
@@ -1095,8 +1512,41 @@ class Project(Loggable, GES.Project):
     # ------------------------------#
     def __assetTranscodingProgressCb(self, unused_proxy_manager, asset,
                                      creation_progress, estimated_time):
+        self.__assetProgressChanged(asset)
         self.__updateAssetLoadingProgress(estimated_time)
 
+    def __addLoadingAsset(self, asset):
+        self.loading_assets.add(asset)
+        self.__loading_progress.update(asset)
+
+    def __removeLoadingAsset(self, asset):
+        self.loading_assets.discard(asset)
+        self.__loading_progress.discard(asset)
+
+    def __setLoadingAssets(self, assets):
+        self.loading_assets = set(assets)
+        self.__loading_progress.clear()
+        for asset in self.loading_assets:
+            self.__loading_progress.update(asset)
+
+    def __assetProgressChanged(self, asset):
+        """Takes into account the new creation progress of the asset."""
+        if asset in self.loading_assets:
+            self.__loading_progress.update(asset)
+
+            if asset.creation_progress >= 100 and not asset.ready:
+                if not self.loaded:
+                    # Check that we are not recreating deleted proxy
+                    if asset.props.id not in self.__awaited_deleted_proxy_targets:
+                        proxy_uri = self.app.proxy_manager.getProxyUri(asset)
+                        if proxy_uri and proxy_uri not in self.__deleted_proxy_files:
+                            asset.ready = True
+                else:
+                    self.setModificationState(True)
+                    asset.ready = True
+
+        self.emit("asset-progress-changed", asset)
+
     def __get_loading_project_progress(self):
         """Computes current advancement of asset loading during project loading.
 
@@ -1107,23 +1557,12 @@ class Project(Loggable, GES.Project):
         Returns:
             int: The current asset loading progress (in percent).
         """
-        num_loaded = 0
-        all_ready = True
-        for asset in self.loading_assets:
-            if asset.creation_progress < 100:
-                all_ready = False
-            else:
-                # Check that we are not recreating deleted proxy
-                proxy_uri = self.app.proxy_manager.getProxyUri(asset)
-                if proxy_uri and proxy_uri not in self.__deleted_proxy_files and \
-                        asset.props.id not in self.__awaited_deleted_proxy_targets:
-                    asset.ready = True
-                num_loaded += 1
-
-        if all_ready:
+        unfinished = self.__loading_progress.unfinished
+        if not unfinished:
             return 100
 
-        return (num_loaded / len(self.loading_assets)) * 100
+        num_loaded = len(self.__loading_progress) - unfinished
+        return (num_loaded / len(self.__loading_progress)) * 100
 
     def __get_loading_assets_progress(self):
         """Computes current advancement of asset loading.
@@ -1131,33 +1570,19 @@ class Project(Loggable, GES.Project):
         Returns:
             int: The current asset loading progress (in percent).
         """
-        total_import_duration = 0
-        for asset in self.loading_assets:
-            total_import_duration += asset.get_duration()
-
+        total_import_duration = self.__loading_progress.total_duration
         if total_import_duration == 0:
             self.info("No known duration yet")
             return
 
-        asset_loading_progress = 0
-        all_ready = True
-        for asset in self.loading_assets:
-            asset_weight = asset.get_duration() / total_import_duration
-            asset_loading_progress += asset_weight * asset.creation_progress
-
-            if asset.creation_progress < 100:
-                all_ready = False
-            elif not asset.ready:
-                self.setModificationState(True)
-                asset.ready = True
-
-        if all_ready:
-            asset_loading_progress = 100
+        if not self.__loading_progress.unfinished:
+            return 100
 
-        return asset_loading_progress
+        return self.__loading_progress.weighted_progress / total_import_duration
 
     def __updateAssetLoadingProgress(self, estimated_time=0):
         if not self.loading_assets:
+            self.app.proxy_manager.file_infos.clear()
             self.emit("asset-loading-progress", 100, estimated_time)
             return
 
@@ -1170,7 +1595,8 @@ class Project(Loggable, GES.Project):
 
         if progress == 100:
             self.info("No more loading assets")
-            self.loading_assets = set()
+            self.__setLoadingAssets(())
+            self.app.proxy_manager.file_infos.clear()
 
     def __assetTranscodingCancelledCb(self, unused_proxy_manager, asset):
         self.__setProxy(asset, None)
@@ -1200,6 +1626,7 @@ class Project(Loggable, GES.Project):
 
         asset.proxying_error = error
         asset.creation_progress = 100
+        self.__assetProgressChanged(asset)
 
         self.emit("proxying-error", asset)
         self.__updateAssetLoadingProgress()
@@ -1221,14 +1648,13 @@ class Project(Loggable, GES.Project):
             proxy.creation_progress = 100
 
         asset.set_proxy(proxy)
-        try:
-            self.loading_assets.remove(asset)
-        except KeyError:
-            pass
+        self.__removeLoadingAsset(asset)
+        self.emit("asset-progress-changed", asset)
 
         if proxy:
             self.add_asset(proxy)
-            self.loading_assets.add(proxy)
+            self.__addLoadingAsset(proxy)
+            self.__assetProgressChanged(proxy)
 
         self.__updateAssetLoadingProgress()
 
@@ -1287,14 +1713,22 @@ class Project(Loggable, GES.Project):
         if not self.loading_assets:
             # Progress == 0 means "starting to import"
             self.emit("asset-loading-progress", 0, 0)
+            self.app.proxy_manager.file_infos.enable()
 
-        self.loading_assets.add(asset)
+        self.__addLoadingAsset(asset)
+        self.emit("asset-progress-changed", asset)
+        # The assets are usually in a few directories, list them
+        # while the assets are being discovered.
+        self.app.proxy_manager.file_infos.prefetch(asset.get_id())
 
     def do_asset_removed(self, asset):
         self.app.proxy_manager.cancel_job(asset)
 
     def do_asset_added(self, asset):
         """Handles `GES.Project::asset-added` emitted by self."""
+        # Start discovering the next files right away, so the project
+        # keeps loading assets while the queue is not empty.
+        self.__discovery.job_done(asset.get_id())
         self._maybeInitSettingsFromAsset(asset)
         if asset and not GObject.type_is_a(asset.get_extractable_type(),
                                            GES.UriClip):
@@ -1302,6 +1736,10 @@ class Project(Loggable, GES.Project):
             self.debug("Ignoring asset: %s", asset.props.id)
             return
 
+        if not self.app.proxy_manager.is_proxy_asset(asset):
+            # Used to estimate the loading progress the next times.
+            self.discovery_cache.add_duration(asset.props.id, asset.get_duration())
+
         if asset not in self.loading_assets:
             self.debug("Asset %s is not in loading assets, "
                        " it must not be proxied", asset.get_id())
@@ -1314,6 +1752,8 @@ class Project(Loggable, GES.Project):
             self.info("Deleted proxy file %s now ready again.", asset.props.id)
             self.__deleted_proxy_files.remove(asset.props.id)
 
+        # The duration of the asset is known now.
+        self.__loading_progress.update(asset)
         if self.loaded:
             if not asset.get_proxy_target() in self.list_assets(GES.Extractable):
                 self.app.proxy_manager.add_job(asset)
@@ -1321,10 +1761,15 @@ class Project(Loggable, GES.Project):
             self.debug("Project still loading, not using proxies: %s",
                     asset.props.id)
             asset.creation_progress = 100
+            self.__assetProgressChanged(asset)
             self.__updateAssetLoadingProgress()
 
     def do_loading_error(self, error, asset_id, unused_type):
         """Handles `GES.Project::error-loading-asset` emitted by self."""
+        if asset_id in self.__discovery:
+            self.discovery_cache.add_error(asset_id, error)
+            self.__discovery.job_done(asset_id)
+
         asset = None
         for asset in self.loading_assets:
             if asset.get_id() == asset_id:
@@ -1334,7 +1779,8 @@ class Project(Loggable, GES.Project):
         asset.error = error
         asset.creation_progress = 100
         if self.loaded:
-            self.loading_assets.remove(asset)
+            self.__removeLoadingAsset(asset)
+        self.__assetProgressChanged(asset)
         self.__updateAssetLoadingProgress()
 
     def do_loaded(self, unused_timeline):
@@ -1347,8 +1793,8 @@ class Project(Loggable, GES.Project):
         self._ensureLayer()
 
         if self.uri:
-            self.loading_assets = set([asset for asset in self.loading_assets if
-                                       self.app.proxy_manager.is_asset_queued(asset)])
+            self.__setLoadingAssets([asset for asset in self.loading_assets if
+                                     self.app.proxy_manager.is_asset_queued(asset)])
 
             if self.loading_assets:
                 self.debug("The following assets are still being transcoded: %s."
@@ -1449,9 +1895,12 @@ class Project(Loggable, GES.Project):
                     self.warning("No preset named %s for encoder %s", preset, encoder)
                     continue
 
-                cache[cache_key] = {prop.name: encoder.get_property(prop.name)
-                                    for prop in GObject.list_properties(encoder)
-                                    if prop.name not in IGNORED_PROPS and prop.flags & GObject.ParamFlags.WRITABLE}
+                settings = {prop.name: encoder.get_property(prop.name)
+                            for prop in GObject.list_properties(encoder)
+                            if prop.name not in IGNORED_PROPS and prop.flags & GObject.ParamFlags.WRITABLE}
+                cache[cache_key] = settings
+                with presets_lock:
+                    session_presets.add(preset)
 
     # ------------------------------------------ #
     # Our API                                    #
@@ -1477,12 +1926,6 @@ class Project(Loggable, GES.Project):
 
             for profile in container_profile.get_profiles():
                 encoder_factory_name = profile.get_preset_name()
-                encoder = Gst.ElementFactory.make(encoder_factory_name, None)
-                if not isinstance(encoder, Gst.Preset):
-                    self.warning("Element %s does not implement Gst.Preset. Cannot save"
-                                 "its rendering settings", encoder)
-                    continue
-
                 if profile.get_type_nick() == "video":
                     cache = self._vcodecsettings_cache
                 elif profile.get_type_nick() == "audio":
@@ -1495,16 +1938,67 @@ class Project(Loggable, GES.Project):
                     continue
 
                 # Save the encoder settings in a Gst.Preset so they are
-                # available in GES.Project.save() for serialization
+                # available in GES.Project.save() for serialization.
+                # The presets are named after their settings, so the
+                # existing preset is reused if the settings did not change.
                 settings = cache[cache_key]
-                preset = "encoder_settings_%s" % uuid.uuid4().hex
+                preset = preset_name(encoder_factory_name, settings)
+                if preset not in session_presets:
+                    encoder = Gst.ElementFactory.make(encoder_factory_name, None)
+                    if not isinstance(encoder, Gst.Preset):
+                        self.warning("Element %s does not implement Gst.Preset. Cannot save"
+                                     "its rendering settings", encoder)
+                        continue
+
+                    for prop, value in settings.items():
+                        encoder.set_property(prop, value)
+                    with presets_lock:
+                        assert encoder.save_preset(preset)
+                        session_presets.add(preset)
                 profile.set_preset(preset)
 
-                for prop, value in settings.items():
-                    encoder.set_property(prop, value)
-                assert encoder.save_preset(preset)
+        if not self.proxy_ladder:
+            return GES.Project.save(self, ges_timeline, uri, formatter_asset, overwrite)
+
+        # The lower proxy ladder levels must not be serialized.
+        with self.proxy_ladder.full_resolution(commit=False):
+            return GES.Project.save(self, ges_timeline, uri, formatter_asset, overwrite)
+
+    def save_snapshot(self, ges_timeline):
+        """Serializes the project in memory.
+
+        The project is serialized in the user's runtime dir, which is
+        usually in memory, so the slow disk writes can be done later,
+        in a different thread.
 
-        return GES.Project.save(self, ges_timeline, uri, formatter_asset, overwrite)
+        Returns:
+            bytes: The serialized project, or None if it failed.
+        """
+        fd, path = tempfile.mkstemp(suffix=".xges", dir=GLib.get_user_runtime_dir())
+        os.close(fd)
+        try:
+            if not self.save(ges_timeline, Gst.filename_to_uri(path), None, overwrite=True):
+                return None
+            with open(path, "rb") as snapshot:
+                return snapshot.read()
+        finally:
+            os.remove(path)
+
+    def save_compressed(self, ges_timeline, uri):
+        """Saves the project in a compressed file.
+
+        Args:
+            ges_timeline (GES.Timeline): The timeline to save.
+            uri (str): The URI of the file to write.
+
+        Returns:
+            bool: Whether the project has been saved.
+        """
+        data = self.save_snapshot(ges_timeline)
+        if data is None:
+            return False
+        write_file_atomically(path_from_uri(uri), data, compress=True)
+        return True
 
     def use_proxies_for_assets(self, assets):
         originals = []
@@ -1568,6 +2062,7 @@ class Project(Loggable, GES.Project):
         if not self.pipeline.set_timeline(self.ges_timeline):
             self.warning("Failed to set the pipeline's timeline: %s", self.ges_timeline)
             return False
+        self.proxy_ladder = ProxyLadderSwitcher(self.app.proxy_manager, self.pipeline)
 
         return True
 
@@ -1604,18 +2099,79 @@ class Project(Loggable, GES.Project):
 
         self.pipeline.commit_timeline()
 
-    def addUris(self, uris):
+    def __get_discovery_jobs(self):
+        jobs = self.app.settings.numDiscoveryJobs
+        if jobs <= 0:
+            jobs = min(4, os.cpu_count() or 1)
+        return jobs
+
+    def __create_uri_asset(self, uri):
+        return self.create_asset(uri, GES.UriClip)
+
+    def addUris(self, uris, rediscover=False):
         """Adds assets asynchronously.
 
+        The files are discovered a few at a time, see `DiscoveryQueue`.
+
         Args:
             uris (List[str]): The URIs of the assets.
+            rediscover (Optional[bool]): Whether to discover again the
+                files whose discovery failed previously, instead of
+                reporting the previous errors, see `DiscoveryCache`.
         """
+        new_uris = []
+        cached_errors = []
         with self.app.action_log.started("assets-addition"):
             for uri in uris:
-                if self.create_asset(quote_uri(uri), GES.UriClip):
-                    # The asset was not already part of the project.
-                    action = AssetAddedIntention(self, uri)
-                    self.app.action_log.push(action)
+                quoted_uri = quote_uri(uri)
+                if quoted_uri in self.__discovery or \
+                        self.get_asset(quoted_uri, GES.UriClip):
+                    # The asset is already part of the project.
+                    continue
+
+                if rediscover:
+                    self.discovery_cache.forget(quoted_uri)
+                error = self.discovery_cache.get_error(quoted_uri)
+                if error:
+                    cached_errors.append((quoted_uri, error))
+                    continue
+
+                new_uris.append(quoted_uri)
+                action = AssetAddedIntention(self, quoted_uri)
+                self.app.action_log.push(action)
+
+        self.discover_uris(new_uris)
+
+        if cached_errors:
+            if not self.loading_assets:
+                # Progress == 0 means "starting to import"
+                self.emit("asset-loading-progress", 0, 0)
+            for uri, error in cached_errors:
+                self.info("Not discovering %s again: %s", uri, error)
+                self.emit("cached-loading-error", error, uri)
+            if not self.loading_assets:
+                self.__updateAssetLoadingProgress()
+
+    def discover_uris(self, uris):
+        """Queues the files for discovery, see `DiscoveryQueue`.
+
+        Args:
+            uris (List[str]): The quoted URIs of the files.
+        """
+        # The setting can change while the app is running.
+        self.__discovery.max_jobs = self.__get_discovery_jobs()
+        self.__discovery.push(uris)
+
+    def cancel_discovery(self, uri):
+        """Unqueues the file if its discovery did not start.
+
+        Args:
+            uri (str): The quoted URI of the file.
+
+        Returns:
+            bool: Whether the file has been unqueued.
+        """
+        return self.__discovery.remove(uri)
 
     def assetsForUris(self, uris):
         assets = []
@@ -1632,6 +2188,12 @@ class Project(Loggable, GES.Project):
     def release(self):
         res = 0
 
+        self.__discovery.clear()
+
+        if self.proxy_ladder:
+            self.proxy_ladder.release()
+            self.proxy_ladder = None
+
         if self.pipeline:
             self.pipeline.release()
 
@@ -17,6 +17,7 @@
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
 """Rendering-related classes and utilities."""
+import contextlib
 import os
 import posixpath
 import time
@@ -437,6 +438,8 @@ class RenderDialog(Loggable):
         self.preferred_vencoder = self.project.vencoder
         self.preferred_aencoder = self.project.aencoder
         self.__unproxiedClips = {}
+        # Keeps the full resolution proxies while rendering.
+        self.__full_resolution = contextlib.ExitStack()
 
         self.frame_rate_combo.set_model(frame_rates)
         self.channels_combo.set_model(audio_channels)
@@ -963,6 +966,11 @@ class RenderDialog(Loggable):
             self.warning("GSound failed to play: %s", e)
 
     def __maybeUseSourceAsset(self):
+        if self.project.proxy_ladder:
+            # The lower resolution proxies are only for playback.
+            self.__full_resolution.enter_context(
+                self.project.proxy_ladder.full_resolution())
+
         if self.__always_use_proxies.get_active():
             self.debug("Rendering from proxies, not replacing assets")
             return
@@ -1006,6 +1014,7 @@ class RenderDialog(Loggable):
             clip.set_asset(asset)
 
         self.__unproxiedClips = {}
+        self.__full_resolution.close()
 
     # ------------------- Callbacks ------------------------------------------ #
 
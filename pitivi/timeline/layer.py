@@ -27,6 +27,7 @@ from gi.repository import Gtk
 from pitivi.timeline import elements
 from pitivi.undo.timeline import CommitTimelineFinalizingAction
 from pitivi.utils.loggable import Loggable
+from pitivi.utils.proxy import ProxyJobPriority
 from pitivi.utils.timeline import Zoomable
 from pitivi.utils.ui import LAYER_HEIGHT
 from pitivi.utils.ui import PADDING
@@ -336,6 +337,11 @@ class Layer(Gtk.Layout, Zoomable, Loggable):
             self.error("Implement UI for type %s?", ges_clip.__gtype__)
             return
 
+        if isinstance(ges_clip, GES.UriClip):
+            # Proxies of the assets used in the timeline are needed first.
+            self.app.proxy_manager.set_job_priority(ges_clip.get_asset(),
+                                                    ProxyJobPriority.HIGH)
+
         widget = ui_type(self, ges_clip)
         self._children.append(widget)
         self._children.sort(key=lambda clip: clip.z_order)
@@ -200,7 +200,7 @@ class WaveformPreviewer(PreviewerBin):
         self.samples = []
         self.n_samples = 0
         self.duration = 0
-        self.prev_pos = 0
+        self.prev_pos = None
 
     def do_get_property(self, prop):
         if prop.name == 'uri':
@@ -251,7 +251,9 @@ class WaveformPreviewer(PreviewerBin):
                         val = self.peaks[i][pos - 1]
 
                     # Linearly joins values between to known samples values.
-                    unknowns = range(self.prev_pos + 1, pos)
+                    # When transcoding a segment, the first value is not
+                    # joined with the start of the file.
+                    unknowns = range(self.prev_pos + 1, pos) if self.prev_pos is not None else []
                     if unknowns:
                         prev_val = self.peaks[i][self.prev_pos]
                         linear_const = (val - prev_val) / len(unknowns)
@@ -286,6 +288,48 @@ class WaveformPreviewer(PreviewerBin):
                 pass
             os.symlink(self.wavefile, proxy_wavefile)
 
+    def save_segment(self, path, start, stop):
+        """Saves the waveform of a range of the file, if computed.
+
+        Used when the file is transcoded in segments, see `finalize_segments`.
+
+        Args:
+            path (str): The file where to save the samples.
+            start (int): The position where the range starts, in ns.
+            stop (int): The position where the range stops, in ns.
+        """
+        if self.passthrough or not self.peaks:
+            return
+
+        first = int(start / SAMPLE_DURATION)
+        last = int(stop / SAMPLE_DURATION)
+        # Let's go mono.
+        if len(self.peaks) > 1:
+            samples = (numpy.array(self.peaks[0][first:last]) +
+                       numpy.array(self.peaks[1][first:last])) / 2
+        else:
+            samples = numpy.array(self.peaks[0][first:last])
+        with open(path, "wb") as segment_file:
+            numpy.save(segment_file, samples)
+
+    def finalize_segments(self, paths, proxy=None):
+        """Finalizes the previewer with the waveforms of all the segments.
+
+        Args:
+            paths (List[str]): The files where the waveforms of the
+                consecutive segments have been saved with `save_segment`.
+            proxy (Optional[GES.UriClipAsset]): The proxy of the file.
+        """
+        if not self.passthrough:
+            try:
+                segments = [numpy.load(path) for path in paths]
+            except (OSError, ValueError) as e:
+                # The waveform will be computed by the AudioPreviewer.
+                self.warning("Cannot merge the waveforms of %s: %s", self.uri, e)
+                return
+            self.peaks = [numpy.concatenate(segments)] if segments else None
+        self.finalize(proxy)
+
 
 Gst.Element.register(None, "waveformbin", Gst.Rank.NONE,
                      WaveformPreviewer)
@@ -303,16 +347,42 @@ class PreviewGeneratorManager(Loggable):
 
         # The current Previewer per GES.TrackType.
         self._current_previewers = {}
-        # The queue of Previewers.
+        # The queue of Previewers, in the order they have been added.
         self._previewers = {
             GES.TrackType.AUDIO: [],
             GES.TrackType.VIDEO: []
         }
         self._running = True
+        # The (start, end) of the visible part of the timeline, in ns.
+        self._viewport = (0, 0)
+
+    def set_viewport(self, start, end):
+        """Sets the visible part of the timeline.
+
+        Args:
+            start (int): The time at the left of the viewport, in ns.
+            end (int): The time at the right of the viewport, in ns.
+        """
+        self._viewport = (start, end)
+
+    def _viewport_distance(self, previewer):
+        """Gets the distance from the previewed element to the viewport."""
+        start = previewer.ges_elem.props.start
+        end = start + previewer.ges_elem.props.duration
+        viewport_start, viewport_end = self._viewport
+        if end < viewport_start:
+            return viewport_start - end, start
+        if start > viewport_end:
+            return start - viewport_end, start
+        return 0, start
 
     def add_previewer(self, previewer):
         """Adds the specified previewer to the queue.
 
+        The queued previewers are started from the nearest to the
+        viewport, see `set_viewport`, and then from the leftmost one, so
+        the previews appear in the order the clips are seen.
+
         Args:
             previewer (Previewer): The previewer to control.
         """
@@ -326,7 +396,7 @@ class PreviewGeneratorManager(Loggable):
         if not self._previewers[track_type] and current is None:
             self._start_previewer(previewer)
         else:
-            self._previewers[track_type].insert(0, previewer)
+            self._previewers[track_type].append(previewer)
 
     def _start_previewer(self, previewer):
         self._current_previewers[previewer.track_type] = previewer
@@ -373,15 +443,23 @@ class PreviewGeneratorManager(Loggable):
         if not self._running:
             return
 
-        if self._previewers[track_type]:
-            self._start_previewer(self._previewers[track_type].pop())
+        previewers = self._previewers[track_type]
+        if previewers:
+            next_previewer = min(previewers, key=self._viewport_distance)
+            previewers.remove(next_previewer)
+            self._start_previewer(next_previewer)
 
 
 class Previewer(Gtk.Layout):
     """Base class for previewers.
 
+    The generation is started only after the previewer has been drawn,
+    so the clips outside the viewport, for example when opening a large
+    project, do not take their turn in the PreviewGeneratorManager.
+
     Attributes:
         track_type (GES.TrackType): The type of content.
+        ges_elem (GES.TrackElement): The previewed element.
     """
 
     # We only need one PreviewGeneratorManager to manage all previewers.
@@ -393,6 +471,21 @@ class Previewer(Gtk.Layout):
         self.track_type = track_type
         self._max_cpu_usage = max_cpu_usage
 
+        # Whether the previewer has been drawn at least once.
+        self.exposed = False
+        # Whether the previewer has to be controlled once exposed.
+        self.__control_pending = False
+        self.__draw_handler_id = self.connect("draw", self.__draw_cb)
+
+    def __draw_cb(self, unused_widget, unused_cr):
+        self.disconnect(self.__draw_handler_id)
+        self.__draw_handler_id = 0
+        self.exposed = True
+        if self.__control_pending:
+            self.__control_pending = False
+            Previewer.manager.add_previewer(self)
+        return False
+
     def start_generation(self):
         """Starts preview generation."""
         raise NotImplementedError
@@ -402,7 +495,15 @@ class Previewer(Gtk.Layout):
         raise NotImplementedError
 
     def become_controlled(self):
-        """Lets the PreviewGeneratorManager control our execution."""
+        """Lets the PreviewGeneratorManager control our execution.
+
+        If the previewer has not been drawn yet, this is postponed
+        until it's drawn.
+        """
+        if not self.exposed:
+            self.__control_pending = True
+            return
+
         Previewer.manager.add_previewer(self)
 
     def set_selected(self, selected):
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Placeholders for the clips of a project which is being loaded."""
+import bisect
+from xml.etree import ElementTree
+
+from pitivi.utils.compression import open_project_file
+
+
+class TimelineSkeleton(object):
+    """The positions of the clips of a project file.
+
+    GES resolves all the assets of a project before creating the
+    timeline, so this is what the timeline shows meanwhile.
+
+    Args:
+        layers (List[List[Tuple[int, int]]]): The (start, end) of the clips
+            of each layer, from the top layer.
+
+    Attributes:
+        layers (List[List[Tuple[int, int]]]): The (start, end) of the clips
+            of each layer, sorted by start.
+        duration (int): The end of the last clip.
+    """
+
+    def __init__(self, layers):
+        self.layers = [sorted(clips) for clips in layers]
+        self.__starts = [[start for start, unused_end in clips]
+                         for clips in self.layers]
+        self.__longest = [max((end - start for start, end in clips), default=0)
+                          for clips in self.layers]
+        self.duration = max((clips[-1][1] for clips in self.layers if clips),
+                            default=0)
+
+    @classmethod
+    def from_file(cls, path):
+        """Parses the clips of the specified xges file.
+
+        Raises:
+            OSError: The file cannot be read.
+            ElementTree.ParseError: The file is not valid XML.
+        """
+        clips_by_priority = {}
+        with open_project_file(path) as project_file:
+            for unused_event, element in ElementTree.iterparse(project_file):
+                if element.tag == "layer":
+                    priority = int(element.get("priority", 0))
+                    clips_by_priority.setdefault(priority, [])
+                elif element.tag == "clip":
+                    # The transitions are recreated automatically.
+                    if element.get("type-name") != "GESTransitionClip":
+                        priority = int(element.get("layer-priority", 0))
+                        start = int(element.get("start", 0))
+                        end = start + int(element.get("duration", 0))
+                        clips_by_priority.setdefault(priority, []).append((start, end))
+                element.clear()
+        return cls([clips_by_priority[priority]
+                    for priority in sorted(clips_by_priority)])
+
+    def clips_between(self, layer_index, start, end):
+        """Gets the clips of a layer overlapping the specified interval.
+
+        Returns:
+            List[Tuple[int, int]]: The (start, end) of the clips.
+        """
+        clips = self.layers[layer_index]
+        starts = self.__starts[layer_index]
+        first = bisect.bisect_left(starts, start - self.__longest[layer_index])
+        last = bisect.bisect_right(starts, end)
+        return [(clip_start, clip_end)
+                for clip_start, clip_end in clips[first:last]
+                if clip_end > start]
@@ -17,6 +17,7 @@
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
 import os
+import threading
 from gettext import gettext as _
 
 from gi.repository import Gdk
@@ -26,6 +27,7 @@ from gi.repository import GLib
 from gi.repository import Gst
 from gi.repository import Gtk
 
+from pitivi.autoaligner import AlignmentMode
 from pitivi.autoaligner import AlignmentProgressDialog
 from pitivi.autoaligner import AutoAligner
 from pitivi.configure import get_ui_dir
@@ -40,8 +42,10 @@ from pitivi.timeline.layer import LayerControls
 from pitivi.timeline.layer import SpacedSeparator
 from pitivi.timeline.previewers import Previewer
 from pitivi.timeline.ruler import ScaleRuler
+from pitivi.timeline.skeleton import TimelineSkeleton
 from pitivi.undo.timeline import CommitTimelineFinalizingAction
 from pitivi.utils.loggable import Loggable
+from pitivi.utils.misc import path_from_uri
 from pitivi.utils.timeline import EditingContext
 from pitivi.utils.timeline import SELECT
 from pitivi.utils.timeline import SELECT_ADD
@@ -54,6 +58,7 @@ from pitivi.utils.ui import LAYER_HEIGHT
 from pitivi.utils.ui import PLAYHEAD_COLOR
 from pitivi.utils.ui import PLAYHEAD_WIDTH
 from pitivi.utils.ui import SEPARATOR_HEIGHT
+from pitivi.utils.ui import SKELETON_CLIP_COLOR
 from pitivi.utils.ui import set_cairo_color
 from pitivi.utils.ui import set_children_state_recurse
 from pitivi.utils.ui import SNAPBAR_COLOR
@@ -102,6 +107,19 @@ PreferencesDialog.addTogglePreference('leftClickAlsoSeeks',
                                       description=_(
                                           "Whether left-clicking also seeks besides selecting and editing clips."))
 
+GlobalSettings.addConfigOption("autoAlignCompensateDrift",
+                               section="user-interface",
+                               key="auto-align-compensate-drift",
+                               default=False,
+                               notify=True)
+
+PreferencesDialog.addTogglePreference("autoAlignCompensateDrift",
+                                      section="timeline",
+                                      label=_("Compensate clock drift when aligning"),
+                                      description=_(
+                                          "Whether auto-alignment also estimates the clock drift "
+                                          "of the recording devices, useful for long recordings."))
+
 GlobalSettings.addConfigOption("timelineAutoRipple",
                                section="user-interface",
                                key="timeline-autoripple",
@@ -223,9 +241,30 @@ class LayersLayout(Gtk.Layout, Zoomable, Loggable):
         """Draws the children and indicators."""
         Gtk.Layout.do_draw(self, cr)
 
+        if self._timeline.ges_timeline is None and self._timeline.skeleton:
+            self.__draw_skeleton(cr, self._timeline.skeleton)
         self.__draw_playhead(cr)
         self.__draw_snap_indicator(cr)
 
+    def __draw_skeleton(self, cr, skeleton):
+        """Draws placeholders for the clips of the project being loaded."""
+        hoffset = self.get_hadjustment().get_value()
+        voffset = self.get_vadjustment().get_value()
+        start = self.pixelToNs(hoffset)
+        end = self.pixelToNs(hoffset + self.get_allocated_width())
+        set_cairo_color(cr, SKELETON_CLIP_COLOR)
+        for index in range(len(skeleton.layers)):
+            y = SEPARATOR_HEIGHT + index * (LAYER_HEIGHT + SEPARATOR_HEIGHT) - voffset
+            if y + LAYER_HEIGHT < 0:
+                continue
+            if y > self.get_allocated_height():
+                break
+            for clip_start, clip_end in skeleton.clips_between(index, start, end):
+                x = self.nsToPixel(clip_start) - hoffset
+                width = max(1, self.nsToPixel(clip_end - clip_start))
+                cr.rectangle(x, y, width, LAYER_HEIGHT)
+        cr.fill()
+
     def __draw_playhead(self, cr):
         """Draws the playhead line."""
         offset = self.get_hadjustment().get_value()
@@ -260,7 +299,12 @@ class LayersLayout(Gtk.Layout, Zoomable, Loggable):
         ges_timeline = self._timeline.ges_timeline
         view_width = self.get_allocated_width()
         space_at_the_end = view_width * 2 / 3
-        duration = 0 if not ges_timeline else ges_timeline.props.duration
+        if ges_timeline:
+            duration = ges_timeline.props.duration
+        elif self._timeline.skeleton:
+            duration = self._timeline.skeleton.duration
+        else:
+            duration = 0
         width = self.nsToPixel(duration) + space_at_the_end
         width = max(view_width, width)
 
@@ -293,6 +337,9 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
         self.app = app
         self._project = None
         self.ges_timeline = None
+        # The placeholders shown while a project is being loaded.
+        self.skeleton = None
+        self.__skeleton_uri = None
 
         self.props.can_focus = False
 
@@ -303,6 +350,8 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
         self.layout.props.can_focus = True
         self.layout.props.can_default = True
         self.hadj = self.layout.get_hadjustment()
+        self.hadj.connect("value-changed", self.__hadj_changed_cb)
+        self.hadj.connect("changed", self.__hadj_changed_cb)
         self.vadj = self.layout.get_vadjustment()
         hbox.pack_end(self.layout, True, True, 0)
 
@@ -448,6 +497,7 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
             if self._project:
                 self._project.pipeline.disconnect_by_func(self._positionCb)
 
+        self.__set_skeleton(None)
         self._project = project
         if self._project:
             self._project.pipeline.connect('position', self._positionCb)
@@ -476,6 +526,53 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
     def _durationChangedCb(self, ges_timeline, pspec):
         self.layout.update_width()
 
+    def showSkeleton(self, uri):
+        """Shows placeholders for the clips of the project being loaded.
+
+        The project file is parsed in a thread. The placeholders are
+        removed when the project is set.
+
+        Args:
+            uri (str): The URI of the project file.
+        """
+        self.__skeleton_uri = uri
+        thread = threading.Thread(target=self.__parse_skeleton, args=(uri,),
+                                  daemon=True)
+        thread.start()
+
+    def hideSkeleton(self):
+        """Removes the placeholders, if any."""
+        self.__set_skeleton(None)
+
+    def __parse_skeleton(self, uri):
+        try:
+            skeleton = TimelineSkeleton.from_file(path_from_uri(uri))
+        except Exception as e:
+            self.warning("Cannot show the clips of %s: %s", uri, e)
+            return
+        GLib.idle_add(self.__skeleton_parsed_cb, uri, skeleton)
+
+    def __skeleton_parsed_cb(self, uri, skeleton):
+        # The project might have been loaded or closed meanwhile.
+        if uri == self.__skeleton_uri and self.ges_timeline is None:
+            self.__set_skeleton(skeleton)
+        return False
+
+    def __set_skeleton(self, skeleton):
+        if skeleton is None:
+            self.__skeleton_uri = None
+            if self.skeleton is None:
+                return
+        self.skeleton = skeleton
+        if skeleton:
+            layers_count = len(skeleton.layers)
+            height = layers_count * (LAYER_HEIGHT + SEPARATOR_HEIGHT) + SEPARATOR_HEIGHT
+        else:
+            height = -1
+        self.layout.layers_vbox.props.height_request = height
+        self.layout.update_width()
+        self.layout.queue_draw()
+
     def scrollToPlayhead(self, align=None, when_not_in_view=False):
         """Scrolls so that the playhead is in view.
 
@@ -1120,8 +1217,15 @@ class Timeline(Gtk.EventBox, Zoomable, Loggable):
         assert position % 2 == 0
         return int(position / 2)
 
+    def __hadj_changed_cb(self, hadj):
+        # Start the previewers of the clips in view first.
+        Previewer.manager.set_viewport(
+            self.pixelToNs(hadj.props.value),
+            self.pixelToNs(hadj.props.value + hadj.props.page_size))
+
     # Interface Zoomable
     def zoomChanged(self):
+        self.__hadj_changed_cb(self.hadj)
         if not self.ges_timeline:
             # Probably the app starts and there is no project/timeline yet.
             return
@@ -1828,7 +1932,11 @@ class TimelineContainer(Gtk.Grid, Zoomable, Loggable):
             self._project.pipeline.commit_timeline()
             progress_dialog.window.destroy()
 
-        auto_aligner = AutoAligner(self.timeline.selection, alignedCb)
+        if self.app.settings.autoAlignCompensateDrift:
+            mode = AlignmentMode.AFFINE
+        else:
+            mode = AlignmentMode.RIGID
+        auto_aligner = AutoAligner(self.timeline.selection, alignedCb, mode)
         try:
             progress_meter = auto_aligner.start()
             progress_meter.addWatcher(progress_dialog.updatePosition)
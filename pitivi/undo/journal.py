@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Journal of the operations done since the project has been saved."""
+import re
+import threading
+
+from gi.repository import Gst
+
+from pitivi.undo.undo import UndoableActionStack
+from pitivi.utils.loggable import Loggable
+from pitivi.utils.misc import write_file_atomically
+
+
+# The marker of the entries which cannot be replayed.
+BREAK = "break"
+SNAPSHOT_SEQ_RE = re.compile(rb"<!-- pitivi-journal-seq: (\d+) -->")
+
+
+def tag_snapshot(data, seq):
+    """Marks the serialized project with the journal entry it includes.
+
+    Args:
+        data (bytes): The serialized project.
+        seq (int): The sequence number of the last journal entry whose
+            effect is included in the serialized project.
+
+    Returns:
+        bytes: The marked serialized project.
+    """
+    comment = b"<!-- pitivi-journal-seq: %d -->\n" % seq
+    if data.startswith(b"<?xml"):
+        # Comments are allowed only after the XML declaration.
+        end = data.index(b"?>") + 2
+        return data[:end] + b"\n" + comment + data[end:].lstrip(b"\n")
+    return comment + data
+
+
+def get_snapshot_seq(data):
+    """Gets the sequence number the serialized project has been marked with.
+
+    Returns:
+        int: The sequence number, or None if the project is not marked.
+    """
+    match = SNAPSHOT_SEQ_RE.search(data[:1024])
+    if not match:
+        return None
+    return int(match.group(1))
+
+
+def read_journal(path, seq):
+    """Reads the actions done after the specified journal entry.
+
+    Args:
+        path (str): The path of the journal.
+        seq (int): The sequence number of the last entry to skip.
+
+    Returns:
+        List[Gst.Structure]: The scenario actions which can be replayed,
+        in order, up to the first entry which cannot be replayed.
+    """
+    actions = []
+    try:
+        with open(path) as journal:
+            lines = journal.readlines()
+    except FileNotFoundError:
+        return actions
+
+    for line in lines:
+        entry_seq, entry = _parse_line(line)
+        if entry_seq is None or entry_seq <= seq:
+            continue
+        if entry == BREAK:
+            break
+        structure = Gst.Structure.from_string(entry)[0]
+        if structure is None:
+            # Probably the last line, truncated by the crash.
+            break
+        actions.append(structure)
+    return actions
+
+
+def _parse_line(line):
+    if not line.endswith("\n"):
+        return None, None
+    seq, unused_sep, entry = line[:-1].partition(" ")
+    try:
+        return int(seq), entry
+    except ValueError:
+        return None, None
+
+
+class ActionJournal(Loggable):
+    """Write-ahead journal of the operations recorded by the undo log.
+
+    When an operation is committed, the scenario actions of its actions,
+    as coalesced by the undo log, are appended to the journal, so after a
+    crash the project can be restored by loading the last snapshot, which
+    can be the saved project or the backup, and by replaying the actions
+    added after it.
+
+    The entries are numbered, the snapshots are marked with the number
+    of the last entry they include, see `tag_snapshot`. Operations which
+    cannot be serialized as scenario actions, for example the undo and
+    the redo, are marked as a break, after which nothing can be replayed
+    until the next snapshot, so a snapshot should be taken soon.
+
+    The journal can be compacted in a different thread.
+
+    Args:
+        path (str): The path of the journal file.
+        action_log (UndoableActionLog): The log recording the operations.
+        break_cb (Optional[function]): Called when an operation cannot be
+            journaled, to take a snapshot.
+    """
+
+    def __init__(self, path, action_log, break_cb=None):
+        Loggable.__init__(self)
+        self.path = path
+        self.action_log = action_log
+        self.__break_cb = break_cb
+        # The sequence number of the last entry.
+        self.seq = 0
+        # Whether an action could not be journaled since the last snapshot.
+        self.__broken = False
+        # Whether break_cb has been called since the last snapshot.
+        self.__snapshot_requested = False
+        # Protects the file, which is compacted in a different thread.
+        self.__lock = threading.Lock()
+        self.__file = open(path, "w")
+
+        action_log.connect("commit", self.__commit_cb)
+        action_log.connect("move", self.__move_cb)
+
+    def close(self):
+        """Stops journaling."""
+        self.action_log.disconnect_by_func(self.__commit_cb)
+        self.action_log.disconnect_by_func(self.__move_cb)
+        with self.__lock:
+            self.__file.close()
+            self.__file = None
+
+    def __commit_cb(self, action_log, stack):
+        if action_log.is_in_transaction():
+            # The operation is part of the current one.
+            return
+
+        structures = None if self.__broken else self.__serialize(stack)
+        if structures is None:
+            # Nothing can be replayed until the next snapshot.
+            self.__break()
+            self.__request_snapshot()
+            return
+
+        with self.__lock:
+            for structure in structures:
+                self.__append(structure.to_string())
+            self.__file.flush()
+
+    def __serialize(self, stack):
+        structures = []
+        for action in stack.done_actions:
+            if isinstance(action, UndoableActionStack):
+                nested = self.__serialize(action)
+                if nested is None:
+                    return None
+                structures.extend(nested)
+                continue
+
+            try:
+                structure = action.asScenarioAction()
+            except NotImplementedError:
+                structure = None
+            if structure is None:
+                self.debug("Cannot journal %s", action)
+                return None
+            structures.append(structure)
+        return structures
+
+    def __move_cb(self, unused_action_log, unused_stack):
+        self.__break()
+        self.__request_snapshot()
+
+    def __append(self, entry):
+        self.seq += 1
+        self.__file.write("%d %s\n" % (self.seq, entry))
+
+    def __break(self):
+        if self.__broken:
+            return
+
+        self.__broken = True
+        with self.__lock:
+            self.__append(BREAK)
+            self.__file.flush()
+
+    def __request_snapshot(self):
+        if self.__break_cb and not self.__snapshot_requested:
+            self.__snapshot_requested = True
+            self.__break_cb()
+
+    def snapshot(self):
+        """Takes note that the project is being serialized.
+
+        Returns:
+            int: The sequence number of the last entry included in the
+            serialized project.
+        """
+        seq = self.seq
+        self.__broken = False
+        self.__snapshot_requested = False
+        if self.action_log.is_in_transaction():
+            # The snapshot includes a part of the current operation.
+            self.__break()
+        return seq
+
+    def compact(self, seq):
+        """Removes the entries included in a snapshot written to disk.
+
+        Can be called from a different thread.
+
+        Args:
+            seq (int): The sequence number returned by `snapshot`.
+        """
+        with self.__lock:
+            if not self.__file:
+                # The journal has been closed meanwhile.
+                return
+
+            self.__file.close()
+            try:
+                with open(self.path) as journal:
+                    lines = [line for line in journal
+                             if (_parse_line(line)[0] or 0) > seq]
+                write_file_atomically(self.path, "".join(lines).encode())
+            finally:
+                self.__file = open(self.path, "a")
@@ -29,7 +29,7 @@ from pitivi.undo.undo import UndoableAction
 class AssetAddedIntention(UndoableAction):
     """The intention of adding an asset to a project.
 
-    This should be created when the async operation starts.
+    This should be created when the file is queued for discovery.
     See also AssetAddedAction.
     """
 
@@ -38,21 +38,35 @@ class AssetAddedIntention(UndoableAction):
         self.project = project
         self.uri = uri
         self.asset = None
+        # Whether the intention has been undone before the asset is added.
+        self.__undone = False
         self.project.connect("asset-added", self._asset_added_cb)
 
     def _asset_added_cb(self, project, asset):
         if asset.get_id() == self.uri:
             self.asset = asset
             self.project.disconnect_by_func(self._asset_added_cb)
+            if self.__undone:
+                # The file was being discovered when undoing.
+                self.project.remove_asset(asset)
 
     def undo(self):
-        # The asset might be missing if removed before it's added
         if self.asset:
             self.project.remove_asset(self.asset)
+            return
+
+        # The file is still queued or being discovered.
+        self.__undone = True
+        self.project.cancel_discovery(self.uri)
 
     def do(self):
         if self.asset:
             self.project.add_asset(self.asset)
+            return
+
+        if self.__undone:
+            self.__undone = False
+            self.project.discover_uris([self.uri])
 
 
 class AssetAddedAction(Action):
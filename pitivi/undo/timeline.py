@@ -69,6 +69,16 @@ class TrackElementPropertyChanged(UndoableAction):
         self.track_element.set_child_property(
             self.property_name, self.old_value)
 
+    def coalesce_key(self):
+        return (self.track_element, self.property_name)
+
+    def expand(self, action):
+        if not isinstance(action, TrackElementPropertyChanged) or \
+                self.coalesce_key() != action.coalesce_key():
+            return False
+        self.new_value = action.new_value
+        return True
+
     def asScenarioAction(self):
         st = Gst.Structure.new_empty("set-child-property")
         st['element-name'] = self.track_element.get_name()
@@ -594,6 +604,18 @@ class KeyframeChangedAction(UndoableAction):
         time, value = snapshot
         self.control_source.set(time, value)
 
+    def coalesce_key(self):
+        # The keyframes are identified by their timestamp, which does not
+        # change, since moving a keyframe is removing and adding it.
+        return (self.control_source, self.new_snapshot[0])
+
+    def expand(self, action):
+        if not isinstance(action, KeyframeChangedAction) or \
+                self.coalesce_key() != action.coalesce_key():
+            return False
+        self.new_snapshot = action.new_snapshot
+        return True
+
 
 class ControlSourceSetAction(UndoableAction):
 
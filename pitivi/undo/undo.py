@@ -70,6 +70,20 @@ class UndoableAction(Action):
         """
         return False
 
+    def coalesce_key(self):
+        """Gets what the action changes, for coalescing similar actions.
+
+        When an operation changes the same thing repeatedly, for example
+        while dragging a slider, the actions with the same key are merged
+        with `expand` into the first one, so only the first old value and
+        the last new value are kept.
+
+        Returns:
+            object: A hashable key, or None if the action is not to be
+                coalesced.
+        """
+        return None
+
 
 class UndoableAutomaticObjectAction(UndoableAction):
     """An action on an automatically created object.
@@ -122,6 +136,8 @@ class UndoableActionStack(UndoableAction):
             the stack.
         finalizing_action (FinalizingAction): The action to be performed
             at the end of undoing or redoing the stacked actions.
+        revision (int): The revision of the project after the operation,
+            set when committed as a toplevel operation.
     """
 
     def __init__(self, action_group_name, finalizing_action=None):
@@ -129,16 +145,30 @@ class UndoableActionStack(UndoableAction):
         self.action_group_name = action_group_name
         self.done_actions = []
         self.finalizing_action = finalizing_action
+        self.revision = None
+        # The actions which can be expanded, by their coalesce_key.
+        self.__coalescing = {}
 
     def __repr__(self):
         return "%s: %s" % (self.action_group_name, self.done_actions)
 
     def push(self, action):
-        if self.done_actions:
-            last_action = self.done_actions[-1]
-            if last_action.expand(action):
-                # The action has been included in the previous one.
+        key = action.coalesce_key()
+        if key is None:
+            # The next changes must not be merged into actions done
+            # before this one, which might depend on them.
+            self.__coalescing.clear()
+            if self.done_actions:
+                last_action = self.done_actions[-1]
+                if last_action.expand(action):
+                    # The action has been included in the previous one.
+                    return
+        else:
+            previous_action = self.__coalescing.get(key)
+            if previous_action is not None and previous_action.expand(action):
+                # The action has been included in a previous one.
                 return
+            self.__coalescing[key] = action
         self.done_actions.append(action)
 
     def _run_action(self, actions, method_name):
@@ -182,7 +212,9 @@ class UndoableActionLog(GObject.Object, Loggable):
         self.redo_stacks = []
         self.stacks = []
         self.running = False
-        self._checkpoint = self._takeSnapshot()
+        # The last revision given to a committed operation.
+        self.__last_revision = 0
+        self._checkpoint = self.revision
 
     @contextlib.contextmanager
     def started(self, action_group_name, **kwargs):
@@ -285,6 +317,8 @@ class UndoableActionLog(GObject.Object, Loggable):
             self.debug("Ignore empty stack %s", stack.action_group_name)
             return
         if not self.stacks:
+            self.__last_revision += 1
+            stack.revision = self.__last_revision
             self.undo_stacks.append(stack)
             stack.finish_operation()
         else:
@@ -323,18 +357,25 @@ class UndoableActionLog(GObject.Object, Loggable):
         self.undo_stacks.append(stack)
         self.emit("move", stack)
 
-    def _takeSnapshot(self):
-        return list(self.undo_stacks)
+    @property
+    def revision(self):
+        """The revision identifying the current state of the project.
+
+        Each committed operation gets a new revision, so the revision
+        identifies the sequence of operations applied to the project.
+        """
+        if not self.undo_stacks:
+            return 0
+        return self.undo_stacks[-1].revision
 
     def checkpoint(self):
         if self.stacks:
             raise UndoWrongStateError("Recording a transaction", self.stacks)
 
-        self._checkpoint = self._takeSnapshot()
+        self._checkpoint = self.revision
 
     def dirty(self):
-        current_snapshot = self._takeSnapshot()
-        return current_snapshot != self._checkpoint
+        return self.revision != self._checkpoint
 
     def _run(self, operation):
         self.running = True
@@ -381,6 +422,16 @@ class MetaChangedAction(UndoableAction):
     def undo(self):
         self.meta_container.set_meta(self.item, self.old_value)
 
+    def coalesce_key(self):
+        return (self.meta_container, self.item)
+
+    def expand(self, action):
+        if not isinstance(action, MetaChangedAction) or \
+                self.coalesce_key() != action.coalesce_key():
+            return False
+        self.new_value = action.new_value
+        return True
+
 
 class MetaContainerObserver(GObject.Object):
     """Monitor for MetaContainer changes.
@@ -430,6 +481,9 @@ class PropertyChangedAction(UndoableAutomaticObjectAction):
     def undo(self):
         self.auto_object.set_property(self.field_name, self.old_value)
 
+    def coalesce_key(self):
+        return (self.auto_object, self.field_name)
+
     def expand(self, action):
         if not isinstance(action, PropertyChangedAction) or \
                 self.auto_object != action.auto_object or \
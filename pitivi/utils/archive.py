@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Archiving of the projects with their media files."""
+import io
+import os
+import tarfile
+import time
+
+from gi.repository import GLib
+
+from pitivi.utils.misc import call_false
+from pitivi.utils.threads import Thread
+
+
+class ArchivingCancelledError(Exception):
+    """Raised when the archiving has been cancelled."""
+    pass
+
+
+class _ProgressReader(object):
+    """File object wrapper reporting how much has been read."""
+
+    def __init__(self, fileobj, archiver):
+        self.fileobj = fileobj
+        self.archiver = archiver
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.archiver._read(len(data))
+        return data
+
+
+class ProjectArchiver(Thread):
+    """Thread writing a tar archive with a project and its media files.
+
+    The archive is streamed to a file next to the destination, which is
+    renamed when complete, so no temporary copy of the files is made and
+    a failed or cancelled export leaves nothing behind.
+
+    Attributes:
+        written (int): The number of bytes of the files archived so far.
+        total (int): The number of bytes of the files to archive.
+
+    Args:
+        path (str): The path of the archive to create.
+        project_name (str): The path of the project file in the archive.
+        project_data (bytes): The serialized project.
+        files (List[Tuple[str, str]]): The paths of the media files and
+            their paths in the archive.
+        progress_cb (function): Called on the main thread with the
+            archiver while the files are being archived.
+        done_cb (function): Called on the main thread with the archiver
+            and the error, if any, when the archiving is over.
+    """
+
+    # How often the progress is reported, in s.
+    PROGRESS_INTERVAL = 0.2
+
+    def __init__(self, path, project_name, project_data, files,
+                 progress_cb=None, done_cb=None):
+        Thread.__init__(self)
+        self.path = path
+        self.project_name = project_name
+        self.project_data = project_data
+        self.files = files
+        self.progress_cb = progress_cb
+        self.done_cb = done_cb
+
+        self.written = 0
+        self.total = 0
+        self.cancelled = False
+        self.__last_progress_time = 0
+
+    def abort(self):
+        self.cancelled = True
+
+    def _read(self, size):
+        if self.cancelled:
+            raise ArchivingCancelledError()
+
+        self.written += size
+        now = time.monotonic()
+        if self.progress_cb and now - self.__last_progress_time > self.PROGRESS_INTERVAL:
+            self.__last_progress_time = now
+            GLib.idle_add(call_false, self.progress_cb, self)
+
+    def process(self):
+        tmp_path = self.path + ".part"
+        error = None
+        try:
+            self.total = sum(os.path.getsize(path) for path, unused_name in self.files)
+            with open(tmp_path, "wb") as archive_file:
+                # The stream mode writes the archive sequentially.
+                with tarfile.open(fileobj=archive_file, mode="w|") as tar:
+                    tarinfo = tarfile.TarInfo(self.project_name)
+                    tarinfo.size = len(self.project_data)
+                    tarinfo.mtime = time.time()
+                    tar.addfile(tarinfo, io.BytesIO(self.project_data))
+
+                    for path, name in self.files:
+                        tarinfo = tar.gettarinfo(path, name)
+                        with open(path, "rb") as media_file:
+                            tar.addfile(tarinfo, _ProgressReader(media_file, self))
+                archive_file.flush()
+                os.fsync(archive_file.fileno())
+            os.replace(tmp_path, self.path)
+        except (OSError, tarfile.TarError, ArchivingCancelledError) as e:
+            if not self.cancelled:
+                self.error("Failed archiving the project to %s: %s", self.path, e)
+                error = e
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        if self.done_cb:
+            GLib.idle_add(call_false, self.done_cb, self, error)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Compressed project files.
+
+The compressed project files are xges files wrapped in gzip, or in xz
+for the ones compressed by other tools. They are recognized by their
+first bytes, whatever their extension.
+"""
+import gzip
+import lzma
+import shutil
+import zlib
+
+# The openers of the compressed files, by the bytes the files start with.
+DECOMPRESSORS = {
+    b"\x1f\x8b": gzip.open,
+    b"\xfd7zXZ\x00": lzma.open,
+}
+MAGIC_SIZE = max(len(magic) for magic in DECOMPRESSORS)
+
+# A fast level, because the project files are saved often and the XML
+# compresses well anyway.
+COMPRESS_LEVEL = 3
+CHUNK_SIZE = 1024 * 1024
+
+
+def _get_decompressor(path):
+    with open(path, "rb") as project_file:
+        head = project_file.read(MAGIC_SIZE)
+    for magic, decompressor in DECOMPRESSORS.items():
+        if head.startswith(magic):
+            return decompressor
+    return None
+
+
+def is_compressed(path):
+    """Checks whether the file at the specified path is compressed.
+
+    Raises:
+        OSError: The file cannot be read.
+    """
+    return _get_decompressor(path) is not None
+
+
+def open_project_file(path):
+    """Opens a project file for reading its uncompressed content.
+
+    Returns:
+        A binary file object.
+
+    Raises:
+        OSError: The file cannot be read.
+    """
+    decompressor = _get_decompressor(path)
+    if not decompressor:
+        return open(path, "rb")
+    return decompressor(path, "rb")
+
+
+def read_project_file(path):
+    """Reads the uncompressed content of a project file.
+
+    Returns:
+        bytes: The content.
+
+    Raises:
+        OSError: The file cannot be read or is corrupted.
+    """
+    try:
+        with open_project_file(path) as project_file:
+            return project_file.read()
+    except (EOFError, zlib.error, lzma.LZMAError) as e:
+        raise OSError("Corrupted project file %s: %s" % (path, e))
+
+
+def decompress_file(path, dest_path):
+    """Writes the uncompressed content of a project file to another file.
+
+    Raises:
+        OSError: The file cannot be read or is corrupted, or the
+            destination cannot be written.
+    """
+    try:
+        with open_project_file(path) as project_file:
+            with open(dest_path, "wb") as dest_file:
+                shutil.copyfileobj(project_file, dest_file, CHUNK_SIZE)
+    except (EOFError, zlib.error, lzma.LZMAError) as e:
+        raise OSError("Corrupted project file %s: %s" % (path, e))
+
+
+def write_compressed(fileobj, data):
+    """Writes the data to the file, compressing it on the way.
+
+    Args:
+        fileobj: The binary file object where to write.
+        data (bytes): The data to compress.
+    """
+    # mtime=0 so the same project always gives the same file.
+    with gzip.GzipFile(fileobj=fileobj, mode="wb",
+                       compresslevel=COMPRESS_LEVEL, mtime=0) as stream:
+        view = memoryview(data)
+        for offset in range(0, len(view), CHUNK_SIZE):
+            stream.write(view[offset:offset + CHUNK_SIZE])
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Discovery of the files being imported."""
+import hashlib
+import json
+import os
+from collections import deque
+from collections import OrderedDict
+
+from gi.repository import GLib
+from gi.repository import Gst
+
+from pitivi.settings import GlobalSettings
+from pitivi.utils.loggable import Loggable
+
+
+GlobalSettings.addConfigSection("discovery")
+# 0 means the number of jobs depends on the available CPUs.
+GlobalSettings.addConfigOption("numDiscoveryJobs",
+                               section="discovery",
+                               key="num-discovery-jobs",
+                               default=0)
+
+
+def io_order(uris):
+    """Sorts the URIs so the files are read with little seeking.
+
+    The files are grouped by directory and sorted by name. The files on
+    different devices are interleaved, so the devices are busy at the
+    same time while each of them reads the files in order.
+
+    Args:
+        uris (List[str]): The URIs of the files.
+
+    Returns:
+        List[str]: The sorted URIs.
+    """
+    devices = OrderedDict()
+    directories = {}
+    for uri in uris:
+        directory = os.path.dirname(uri)
+        device = directories.get(directory, False)
+        if device is False:
+            device = None
+            if Gst.uri_get_protocol(uri) == "file":
+                try:
+                    device = os.stat(Gst.uri_get_location(directory)).st_dev
+                except OSError:
+                    pass
+            directories[directory] = device
+        devices.setdefault(device, []).append(uri)
+
+    queues = [deque(sorted(device_uris)) for device_uris in devices.values()]
+    ordered = []
+    while queues:
+        for device_uris in queues:
+            ordered.append(device_uris.popleft())
+        queues = [device_uris for device_uris in queues if device_uris]
+    return ordered
+
+
+class DiscoveryQueue(Loggable):
+    """Queue limiting the number of files discovered at the same time.
+
+    Each discovery started by GES keeps a pipeline and the file open, so
+    starting all of them at once, when importing many files, uses a lot
+    of memory and file descriptors and makes the disk seek back and forth.
+
+    Args:
+        create_asset (function): Called with the URI of a file to start
+            its discovery. Returns whether the discovery started. The
+            end of the discovery must be signaled by calling `job_done`.
+        max_jobs (int): The maximum number of discoveries at the same time.
+    """
+
+    def __init__(self, create_asset, max_jobs):
+        Loggable.__init__(self)
+        self.__create_asset = create_asset
+        self.max_jobs = max_jobs
+        self.__pending = deque()
+        self.__pending_uris = set()
+        self.__running = set()
+
+    def __len__(self):
+        return len(self.__pending_uris) + len(self.__running)
+
+    def __contains__(self, uri):
+        return uri in self.__pending_uris or uri in self.__running
+
+    def push(self, uris):
+        """Queues the files for discovery.
+
+        Args:
+            uris (List[str]): The URIs of the files.
+        """
+        uris = [uri for uri in OrderedDict.fromkeys(uris) if uri not in self]
+        self.__pending_uris.update(uris)
+        # The pending files are ordered again because the files being
+        # discovered are the ones the disk read last.
+        self.__pending = deque(io_order(list(self.__pending) + uris))
+        self.__start_jobs()
+
+    def remove(self, uri):
+        """Unqueues the file if its discovery did not start.
+
+        Returns:
+            bool: Whether the file has been unqueued.
+        """
+        if uri not in self.__pending_uris:
+            return False
+        self.__pending_uris.remove(uri)
+        self.__pending.remove(uri)
+        return True
+
+    def clear(self):
+        """Unqueues the files whose discovery did not start."""
+        self.__pending.clear()
+        self.__pending_uris.clear()
+
+    def job_done(self, uri):
+        """Starts the next discoveries when the file has been discovered."""
+        if uri in self.__running:
+            self.__running.remove(uri)
+            self.__start_jobs()
+
+    def __start_jobs(self):
+        while self.__pending and len(self.__running) < self.max_jobs:
+            uri = self.__pending.popleft()
+            self.__pending_uris.remove(uri)
+            self.__running.add(uri)
+            if not self.__create_asset(uri):
+                self.debug("Not discovering %s", uri)
+                self.__running.discard(uri)
+
+
+class DiscoveryCache(Loggable):
+    """Cache of the discovery results of the files, saved on disk.
+
+    The results are remembered while the files are unchanged, that is,
+    while their size and modification time are the same, and while the
+    same GStreamer plugins are installed, so the files are tried again
+    once a missing plugin is installed.
+
+    GES discovers the files itself and provides no way to give it the
+    result of a previous discovery, so the cached results are used only
+    by Pitivi: the files which could not be discovered are not tried
+    again, and the durations of the files known before GES discovers
+    them are used to estimate the loading progress.
+
+    Args:
+        path (str): The path of the file where the results are saved.
+    """
+
+    VERSION = 3
+    # The maximum number of results remembered.
+    MAX_ENTRIES = 10000
+    # How long to wait before saving the changed results, in ms.
+    SAVE_DELAY = 1000
+
+    def __init__(self, path):
+        Loggable.__init__(self)
+        self.path = path
+        # The results and the size and mtime of the files, by URI, oldest first.
+        self.__entries = OrderedDict()
+        self.__save_id = None
+        self.__plugins = self.__plugins_fingerprint()
+        self.__load()
+
+    def __load(self):
+        try:
+            with open(self.path) as cache_file:
+                content = json.load(cache_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.warning("Ignoring unreadable discovery cache %s: %s", self.path, e)
+            return
+
+        if content.get("version") != self.VERSION:
+            self.info("Ignoring discovery cache version %s", content.get("version"))
+            return
+
+        self.__entries.update(content.get("entries", []))
+
+    @staticmethod
+    def __plugins_fingerprint():
+        """Gets a hash of the names and versions of the GStreamer plugins."""
+        plugins = sorted("%s %s" % (plugin.get_name(), plugin.get_version())
+                         for plugin in Gst.Registry.get().get_plugin_list())
+        return hashlib.sha1("\n".join(plugins).encode()).hexdigest()
+
+    @staticmethod
+    def __stat(uri):
+        try:
+            stat = os.stat(Gst.uri_get_location(uri))
+        except (OSError, TypeError):
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def __get(self, uri):
+        entry = self.__entries.get(uri)
+        if not entry:
+            return None
+
+        if self.__stat(uri) != (entry["size"], entry["mtime"]) or \
+                entry["plugins"] != self.__plugins:
+            self.forget(uri)
+            return None
+
+        return entry
+
+    def __add(self, uri, result):
+        stat = self.__stat(uri)
+        if not stat:
+            # The file is missing, it's not worth remembering.
+            return
+
+        result.update({"size": stat[0],
+                       "mtime": stat[1],
+                       "plugins": self.__plugins})
+        self.__entries.pop(uri, None)
+        self.__entries[uri] = result
+        while len(self.__entries) > self.MAX_ENTRIES:
+            self.__entries.popitem(last=False)
+        self.__schedule_save()
+
+    def get_error(self, uri):
+        """Gets the error of the previous discovery of the unchanged file.
+
+        Args:
+            uri (str): The URI of the file.
+
+        Returns:
+            GLib.Error: The error, or None if the file has not been
+            discovered with an error or has been changed since.
+        """
+        entry = self.__get(uri)
+        if not entry or "message" not in entry:
+            return None
+
+        return GLib.Error(entry["message"], entry["domain"], entry["code"])
+
+    def add_error(self, uri, error):
+        """Remembers the error of the discovery of the file.
+
+        Args:
+            uri (str): The URI of the file.
+            error (GLib.Error): The discovery error.
+        """
+        self.__add(uri, {"message": error.message,
+                         "domain": error.domain,
+                         "code": error.code})
+
+    def get_duration(self, uri):
+        """Gets the duration found by the previous discovery of the file.
+
+        Args:
+            uri (str): The URI of the file.
+
+        Returns:
+            int: The duration in nanoseconds, or 0 if unknown.
+        """
+        entry = self.__get(uri)
+        if not entry:
+            return 0
+        return entry.get("duration", 0)
+
+    def add_duration(self, uri, duration):
+        """Remembers the duration found by the successful discovery of the file.
+
+        Args:
+            uri (str): The URI of the file.
+            duration (int): The duration in nanoseconds.
+        """
+        entry = self.__get(uri)
+        if entry and entry.get("duration") == duration:
+            return
+
+        self.__add(uri, {"duration": duration})
+
+    def forget(self, uri):
+        """Forgets the result of the discovery of the file, if any."""
+        if self.__entries.pop(uri, None):
+            self.__schedule_save()
+
+    def save(self):
+        """Saves the results on disk, atomically."""
+        if self.__save_id is not None:
+            GLib.source_remove(self.__save_id)
+            self.__save_id = None
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as cache_file:
+            json.dump({"version": self.VERSION,
+                       "entries": list(self.__entries.items())}, cache_file)
+        os.replace(tmp_path, self.path)
+
+    def __schedule_save(self):
+        if self.__save_id is None:
+            self.__save_id = GLib.timeout_add(self.SAVE_DELAY, self.__save_cb)
+
+    def __save_cb(self):
+        self.__save_id = None
+        try:
+            self.save()
+        except OSError as e:
+            self.error("Failed saving the discovery cache: %s", e)
+        return False
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Gst.Preset presets holding the encoder settings of the projects."""
+import hashlib
+import os
+import re
+import threading
+
+from gi.repository import GLib
+from gi.repository import Gst
+
+from pitivi.utils.compression import read_project_file
+from pitivi.utils.misc import path_from_uri
+from pitivi.utils.threads import Thread
+
+
+PRESET_PREFIX = "encoder_settings_"
+PRESET_RE = re.compile((PRESET_PREFIX + r"[0-9a-f]+").encode())
+
+# Held while the preset files are being changed.
+presets_lock = threading.Lock()
+# The names of the presets saved or loaded since the app started. They
+# are never removed, because they might be used by unsaved projects.
+session_presets = set()
+
+
+def serialize_value(value):
+    """Gets a text representation of the value, stable across sessions.
+
+    The repr of the enums and of the boxed values can contain memory
+    addresses, so it cannot be used.
+    """
+    if value is None or isinstance(value, (bool, float, str)):
+        return repr(value)
+    if isinstance(value, int):
+        # The enums and flags too.
+        return str(int(value))
+    if hasattr(value, "to_string"):
+        # For example Gst.Caps and Gst.Structure.
+        return value.to_string()
+    serialized = Gst.value_serialize(value)
+    if serialized is None:
+        return type(value).__name__
+    return serialized
+
+
+def preset_name(encoder_factory_name, settings):
+    """Gets the name of the preset holding the specified encoder settings.
+
+    The name is a hash of the settings, so the presets with the same
+    settings are shared by all the projects.
+
+    Args:
+        encoder_factory_name (str): The name of the encoder factory.
+        settings (dict): The values of the encoder properties, by name.
+
+    Returns:
+        str: The name of the preset.
+    """
+    content = "%s %s" % (encoder_factory_name,
+                         " ".join("%s=%s" % (name, serialize_value(value))
+                                  for name, value in sorted(settings.items())))
+    return PRESET_PREFIX + hashlib.sha1(content.encode()).hexdigest()[:20]
+
+
+def user_presets_dir():
+    """Gets the directory where GStreamer saves the user's presets."""
+    return os.path.join(GLib.get_user_data_dir(), "gstreamer-1.0", "presets")
+
+
+def referenced_presets(paths):
+    """Finds the encoder settings presets used by the project files.
+
+    Args:
+        paths (List[str]): The paths of the project files.
+
+    Returns:
+        Set[str]: The names of the presets.
+    """
+    names = set()
+    for path in paths:
+        try:
+            content = read_project_file(path)
+        except OSError:
+            continue
+        names.update(name.decode() for name in PRESET_RE.findall(content))
+    return names
+
+
+def remove_unused_presets(used, presets_dir=None):
+    """Removes the encoder settings presets which are not used.
+
+    Args:
+        used (Set[str]): The names of the presets to keep.
+        presets_dir (Optional[str]): The directory containing the presets
+            files, by default the user's presets dir.
+
+    Returns:
+        int: The number of removed presets.
+    """
+    presets_dir = presets_dir or user_presets_dir()
+    try:
+        names = os.listdir(presets_dir)
+    except OSError:
+        return 0
+
+    removed = 0
+    for name in names:
+        if not name.endswith(".prs"):
+            continue
+
+        path = os.path.join(presets_dir, name)
+        with presets_lock:
+            keyfile = GLib.KeyFile()
+            try:
+                keyfile.load_from_file(path, GLib.KeyFileFlags.KEEP_COMMENTS)
+            except GLib.Error:
+                continue
+
+            unused = [group for group in keyfile.get_groups()[0]
+                      if group.startswith(PRESET_PREFIX) and
+                      group not in used and group not in session_presets]
+            if not unused:
+                continue
+
+            for group in unused:
+                keyfile.remove_group(group)
+            try:
+                keyfile.save_to_file(path)
+            except GLib.Error:
+                continue
+            removed += len(unused)
+    return removed
+
+
+class UnusedPresetsCollector(Thread):
+    """Thread removing the encoder settings presets of no known project.
+
+    A preset is kept if it's used by one of the specified project files
+    or by their backups.
+
+    Args:
+        uris (List[str]): The URIs of the known project files.
+    """
+
+    def __init__(self, uris):
+        Thread.__init__(self)
+        self.paths = []
+        for uri in uris:
+            path = path_from_uri(uri)
+            self.paths.extend([path, path + "~"])
+
+    def process(self):
+        if not self.paths:
+            # Better keep all the presets than remove the ones used by
+            # the projects missing from the recent files.
+            return
+
+        used = referenced_presets(self.paths)
+        removed = remove_unused_presets(used)
+        self.info("Removed %d unused encoder settings presets", removed)
@@ -17,233 +17,351 @@
 # License along with this program; if not, write to the
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
-"""
-Classes for extracting decoded contents of streams into Python
-
-Code derived from ui/previewer.py.
-"""
-# FIXME reimplement after GES port
+"""Extraction of the decoded audio samples of files into numpy arrays."""
+import threading
 from collections import deque
 
+from gi.repository import GLib
 from gi.repository import Gst
 
 from pitivi.utils.loggable import Loggable
-# from pitivi.elements.singledecodebin import SingleDecodeBin
-# from pitivi.elements.extractionsink import ExtractionSink
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-def linkDynamic(element, target):
 
-    def pad_added(unused_bin, pad, target):
-        compatpad = target.get_compatible_pad(pad)
-        if compatpad:
-            pad.link_full(compatpad, Gst.PAD_LINK_CHECK_NOTHING)
-    element.connect("pad-added", pad_added, target)
+# How long to wait for a sample before checking for errors or cancellation.
+PULL_TIMEOUT = Gst.SECOND // 10
 
 
-def pipeline(graph):
-    E = iter(graph.items())
-    V = iter(graph.keys())
-    p = Gst.Pipeline()
-    p.add(*V)
-    for u, v in E:
-        if v:
-            try:
-                u.link(v)
-            except Gst.LinkError:
-                linkDynamic(u, v)
-    return p
+class ExtractionError(Exception):
+    """The decoding pipeline failed while extracting samples."""
+    pass
 
 
 class Extractee:
-
-    """Abstract base class for receiving raw data from an L{Extractor}."""
+    """Abstract base class for receiving raw data from an `AudioExtractor`."""
 
     def receive(self, array):
-        """
-        Receive a chunk of data from an Extractor.
-
-        @param array: The chunk of data as an array
-        @type array: any kind of numeric array
+        """Receives a chunk of data from an extractor.
 
+        Args:
+            array (numpy.ndarray): The chunk of data.
         """
         raise NotImplementedError
 
     def finalize(self):
-        """
-        Inform the Extractee that receive() will not be called again.
-
-        Indicates that the extraction is complete, so the Extractee should
-            process the data it has received.
+        """Informs the extractee that `receive` will not be called again.
 
+        Indicates that the extraction is complete, so the extractee should
+        process the data it has received.
         """
         raise NotImplementedError
 
 
-class Extractor(Loggable):
-
+class AudioExtractor(Loggable):
+    """Extracts the decoded audio of a range of a file as numpy blocks.
+
+    The samples are converted to interleaved 32-bit floats with the
+    specified rate and number of channels, whatever the format of the file.
+    The arrays have the shape (frames,) for mono and (frames, channels)
+    otherwise.
+
+    Decoding is driven by the consumer: the appsink queues at most
+    `max_buffers` decoded buffers, after which the streaming thread blocks
+    until the next one is pulled. Several extractors can run at the same
+    time, each with its own pipeline, see `AudioExtractionPool`.
+
+    Args:
+        uri (str): The URI of the file to decode.
+        start (int): The position in the file where the range starts, in ns.
+        duration (int): The duration of the range, in ns, or
+            Gst.CLOCK_TIME_NONE to extract until the end of the file.
+        rate (int): The samplerate of the extracted samples.
+        channels (int): The number of channels of the extracted samples.
+        block_size (int): The number of frames of each block, except for the
+            last one which can be shorter. If 0, each decoded buffer is
+            a block.
+        max_buffers (int): The number of decoded buffers which can be queued
+            before decoding pauses.
     """
-    Abstract base class for extraction of raw data from a stream.
 
-    Closely modeled on L{Previewer}.
+    SAMPLE_FORMAT = "F32LE"
 
-    """
-
-    def __init__(self, factory, stream_):
-        """
-        Create a new Extractor.
-
-        @param factory: the factory with which to decode the stream
-        @type factory: L{ObjectFactory}
-        @param stream_: the stream to decode
-        @type stream_: L{Stream}
-        """
+    def __init__(self, uri, start=0, duration=Gst.CLOCK_TIME_NONE, rate=44100,
+                 channels=1, block_size=0, max_buffers=8):
         Loggable.__init__(self)
-        self.debug("Initialized with %s %s", factory, stream_)
-
-    def extract(self, extractee, start, duration):
+        self.uri = uri
+        self.start = start
+        self.duration = duration
+        self.rate = rate
+        self.channels = channels
+        self.block_size = block_size
+        self.max_buffers = max_buffers
+
+        self._cancelled = threading.Event()
+        self._thread = None
+
+    @property
+    def stop(self):
+        """The position in the file where the range ends, in ns, if known."""
+        if self.duration == Gst.CLOCK_TIME_NONE:
+            return Gst.CLOCK_TIME_NONE
+        return self.start + self.duration
+
+    def _create_pipeline(self):
+        pipeline = Gst.parse_launch(
+            "uridecodebin name=decode ! "
+            "audioconvert ! audioresample ! audiorate ! "
+            "capsfilter caps=audio/x-raw,format=(string){format},"
+            "layout=(string)interleaved,rate=(int){rate},channels=(int){channels} ! "
+            "appsink name=sink sync=false drop=false max-buffers={max_buffers}".format(
+                format=self.SAMPLE_FORMAT, rate=self.rate,
+                channels=self.channels, max_buffers=self.max_buffers))
+        decode = pipeline.get_by_name("decode")
+        # Not in the description, which the URI could break.
+        decode.props.uri = self.uri
+        decode.connect("autoplug-select", self._autoplug_select_cb)
+        return pipeline
+
+    # pylint: disable=no-self-use
+    def _autoplug_select_cb(self, unused_decode, unused_pad, unused_caps, factory):
+        # Don't plug video decoders / parsers.
+        if "Video" in factory.get_klass():
+            return True
+        return False
+
+    @staticmethod
+    def _check_errors(pipeline):
+        message = pipeline.get_bus().pop_filtered(Gst.MessageType.ERROR)
+        if message:
+            error, debug = message.parse_error()
+            raise ExtractionError(error.message, debug)
+
+    def _to_array(self, sample):
+        """Converts the specified sample to an array of frames in the range."""
+        buf = sample.get_buffer()
+        data = numpy.frombuffer(buf.extract_dup(0, buf.get_size()),
+                                dtype=numpy.float32)
+        frames = data.reshape((-1, self.channels))
+        if self.channels == 1:
+            frames = frames[:, 0]
+
+        if buf.pts != Gst.CLOCK_TIME_NONE:
+            # The accurate seek does not clip the decoded buffers.
+            first = max(0, (self.start - buf.pts) * self.rate // Gst.SECOND)
+            last = len(frames)
+            if self.stop != Gst.CLOCK_TIME_NONE:
+                last = min(last, (self.stop - buf.pts) * self.rate // Gst.SECOND)
+            frames = frames[first:max(first, last)]
+        return frames
+
+    def _buffers(self):
+        """Yields the decoded buffers in the range as arrays of frames."""
+        pipeline = self._create_pipeline()
+        appsink = pipeline.get_by_name("sink")
+        try:
+            if pipeline.set_state(Gst.State.PAUSED) == Gst.StateChangeReturn.FAILURE:
+                self._check_errors(pipeline)
+                raise ExtractionError("Could not preroll %s" % self.uri)
+            res, unused_state, unused_pending = pipeline.get_state(Gst.CLOCK_TIME_NONE)
+            if res == Gst.StateChangeReturn.FAILURE:
+                self._check_errors(pipeline)
+                raise ExtractionError("Could not preroll %s" % self.uri)
+
+            if self.stop == Gst.CLOCK_TIME_NONE:
+                stop_type = Gst.SeekType.NONE
+            else:
+                stop_type = Gst.SeekType.SET
+            if not pipeline.seek(1.0, Gst.Format.TIME,
+                                 Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE,
+                                 Gst.SeekType.SET, self.start,
+                                 stop_type, self.stop):
+                self.warning("Seek to %s failed in %s", self.start, self.uri)
+            pipeline.set_state(Gst.State.PLAYING)
+
+            while not self._cancelled.is_set():
+                sample = appsink.emit("try-pull-sample", PULL_TIMEOUT)
+                if sample:
+                    frames = self._to_array(sample)
+                    if len(frames):
+                        yield frames
+                    continue
+
+                self._check_errors(pipeline)
+                if appsink.is_eos():
+                    break
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+
+    def blocks(self):
+        """Yields the extracted samples, in the calling thread.
+
+        This blocks while decoding, so when called in the main thread it
+        should be used only for short ranges. See `extract`.
+
+        Raises:
+            ExtractionError: When decoding fails.
         """
-        Extract the raw data corresponding to a segment of the stream.
-
-        @param extractee: the L{Extractee} that will receive the raw data
-        @type extractee: L{Extractee}
-        @param start: The point in the stream at which the segment starts
-            (nanoseconds)
-        @type start: L{long}
-        @param duration: The duration of the segment (nanoseconds)
-        @type duration: L{long}
-
+        if not self.block_size:
+            yield from self._buffers()
+            return
+
+        pending = deque()
+        pending_frames = 0
+        for frames in self._buffers():
+            pending.append(frames)
+            pending_frames += len(frames)
+            if pending_frames < self.block_size:
+                continue
+
+            data = numpy.concatenate(pending)
+            pending.clear()
+            full = len(data) - len(data) % self.block_size
+            for i in range(0, full, self.block_size):
+                yield data[i:i + self.block_size]
+            pending_frames = len(data) - full
+            if pending_frames:
+                pending.append(data[full:])
+
+        if pending_frames and not self._cancelled.is_set():
+            yield numpy.concatenate(pending)
+
+    def extract(self, extractee, error_cb=None, max_pending_blocks=4):
+        """Extracts the samples in a thread and passes them to the extractee.
+
+        The extractee is called in the main thread. At most
+        `max_pending_blocks` blocks wait to be received, after which
+        decoding pauses.
+
+        Args:
+            extractee (Extractee): The object receiving the blocks.
+            error_cb (Optional[function]): Called in the main thread with
+                the ExtractionError if decoding fails, instead of finalizing
+                the extractee. Not called once cancelled.
+            max_pending_blocks (int): The number of blocks which can wait
+                to be received.
         """
-        raise NotImplementedError
-
-
-class RandomAccessExtractor(Extractor):
-
+        assert self._thread is None
+        self._thread = threading.Thread(target=self.__run,
+                                        args=(extractee, error_cb,
+                                              threading.Semaphore(max_pending_blocks)),
+                                        daemon=True)
+        self._thread.start()
+
+    def __run(self, extractee, error_cb, pending_blocks):
+        try:
+            for block in self.blocks():
+                while not pending_blocks.acquire(timeout=PULL_TIMEOUT / Gst.SECOND):
+                    if self._cancelled.is_set():
+                        return
+                GLib.idle_add(self.__deliver, extractee, block, pending_blocks)
+        except ExtractionError as e:
+            self.error("Failed extracting %s: %s", self.uri, e)
+            if error_cb and not self._cancelled.is_set():
+                GLib.idle_add(self.__fail, error_cb, e)
+            return
+        except Exception as e:
+            # Reported like a decoding error, so the caller, for example
+            # the AudioExtractionPool, does not wait forever.
+            self.error("Unexpected error while extracting %s: %s", self.uri, e)
+            if error_cb and not self._cancelled.is_set():
+                GLib.idle_add(self.__fail, error_cb, ExtractionError(str(e)))
+            return
+
+        if not self._cancelled.is_set():
+            GLib.idle_add(self.__finalize, extractee)
+
+    def __deliver(self, extractee, block, pending_blocks):
+        if not self._cancelled.is_set():
+            extractee.receive(block)
+        pending_blocks.release()
+        return False
+
+    def __fail(self, error_cb, error):
+        # The extraction might have been cancelled in the meantime.
+        if not self._cancelled.is_set():
+            error_cb(error)
+        return False
+
+    def __finalize(self, extractee):
+        if not self._cancelled.is_set():
+            extractee.finalize()
+        return False
+
+    def cancel(self):
+        """Stops the extraction, the extractee is not finalized."""
+        self._cancelled.set()
+
+
+class AudioExtractionPool(Loggable):
+    """Runs audio extractions with a bounded number of concurrent pipelines.
+
+    Attributes:
+        max_jobs (int): The maximum number of extractions running at a time.
     """
-    Abstract class for L{Extractor}s of random access streams.
-
-    Closely inspired by L{RandomAccessPreviewer}.
-
-    """
-
-    def __init__(self, factory, stream_):
-        Extractor.__init__(self, factory, stream_)
-        # FIXME:
-        # why doesn't this work?
-        # bin = factory.makeBin(stream_)
-        uri = factory.uri
-        caps = stream_.caps
-        bin = SingleDecodeBin(uri=uri, caps=caps, stream=stream_)
-
-        self._pipelineInit(factory, bin)
-
-    def _pipelineInit(self, factory, bin):
-        """
-        Create the pipeline for the preview process.
-
-        Subclasses should
-        override this method and create a pipeline, connecting to
-        callbacks to the appropriate signals, and prerolling the
-        pipeline if necessary.
 
+    def __init__(self, max_jobs=2):
+        Loggable.__init__(self)
+        self.max_jobs = max_jobs
+        self._pending = deque()
+        self._running = []
+
+    def add(self, extractor, extractee, error_cb=None):
+        """Queues an extraction.
+
+        Args:
+            extractor (AudioExtractor): The extractor of the range.
+            extractee (Extractee): The object receiving the blocks.
+            error_cb (Optional[function]): Called with the ExtractionError
+                if decoding fails.
         """
-        raise NotImplementedError
-
-
-class RandomAccessAudioExtractor(RandomAccessExtractor):
-
-    """
-    L{Extractor} for random access audio streams.
+        self._pending.append((extractor, extractee, error_cb))
+        self._start_next()
+
+    def _start_next(self):
+        while self._pending and len(self._running) < self.max_jobs:
+            extractor, extractee, error_cb = self._pending.popleft()
+            self.debug("Extracting %s from %s", extractor.uri, extractor.start)
+            self._running.append(extractor)
+            extractor.extract(_PoolExtractee(self, extractor, extractee),
+                              error_cb=lambda error, extractor=extractor, error_cb=error_cb:
+                              self._job_failed(extractor, error, error_cb))
+
+    def _job_done(self, extractor):
+        if extractor not in self._running:
+            # Cancelled, see `cancel`.
+            return
+        self._running.remove(extractor)
+        self._start_next()
+
+    def _job_failed(self, extractor, error, error_cb):
+        self._job_done(extractor)
+        if error_cb:
+            error_cb(error)
+        return False
+
+    def cancel(self):
+        """Cancels the running and pending extractions."""
+        self._pending.clear()
+        for extractor in self._running:
+            extractor.cancel()
+        self._running = []
+
+
+class _PoolExtractee(Extractee):
+    """Forwards the blocks to an extractee and notifies the pool at the end."""
+
+    def __init__(self, pool, extractor, extractee):
+        self._pool = pool
+        self._extractor = extractor
+        self._extractee = extractee
 
-    Closely inspired by L{RandomAccessAudioPreviewer}.
-
-    """
+    def receive(self, array):
+        self._extractee.receive(array)
 
-    def __init__(self, factory, stream_):
-        self._queue = deque()
-        RandomAccessExtractor.__init__(self, factory, stream_)
-        self._ready = False
-
-    def _pipelineInit(self, factory, sbin):
-        self.audioSink = ExtractionSink()
-        self.audioSink.set_stopped_cb(self._finishSegment)
-        # This audiorate element ensures that the extracted raw-data
-        # timeline matches the timestamps used for seeking, even if the
-        # audio source has gaps or other timestamp abnormalities.
-        audiorate = Gst.ElementFactory.make("audiorate")
-        conv = Gst.ElementFactory.make("audioconvert")
-        q = Gst.ElementFactory.make("queue")
-        self.audioPipeline = pipeline({
-            sbin: audiorate,
-            audiorate: conv,
-            conv: q,
-            q: self.audioSink,
-            self.audioSink: None})
-        bus = self.audioPipeline.get_bus()
-        bus.add_signal_watch()
-        bus.connect("message::error", self._busMessageErrorCb)
-        self._donecb_id = bus.connect("message::async-done",
-                                      self._busMessageAsyncDoneCb)
-
-        self.audioPipeline.set_state(Gst.State.PAUSED)
-        # The audiopipeline.set_state() method does not take effect
-        # immediately, but the extraction process (and in particular
-        # self._startSegment) will not work properly until
-        # self.audioPipeline reaches the desired state (State.PAUSED).
-        # To ensure that this is the case, we wait until the ASYNC_DONE
-        # message is received before setting self._ready = True,
-        # which enables extraction to proceed.
-
-    def _busMessageErrorCb(self, unused_bus, message):
-        error, debug = message.parse_error()
-        self.error("Event bus error: %s; %s", error, debug)
-
-        return Gst.BusSyncReply.PASS
-
-    def _busMessageAsyncDoneCb(self, bus, unused_message):
-        self.debug("Pipeline is ready for seeking")
-        bus.disconnect(self._donecb_id)  # Don't call me again
-        self._ready = True
-        if self._queue:  # Someone called .extract() before we were ready
-            self._run()
-
-    def _startSegment(self, timestamp, duration):
-        self.debug("processing segment with timestamp=%i and duration=%i",
-                   timestamp, duration)
-        res = self.audioPipeline.seek(1.0,
-                                      Gst.Format.TIME,
-                                      Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE,
-                                      Gst.SeekType.SET, timestamp,
-                                      Gst.SeekType.SET, timestamp + duration)
-        if not res:
-            self.warning("seek failed %s", timestamp)
-        self.audioPipeline.set_state(Gst.State.PLAYING)
-
-        return res
-
-    def _finishSegment(self):
-        self.audioSink.extractee.finalize()
-        self.audioSink.reset()
-        self._queue.popleft()
-        # If there's more to do, keep running
-        if self._queue:
-            self._run()
-
-    def extract(self, extractee, start, duration):
-        stopped = not self._queue
-        self._queue.append((extractee, start, duration))
-        if stopped and self._ready:
-            self._run()
-        # if self._ready is False, self._run() will be called from
-        # self._busMessageDoneCb().
-
-    def _run(self):
-        # Control flows in a cycle:
-        # _run -> _startSegment -> busMessageSegmentDoneCb -> _finishSegment -> _run
-        # This forms a loop that extracts an entire segment (i.e. satisfies an
-        # extract request) in each cycle. The cycle
-        # runs until the queue of Extractees empties.  If the cycle is not
-        # running, extract() will kick it off again.
-        extractee, start, duration = self._queue[0]
-        self.audioSink.set_extractee(extractee)
-        self._startSegment(start, duration)
+    def finalize(self):
+        self._extractee.finalize()
+        self._pool._job_done(self._extractor)
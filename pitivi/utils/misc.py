@@ -18,6 +18,7 @@
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
 import bisect
+import concurrent.futures
 import hashlib
 import os
 import subprocess
@@ -30,6 +31,7 @@ from urllib.parse import urlsplit
 
 from gi.repository import GdkPixbuf
 from gi.repository import GES
+from gi.repository import Gio
 from gi.repository import GLib
 from gi.repository import Gst
 from gi.repository import Gtk
@@ -38,6 +40,7 @@ import pitivi.utils.loggable as log
 from pitivi.configure import APPMANUALURL_OFFLINE
 from pitivi.configure import APPMANUALURL_ONLINE
 from pitivi.configure import APPNAME
+from pitivi.utils.compression import write_compressed
 from pitivi.utils.threads import Thread
 
 
@@ -186,50 +189,326 @@ def quote_uri(uri):
 
 
 class PathWalker(Thread):
-    """Thread for recursively searching in a list of directories."""
+    """Thread for recursively searching in a list of directories.
 
-    def __init__(self, uris, callback):
+    The directories are scanned in parallel by a bounded number of worker
+    threads. The files found are passed in batches to the callback, so
+    they can be imported while the scanning continues.
+
+    Args:
+        uris (List[str]): The URIs of the files and directories to scan.
+        callback (function): Called in the main thread with each batch of
+            file URIs.
+        accept (Optional[function]): Called in the worker threads with the
+            name of each file found in the directories, returns whether
+            the file should be passed to the callback.
+        progress_cb (Optional[function]): Called in the main thread with
+            the PathWalker, while scanning.
+        done_cb (Optional[function]): Called in the main thread with the
+            PathWalker when the scanning is finished or aborted.
+
+    Attributes:
+        scanned_dirs (int): The number of directories scanned so far.
+        found_files (int): The number of files accepted so far.
+    """
+
+    MAX_JOBS = 4
+    BATCH_SIZE = 100
+    # How long the found files can wait before being passed, in seconds.
+    BATCH_DELAY = 0.5
+
+    def __init__(self, uris, callback, accept=None, progress_cb=None, done_cb=None):
         Thread.__init__(self)
         self.log("New PathWalker for %s", uris)
         self.uris = uris
         self.callback = callback
+        self.accept = accept
+        self.progress_cb = progress_cb
+        self.done_cb = done_cb
         self.stopme = threading.Event()
+        self.scanned_dirs = 0
+        self.found_files = 0
+        self.__batch = []
+        self.__last_flush = time.monotonic()
+
+    def _scan_dir(self, folder):
+        """Lists the folder.
 
-    def _scan(self, uris):
-        """Scans the URIs and yields the file URIs."""
-        for uri in uris:
-            if self.stopme.is_set():
-                return
+        Returns:
+            (List[str], List[str]): The URIs of the accepted files and the
+            paths of the subdirectories.
+        """
+        self.log("Scanning folder %s", folder)
+        files = []
+        dirs = []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if self.stopme.is_set():
+                    break
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                elif entry.is_file() and (not self.accept or self.accept(entry.name)):
+                    files.append(Gst.filename_to_uri(entry.path))
+        files.sort()
+        return files, dirs
+
+    def __add(self, uris):
+        self.__batch.extend(uris)
+        self.found_files += len(uris)
+        if len(self.__batch) >= self.BATCH_SIZE:
+            self.__flush()
+
+    def __flush(self):
+        self.__last_flush = time.monotonic()
+        if self.progress_cb:
+            GLib.idle_add(call_false, self.progress_cb, self)
+        if self.__batch:
+            GLib.idle_add(call_false, self.callback, self.__batch)
+            self.__batch = []
+
+    def process(self):
+        folders = []
+        files = []
+        for uri in self.uris:
             url = urlparse(uri)
             if not url.scheme == 'file':
                 self.fixme("Unsupported URI: %s", uri)
                 continue
             path = unquote(url.path)
             if os.path.isfile(path):
-                yield uri
+                files.append(uri)
             elif os.path.isdir(path):
-                yield from self._scan_dir(path)
+                folders.append(path)
             else:
                 self.warning("Unusable, not a file nor a dir: %s, %s", uri, path)
-
-    def _scan_dir(self, folder):
-        """Scans the folder recursively and yields the URIs of the files."""
-        self.log("Scanning folder %s", folder)
-        for path, dirs, files in os.walk(folder):
-            if self.stopme.is_set():
-                return
-            for afile in files:
-                yield Gst.filename_to_uri(os.path.join(path, afile))
-
-    def process(self):
-        uris = list(self._scan(self.uris))
-        if uris:
-            GLib.idle_add(self.callback, uris)
+        self.__add(files)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.MAX_JOBS) as executor:
+            pending = {executor.submit(self._scan_dir, folder) for folder in folders}
+            while pending and not self.stopme.is_set():
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=self.BATCH_DELAY,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        files, subfolders = future.result()
+                    except OSError as e:
+                        self.warning("Cannot scan folder: %s", e)
+                        continue
+                    self.scanned_dirs += 1
+                    self.__add(files)
+                    pending.update(executor.submit(self._scan_dir, subfolder)
+                                   for subfolder in subfolders)
+
+                if time.monotonic() - self.__last_flush > self.BATCH_DELAY:
+                    self.__flush()
+
+            for future in pending:
+                future.cancel()
+
+        if not self.stopme.is_set():
+            self.__flush()
+        if self.done_cb:
+            GLib.idle_add(call_false, self.done_cb, self)
 
     def abort(self):
         self.stopme.set()
 
 
+class FileInfoCache(log.Loggable):
+    """Cache of the existence, size and mtime of files, filled per directory.
+
+    Listing a directory asynchronously is much cheaper than querying its
+    files one by one, especially on network file systems, so the parent
+    directory of the files of interest is enumerated with `prefetch`.
+    Until a listing finishes, the files are queried individually.
+
+    The cache does not notice the files changed by others, so it is
+    meant to be used for a limited time, for example while a project
+    loads its assets. It caches only between `enable` and `clear`,
+    otherwise the files are queried every time.
+    """
+
+    ATTRIBUTES = ",".join([Gio.FILE_ATTRIBUTE_STANDARD_NAME,
+                           Gio.FILE_ATTRIBUTE_STANDARD_SIZE,
+                           Gio.FILE_ATTRIBUTE_TIME_MODIFIED,
+                           Gio.FILE_ATTRIBUTE_TIME_MODIFIED_USEC])
+    # How many files are fetched at once when enumerating a directory.
+    BATCH_SIZE = 100
+
+    def __init__(self):
+        log.Loggable.__init__(self)
+        # The (size, mtime) of the known files, by URI. None if it does
+        # not exist.
+        self.__stats = {}
+        # The URIs of the directories fully enumerated.
+        self.__listed = set()
+        # The cancellables of the enumerations in progress, by directory URI.
+        self.__listing = {}
+        # The URIs of the files changed since their directory was enumerated.
+        self.__stale = set()
+        self.__enabled = False
+
+    def enable(self):
+        """Starts caching, until `clear` is called."""
+        self.__enabled = True
+
+    def prefetch(self, uri):
+        """Starts enumerating the directory containing the specified file.
+
+        Args:
+            uri (str): The URI of a file of interest.
+        """
+        if not self.__enabled:
+            return
+        directory = Gio.File.new_for_uri(uri).get_parent()
+        if not directory:
+            return
+        dir_uri = directory.get_uri()
+        if dir_uri in self.__listed or dir_uri in self.__listing:
+            return
+
+        self.debug("Enumerating %s", dir_uri)
+        cancellable = Gio.Cancellable()
+        self.__listing[dir_uri] = cancellable
+        directory.enumerate_children_async(self.ATTRIBUTES,
+                                           Gio.FileQueryInfoFlags.NONE,
+                                           GLib.PRIORITY_LOW, cancellable,
+                                           self.__enumerateCb, cancellable)
+
+    def __enumerateCb(self, directory, result, cancellable):
+        try:
+            enumerator = directory.enumerate_children_finish(result)
+        except GLib.Error as e:
+            self.__enumerationFailed(directory, cancellable, e)
+            return
+
+        enumerator.next_files_async(self.BATCH_SIZE, GLib.PRIORITY_LOW, cancellable,
+                                    self.__nextFilesCb, (directory, cancellable))
+
+    def __nextFilesCb(self, enumerator, result, user_data):
+        directory, cancellable = user_data
+        try:
+            infos = enumerator.next_files_finish(result)
+        except GLib.Error as e:
+            self.__enumerationFailed(directory, cancellable, e)
+            return
+
+        if cancellable.is_cancelled():
+            return
+
+        for info in infos:
+            uri = directory.get_child(info.get_name()).get_uri()
+            self.__stats[uri] = self.__stat(info)
+
+        if infos:
+            enumerator.next_files_async(self.BATCH_SIZE, GLib.PRIORITY_LOW, cancellable,
+                                        self.__nextFilesCb, user_data)
+            return
+
+        enumerator.close_async(GLib.PRIORITY_LOW, None, None, None)
+        dir_uri = directory.get_uri()
+        del self.__listing[dir_uri]
+        self.__listed.add(dir_uri)
+        self.debug("Enumerated %s", dir_uri)
+
+    def __enumerationFailed(self, directory, cancellable, error):
+        if cancellable.is_cancelled():
+            return
+        self.warning("Failed enumerating %s: %s", directory.get_uri(), error)
+        del self.__listing[directory.get_uri()]
+
+    @staticmethod
+    def __stat(info):
+        mtime = info.get_attribute_uint64(Gio.FILE_ATTRIBUTE_TIME_MODIFIED) * Gst.SECOND + \
+            info.get_attribute_uint32(Gio.FILE_ATTRIBUTE_TIME_MODIFIED_USEC) * Gst.USECOND
+        return info.get_size(), mtime
+
+    def query_stat(self, uri):
+        """Gets the size and the modification time of the specified file.
+
+        Args:
+            uri (str): The URI of the file.
+
+        Returns:
+            Optional[Tuple[int, int]]: The size in bytes and the modification
+                time in ns, with a µs precision, or None if the file does
+                not exist.
+
+        Raises:
+            GLib.Error: If the file cannot be queried.
+        """
+        # Make sure the URIs compare equal however they are escaped.
+        gfile = Gio.File.new_for_uri(uri)
+        uri = gfile.get_uri()
+        try:
+            return self.__stats[uri]
+        except KeyError:
+            pass
+
+        parent = gfile.get_parent()
+        if parent and parent.get_uri() in self.__listed and uri not in self.__stale:
+            return None
+
+        try:
+            stat = self.__stat(gfile.query_info(self.ATTRIBUTES,
+                                                Gio.FileQueryInfoFlags.NONE,
+                                                None))
+        except GLib.Error as e:
+            if not e.matches(Gio.io_error_quark(), Gio.IOErrorEnum.NOT_FOUND):
+                raise
+            stat = None
+        if not self.__enabled:
+            return stat
+        self.__stats[uri] = stat
+        self.__stale.discard(uri)
+        return stat
+
+    def query_size(self, uri):
+        """Gets the size of the specified file.
+
+        Args:
+            uri (str): The URI of the file.
+
+        Returns:
+            int: The size in bytes, or None if the file does not exist.
+
+        Raises:
+            GLib.Error: If the file cannot be queried.
+        """
+        stat = self.query_stat(uri)
+        if stat is None:
+            return None
+        return stat[0]
+
+    def exists(self, uri):
+        """Returns whether the specified file exists."""
+        try:
+            return self.query_size(uri) is not None
+        except GLib.Error as e:
+            self.warning("Failed querying %s: %s", uri, e)
+            return Gio.File.new_for_uri(uri).query_exists(None)
+
+    def invalidate(self, uri):
+        """Forgets what is known about the specified file.
+
+        To be called after creating, moving or removing the file.
+        """
+        uri = Gio.File.new_for_uri(uri).get_uri()
+        self.__stats.pop(uri, None)
+        self.__stale.add(uri)
+
+    def clear(self):
+        """Cancels the enumerations, forgets everything and stops caching."""
+        for cancellable in self.__listing.values():
+            cancellable.cancel()
+        self.__listing = {}
+        self.__listed = set()
+        self.__stats = {}
+        self.__stale = set()
+        self.__enabled = False
+
+
 def hash_file(uri):
     """Hashes the first 256KB of the specified file."""
     sha256 = hashlib.sha256()
@@ -242,6 +521,42 @@ def hash_file(uri):
     return sha256.hexdigest()
 
 
+def write_file_atomically(path, data, compress=False):
+    """Replaces the content of the file, durably.
+
+    The data is written in a temporary file which is flushed to the disk
+    and renamed over the file, so the file has either the old or the new
+    content, even in case of a crash.
+
+    Args:
+        path (str): The path of the file.
+        data (bytes): The new content.
+        compress (Optional[bool]): Whether to compress the data, see
+            `pitivi.utils.compression`.
+    """
+    tmp_path = "%s.%d.tmp" % (path, threading.get_ident())
+    try:
+        with open(tmp_path, "wb") as tmp_file:
+            if compress:
+                write_compressed(tmp_file, data)
+            else:
+                tmp_file.write(data)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Make sure the rename is on the disk.
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
 def quantize(input, interval):
     return (input // interval) * interval
 
@@ -16,7 +16,12 @@
 # License along with this program; if not, write to the
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
+import contextlib
+import json
+import multiprocessing
 import os
+import shutil
+import threading
 import time
 
 from gi.repository import GES
@@ -30,6 +35,9 @@ from gi.repository import GstTranscoder
 from pitivi.configure import get_gstpresets_dir
 from pitivi.settings import GlobalSettings
 from pitivi.utils.loggable import Loggable
+from pitivi.utils.misc import FileInfoCache
+from pitivi.utils.proxystore import ProxyStore
+from pitivi.utils.system import get_available_memory
 
 # Make sure gst knowns about our own GstPresets
 Gst.preset_set_app_dir(get_gstpresets_dir())
@@ -41,15 +49,57 @@ class ProxyingStrategy:
     NOTHING = "nothing"
 
 
+class ProxyJobPriority:
+    """Priorities of the transcoding jobs, the lowest is started first."""
+    # The asset is used in the timeline or selected in the media library.
+    HIGH = 0
+    NORMAL = 1
+    # The lower levels of the proxy ladder.
+    LOW = 2
+
+
+class ProxyLevel:
+    """Levels of the proxy ladder, by decreasing resolution.
+
+    The resolution of a level is the resolution of the asset divided by
+    `2 ** level`.
+    """
+    FULL = 0
+    HALF = 1
+    QUARTER = 2
+
+    # The suffixes of the names of the lower levels proxy files.
+    SUFFIXES = {HALF: "half", QUARTER: "quarter"}
+
+
 GlobalSettings.addConfigSection("proxy")
 GlobalSettings.addConfigOption('proxyingStrategy',
                                section='proxy',
                                key='proxying-strategy',
                                default=ProxyingStrategy.AUTOMATIC)
+# 0 means the number of jobs depends on the available CPUs and memory.
 GlobalSettings.addConfigOption('numTranscodingJobs',
                                section='proxy',
                                key='num-proxying-jobs',
-                               default=4)
+                               default=0)
+# The maximum number of segments of a single asset transcoded at the
+# same time. 0 means as many as the number of transcoding jobs.
+GlobalSettings.addConfigOption('numSegmentTranscodingJobs',
+                               section='proxy',
+                               key='num-segment-proxying-jobs',
+                               default=0)
+# The directory where the proxies are created. If empty, the proxies are
+# created next to the original files.
+GlobalSettings.addConfigOption('proxyStoreDir',
+                               section='proxy',
+                               key='proxy-store-dir',
+                               default='')
+# Whether to create half and quarter resolution proxies, used for
+# playback when the full resolution proxies cannot be played smoothly.
+GlobalSettings.addConfigOption('proxyLadder',
+                               section='proxy',
+                               key='proxy-ladder',
+                               default=False)
 GlobalSettings.addConfigOption("max_cpu_usage",
                                section="proxy",
                                key="max-cpu-usage",
@@ -59,6 +109,71 @@ GlobalSettings.addConfigOption("max_cpu_usage",
 ENCODING_FORMAT_PRORES = "prores-opus-in-matroska.gep"
 ENCODING_FORMAT_JPEG = "jpeg-opus-in-matroska.gep"
 
+# Rough estimate of the memory used by a transcoder, in bytes.
+TRANSCODING_JOB_MEMORY = 512 * 1024 * 1024
+
+# The original assets of the lower levels proxies, by proxy URI. GES
+# knows only the full resolution proxies, see `get_proxy_target`.
+LADDER_TARGETS = {}
+
+# The assets at least twice as long are transcoded in segments of this
+# duration, so the transcoding can be resumed after a restart and the
+# segments can be transcoded in parallel.
+PROXY_SEGMENT_DURATION = 2 * 60 * Gst.SECOND
+
+
+class CapabilityIndex(Loggable):
+    """Index of the available encoders and decoders.
+
+    The factories are listed once per generation of the GStreamer registry,
+    and the lookups are memoized, so they are computed again only when
+    plugins are added or removed.
+    """
+
+    def __init__(self):
+        Loggable.__init__(self)
+        self.__cookie = None
+        self.__factories = {}
+        self.__lookups = {}
+
+    def generation(self):
+        """Gets the generation of the registry, updating the index if needed.
+
+        Returns:
+            int: A value which changes when the available features change.
+        """
+        cookie = Gst.Registry.get().get_feature_list_cookie()
+        if cookie != self.__cookie:
+            self.debug("Indexing the encoders and decoders")
+            self.__cookie = cookie
+            self.__factories = {
+                factory_type: Gst.ElementFactory.list_get_elements(
+                    factory_type, Gst.Rank.MARGINAL)
+                for factory_type in (Gst.ELEMENT_FACTORY_TYPE_ENCODER,
+                                     Gst.ELEMENT_FACTORY_TYPE_DECODER)}
+            self.__lookups = {}
+        return cookie
+
+    def __has_factory(self, factory_type, direction, caps):
+        self.generation()
+        key = (factory_type, caps.to_string())
+        found = self.__lookups.get(key)
+        if found is None:
+            found = bool(Gst.ElementFactory.list_filter(
+                self.__factories[factory_type], caps, direction, False))
+            self.__lookups[key] = found
+        return found
+
+    def can_encode(self, caps):
+        """Returns whether an encoder can produce the specified caps."""
+        return self.__has_factory(Gst.ELEMENT_FACTORY_TYPE_ENCODER,
+                                  Gst.PadDirection.SRC, caps)
+
+    def can_decode(self, caps):
+        """Returns whether a decoder can consume the specified caps."""
+        return self.__has_factory(Gst.ELEMENT_FACTORY_TYPE_DECODER,
+                                  Gst.PadDirection.SINK, caps)
+
 
 def createEncodingProfileSimple(container_caps, audio_caps, video_caps):
     c = GstPbutils.EncodingContainerProfile.new(None, None,
@@ -75,6 +190,490 @@ def createEncodingProfileSimple(container_caps, audio_caps, video_caps):
     return c
 
 
+class SegmentedProxyJob(Loggable):
+    """Transcoding job of an asset split in fixed-duration segments.
+
+    The segments are transcoded in a directory next to the proxy, where a
+    manifest records the completed segments, so the job can be resumed
+    after a restart. The segments are independent, so several of them can
+    be transcoded at the same time. When all the segments are done, they
+    are concatenated losslessly into the proxy.
+
+    Args:
+        asset (GES.UriClipAsset): The original asset.
+        proxy_uri (str): The URI of the proxy to be created.
+        encoding_format (str): The encoding target file used for
+            transcoding the segments.
+        segment_duration (int): The duration of the segments, in ns.
+    """
+
+    MANIFEST_VERSION = 1
+
+    def __init__(self, asset, proxy_uri, encoding_format,
+                 segment_duration=PROXY_SEGMENT_DURATION):
+        Loggable.__init__(self)
+        self.asset = asset
+        self.proxy_uri = proxy_uri
+        self.encoding_format = encoding_format
+        self.segment_duration = segment_duration
+        self.directory = Gst.uri_get_location(proxy_uri) + ".parts"
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+
+        duration = asset.get_duration()
+        # The (start, stop) positions of the segments.
+        self.segments = [(start, min(start + segment_duration, duration))
+                         for start in range(0, duration, segment_duration)]
+        # The indexes of the completed segments.
+        self.done = set()
+        # The transcoded positions of the running segments, by index.
+        self.positions = {}
+        self.__discoverer = None
+        self.__concat_pipeline = None
+
+        self.__load_manifest()
+        # The duration transcoded before the job has been created.
+        self.resumed_duration = self.transcoded_duration()
+
+    def __manifest_header(self):
+        return {"version": self.MANIFEST_VERSION,
+                "uri": self.asset.get_id(),
+                "duration": self.asset.get_duration(),
+                "segment-duration": self.segment_duration,
+                "encoding-format": self.encoding_format}
+
+    def __load_manifest(self):
+        try:
+            with open(self.manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.warning("Discarding unreadable manifest %s: %s",
+                         self.manifest_path, e)
+            self.remove()
+            return
+
+        for key, value in self.__manifest_header().items():
+            if manifest.get(key) != value:
+                self.info("Discarding segments transcoded with different %s: %s",
+                          key, self.directory)
+                self.remove()
+                return
+
+        self.done = {index for index in manifest.get("done", [])
+                     if isinstance(index, int) and
+                     0 <= index < len(self.segments) and
+                     os.path.exists(self.segment_path(index))}
+        self.info("Resuming %s with %d/%d segments done",
+                  self.asset.get_id(), len(self.done), len(self.segments))
+
+    def __save_manifest(self):
+        manifest = self.__manifest_header()
+        manifest["done"] = sorted(self.done)
+        # Write atomically so the manifest is not lost in a crash.
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def segment_path(self, index):
+        """Gets the path of the transcoded segment with the specified index."""
+        return os.path.join(self.directory, "segment-%05d.mkv" % index)
+
+    def waveform_path(self, index):
+        """Gets the path of the waveform of the specified segment."""
+        return os.path.join(self.directory, "segment-%05d.wave.npy" % index)
+
+    def pending_segments(self):
+        """Gets the indexes of the segments not done and not running."""
+        return [index for index in range(len(self.segments))
+                if index not in self.done and index not in self.positions]
+
+    def is_complete(self):
+        """Returns whether all the segments have been transcoded."""
+        return len(self.done) == len(self.segments)
+
+    def start_segment(self, index):
+        """Marks the specified segment as running.
+
+        Returns:
+            str: The URI where the segment should be transcoded.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.positions[index] = self.segments[index][0]
+        return Gst.filename_to_uri(self.segment_path(index) + ".part")
+
+    def segment_done(self, index):
+        """Records the specified segment as done in the manifest."""
+        os.replace(self.segment_path(index) + ".part", self.segment_path(index))
+        self.positions.pop(index, None)
+        self.done.add(index)
+        self.__save_manifest()
+
+    def discard_segment(self, index):
+        """Forgets the running segment, removing what was transcoded of it."""
+        self.positions.pop(index, None)
+        try:
+            os.remove(self.segment_path(index) + ".part")
+        except FileNotFoundError:
+            pass
+
+    def transcoded_duration(self):
+        """Gets the duration transcoded so far, in ns."""
+        duration = sum(stop - start for index, (start, stop) in enumerate(self.segments)
+                       if index in self.done)
+        for index, position in self.positions.items():
+            start, stop = self.segments[index]
+            duration += max(0, min(position, stop) - start)
+        return duration
+
+    def concatenate(self, dest_uri, callback):
+        """Concatenates the transcoded segments without re-encoding them.
+
+        Args:
+            dest_uri (str): The URI of the file to be created.
+            callback (function): Called with the job and a GLib.Error or
+                None when the concatenation is over.
+        """
+        assert self.is_complete()
+        # The streams of the segments are discovered asynchronously,
+        # so the main thread is not blocked.
+        self.__discoverer = GstPbutils.Discoverer.new(10 * Gst.SECOND)
+        self.__discoverer.connect("discovered", self.__discovered_cb,
+                                  dest_uri, callback)
+        self.__discoverer.start()
+        self.__discoverer.discover_uri_async(Gst.filename_to_uri(self.segment_path(0)))
+
+    def __discovered_cb(self, discoverer, info, error, dest_uri, callback):
+        discoverer.stop()
+        self.__discoverer = None
+        if error:
+            callback(self, error)
+            return
+
+        pipeline = Gst.Pipeline.new(None)
+        muxer = Gst.ElementFactory.make("matroskamux", None)
+        sink = Gst.ElementFactory.make("filesink", None)
+        sink.props.location = Gst.uri_get_location(dest_uri)
+        pipeline.add(muxer)
+        pipeline.add(sink)
+        muxer.link(sink)
+
+        # The concat sink pads by demuxer pad name, in the segments order.
+        concat_pads = {}
+        for media_type, streams in (("video", info.get_video_streams()),
+                                    ("audio", info.get_audio_streams())):
+            for i in range(len(streams)):
+                concat = Gst.ElementFactory.make("concat", None)
+                queue = Gst.ElementFactory.make("queue", None)
+                pipeline.add(concat)
+                pipeline.add(queue)
+                concat.link(queue)
+                queue.get_static_pad("src").link(
+                    muxer.get_request_pad("%s_%%u" % media_type))
+                concat_pads["%s_%d" % (media_type, i)] = [
+                    concat.get_request_pad("sink_%u") for unused in self.segments]
+
+        for index in range(len(self.segments)):
+            filesrc = Gst.ElementFactory.make("filesrc", None)
+            filesrc.props.location = self.segment_path(index)
+            demux = Gst.ElementFactory.make("matroskademux", None)
+            pipeline.add(filesrc)
+            pipeline.add(demux)
+            filesrc.link(demux)
+            demux.connect("pad-added", self.__demux_pad_added_cb, concat_pads, index)
+
+        bus = pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self.__concat_bus_message_cb, callback)
+        self.__concat_pipeline = pipeline
+        pipeline.set_state(Gst.State.PLAYING)
+
+    def __demux_pad_added_cb(self, unused_demux, pad, concat_pads, index):
+        pads = concat_pads.get(pad.get_name())
+        if not pads:
+            self.warning("Ignoring unexpected stream %s in segment %d",
+                         pad.get_name(), index)
+            return
+        pad.link(pads[index])
+
+    def __concat_bus_message_cb(self, bus, message, callback):
+        if message.type == Gst.MessageType.EOS:
+            error = None
+        elif message.type == Gst.MessageType.ERROR:
+            error, unused_details = message.parse_error()
+        else:
+            return
+
+        bus.remove_signal_watch()
+        self.cancel()
+        callback(self, error)
+
+    def cancel(self):
+        """Stops the concatenation, if running."""
+        if self.__discoverer:
+            self.__discoverer.disconnect_by_func(self.__discovered_cb)
+            self.__discoverer.stop()
+            self.__discoverer = None
+        if self.__concat_pipeline:
+            self.__concat_pipeline.set_state(Gst.State.NULL)
+            self.__concat_pipeline = None
+
+    def finalize_previews(self, proxy):
+        """Saves the thumbnails and merges the waveforms of the segments.
+
+        Args:
+            proxy (GES.UriClipAsset): The created proxy.
+        """
+        thumbnailbin = Gst.ElementFactory.make("thumbnailbin")
+        thumbnailbin.props.uri = self.asset.get_id()
+        thumbnailbin.finalize(proxy)
+
+        if self.asset.get_info().get_audio_streams():
+            waveformbin = Gst.ElementFactory.make("waveformbin")
+            waveformbin.props.uri = self.asset.get_id()
+            waveformbin.props.duration = self.asset.get_duration()
+            waveformbin.finalize_segments(
+                [self.waveform_path(index) for index in range(len(self.segments))],
+                proxy)
+
+    def remove(self):
+        """Removes the transcoded segments and the manifest."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class SegmentClipper(Loggable):
+    """Restricts a GstTranscoder to a range of the transcoded file.
+
+    The decoders are seeked to the start of the range, and the buffers
+    outside the range are dropped before reaching the filters, in case
+    the seek fails or is not accurate.
+
+    Args:
+        pipeline (Gst.Pipeline): The pipeline of the transcoder.
+        start (int): The position where the range starts, in ns.
+        stop (int): The position where the range stops, in ns.
+    """
+
+    def __init__(self, pipeline, start, stop):
+        Loggable.__init__(self)
+        self.pipeline = pipeline
+        self.start = start
+        self.stop = stop
+        self.__lock = threading.Lock()
+        self.__seek_requested = start == 0
+        # The last segments received by the filters, by pad.
+        self.__segments = {}
+
+        for filter_bin in (pipeline.props.video_filter, pipeline.props.audio_filter):
+            filter_bin.sinkpads[0].add_probe(
+                Gst.PadProbeType.BUFFER | Gst.PadProbeType.EVENT_DOWNSTREAM,
+                self.__probe_cb)
+
+    def __probe_cb(self, pad, info):
+        event = info.get_event()
+        if event:
+            if event.type == Gst.EventType.SEGMENT:
+                self.__segments[pad] = event.parse_segment()
+            return Gst.PadProbeReturn.OK
+
+        buf = info.get_buffer()
+        segment = self.__segments.get(pad)
+        if not segment or buf.pts == Gst.CLOCK_TIME_NONE:
+            return Gst.PadProbeReturn.OK
+
+        stream_time = segment.to_stream_time(Gst.Format.TIME, buf.pts)
+        if stream_time == Gst.CLOCK_TIME_NONE:
+            return Gst.PadProbeReturn.OK
+
+        if stream_time < self.start:
+            with self.__lock:
+                if not self.__seek_requested:
+                    self.__seek_requested = True
+                    # Seeking is not possible from the streaming thread.
+                    GLib.idle_add(self.__seek_cb)
+            return Gst.PadProbeReturn.DROP
+
+        if stream_time >= self.stop:
+            pad.send_event(Gst.Event.new_eos())
+            return Gst.PadProbeReturn.DROP
+
+        return Gst.PadProbeReturn.OK
+
+    def __seek_cb(self):
+        if not self.pipeline.seek(1.0, Gst.Format.TIME,
+                                  Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE,
+                                  Gst.SeekType.SET, self.start,
+                                  Gst.SeekType.SET, self.stop):
+            self.warning("Seek to %s failed, decoding from the start",
+                         Gst.TIME_ARGS(self.start))
+        return False
+
+
+class ProxyLadderSwitcher(Loggable):
+    """Switches the timeline clips between the levels of the proxy ladder.
+
+    When playback starts, the level is chosen by the number of video
+    layers visible at the playhead, and lowered when frames are dropped.
+    The clips are switched only when this playback load changes, and the
+    level is kept when paused, because switching rebuilds the track
+    elements. See `full_resolution` for rendering and saving.
+
+    Args:
+        proxy_manager (ProxyManager): The manager creating the proxies.
+        pipeline (pitivi.utils.pipeline.Pipeline): The project pipeline.
+    """
+
+    # The number of visible video layers from which each level is used.
+    LAYERS_PER_LEVEL = ((4, ProxyLevel.QUARTER), (2, ProxyLevel.HALF))
+    # The number of frames dropped since the last switch which cause
+    # switching to the next level.
+    MAX_DROPPED_FRAMES = 10
+    # The minimum time between two switches caused by dropped frames, in s.
+    QOS_SWITCH_INTERVAL = 5
+
+    def __init__(self, proxy_manager, pipeline):
+        Loggable.__init__(self)
+        self.proxy_manager = proxy_manager
+        self.pipeline = pipeline
+        self.level = ProxyLevel.FULL
+        # The level suitable for the number of visible video layers,
+        # when last measured.
+        self.__load_level = ProxyLevel.FULL
+        self.__measure_id = 0
+        self.__full_resolution = 0
+        self.__last_switch_time = 0
+        self.__dropped_frames = 0
+        # The last number of dropped frames reported, by element.
+        self.__qos_dropped = {}
+
+        pipeline.connect("state-change", self.__stateChangeCb)
+        self.__bus = pipeline.get_bus()
+        self.__bus.connect("message", self.__busMessageCb)
+
+    def release(self):
+        """Stops following the pipeline."""
+        if self.__measure_id:
+            GLib.source_remove(self.__measure_id)
+            self.__measure_id = 0
+        self.pipeline.disconnect_by_func(self.__stateChangeCb)
+        self.__bus.disconnect_by_func(self.__busMessageCb)
+
+    @classmethod
+    def level_for_layers(cls, layers):
+        """Gets the level suitable for playing the number of video layers."""
+        for min_layers, level in cls.LAYERS_PER_LEVEL:
+            if layers >= min_layers:
+                return level
+        return ProxyLevel.FULL
+
+    def __rendering(self):
+        mask = GES.PipelineFlags.RENDER | GES.PipelineFlags.SMART_RENDER
+        return self.pipeline.get_mode() & mask != 0
+
+    def __visibleVideoLayers(self):
+        position = self.pipeline.getPosition(fails=False)
+        layers = 0
+        for layer in self.pipeline.props.timeline.get_layers():
+            for clip in layer.get_clips():
+                if isinstance(clip, GES.UriClip) and \
+                        clip.get_supported_formats() & GES.TrackType.VIDEO and \
+                        clip.props.start <= position < clip.props.start + clip.props.duration:
+                    layers += 1
+                    break
+        return layers
+
+    def switch(self, level, commit=True):
+        """Makes the proxied clips use the proxies of the specified level.
+
+        Args:
+            level (int): One of the `ProxyLevel` values. The full
+                resolution proxy is used for the assets without this level.
+            commit (bool): Whether to commit the timeline if clips changed.
+        """
+        if self.__full_resolution:
+            level = ProxyLevel.FULL
+        self.__last_switch_time = time.time()
+        self.__dropped_frames = 0
+        if level == self.level:
+            return
+
+        self.debug("Switching from proxy level %d to %d", self.level, level)
+        self.level = level
+        changed = False
+        for layer in self.pipeline.props.timeline.get_layers():
+            for clip in layer.get_clips():
+                if not isinstance(clip, GES.UriClip):
+                    continue
+                target = self.proxy_manager.get_ladder_target(clip.get_asset())
+                if not target:
+                    continue
+                proxy = self.proxy_manager.get_ladder_proxy(target, level)
+                if proxy and proxy != clip.get_asset():
+                    clip.set_asset(proxy)
+                    changed = True
+
+        if changed and commit:
+            self.pipeline.commit_timeline()
+
+    @contextlib.contextmanager
+    def full_resolution(self, commit=True):
+        """Uses the full resolution proxies in the context.
+
+        Args:
+            commit (bool): Whether to commit the timeline when switching.
+        """
+        level = self.level
+        self.switch(ProxyLevel.FULL, commit)
+        self.__full_resolution += 1
+        try:
+            yield
+        finally:
+            self.__full_resolution -= 1
+            self.switch(level, commit)
+
+    def __stateChangeCb(self, unused_pipeline, new, unused_prev):
+        if new != Gst.State.PLAYING or self.__rendering() or self.__measure_id:
+            return
+
+        # Not committing the timeline while the pipeline changes state.
+        self.__measure_id = GLib.idle_add(self.__measureLoad)
+
+    def __measureLoad(self):
+        self.__measure_id = 0
+        if self.pipeline.getState() != Gst.State.PLAYING or self.__rendering():
+            return False
+
+        load_level = self.level_for_layers(self.__visibleVideoLayers())
+        if load_level != self.__load_level:
+            self.__load_level = load_level
+            self.switch(load_level)
+        return False
+
+    def __busMessageCb(self, unused_bus, message):
+        if message.type != Gst.MessageType.QOS:
+            return
+
+        fmt, unused_processed, dropped = message.parse_qos_stats()
+        if fmt != Gst.Format.BUFFERS:
+            return
+
+        previous = self.__qos_dropped.get(message.src, 0)
+        self.__qos_dropped[message.src] = dropped
+        self.__dropped_frames += max(0, dropped - previous)
+        if self.__dropped_frames < self.MAX_DROPPED_FRAMES or \
+                self.level >= ProxyLevel.QUARTER or \
+                self.pipeline.getState() != Gst.State.PLAYING or \
+                self.__rendering() or \
+                time.time() - self.__last_switch_time < self.QOS_SWITCH_INTERVAL:
+            return
+
+        self.info("%d frames dropped, lowering the proxy level", self.__dropped_frames)
+        self.switch(self.level + 1)
+
+
 class ProxyManager(GObject.Object, Loggable):
     """Transcodes assets and manages proxies."""
 
@@ -109,6 +708,13 @@ class ProxyManager(GObject.Object, Loggable):
 
     proxy_extension = "proxy.mkv"
 
+    # Shared by all the instances, as it depends only on the registry.
+    capabilities = CapabilityIndex()
+
+    # Fields of the stream caps which cannot change the caps intersections
+    # with the encoding formats but are different for most files.
+    FINGERPRINT_IGNORED_FIELDS = ("codec_data", "streamheader")
+
     def __init__(self, app):
         GObject.Object.__init__(self)
         Loggable.__init__(self)
@@ -121,6 +727,29 @@ class ProxyManager(GObject.Object, Loggable):
         self._start_proxying_time = 0
         self.__running_transcoders = []
         self.__pending_transcoders = []
+        # The priorities set with set_job_priority, by asset URI.
+        self.__job_priorities = {}
+        # The estimated costs of the queued jobs, by asset URI.
+        self.__job_costs = {}
+        # The jobs of the assets transcoded in segments, by asset URI.
+        self.__segmented_jobs = {}
+        # The (job, index, clipper) of the segments being transcoded,
+        # by transcoder.
+        self.__segments = {}
+
+        # The loaded encoding profiles and the registry generation for which
+        # they are usable, by encoding target file.
+        self.__encoding_profiles = {}
+        # The format decisions, by (caps fingerprint, encoding format).
+        self.__format_matches = {}
+        # The lower levels proxies, by level, by original asset URI.
+        self.__ladder_proxies = {}
+        self.__store = None
+        # The URIs of the assets whose proxies are being moved to the store.
+        self.__migrating = set()
+        # The existence and size of the assets and proxies files, filled
+        # while the project loads assets, see `Project`.
+        self.file_infos = FileInfoCache()
 
         self.__encoding_target_file = None
         self.proxyingUnsupported = False
@@ -170,25 +799,73 @@ class ProxyManager(GObject.Object, Loggable):
                         return False
         return True
 
-    def __getEncodingProfile(self, encoding_target_file, asset=None):
+    def __capsFingerprint(self, asset):
+        """Gets a key identifying the formats of the streams of the asset.
+
+        Assets with the same fingerprint get the same proxying decisions.
+        """
+        def caps_key(stream_info):
+            caps = stream_info.get_caps()
+            structures = []
+            for i in range(caps.get_size()):
+                structure = caps.get_structure(i).copy()
+                for field in self.FINGERPRINT_IGNORED_FIELDS:
+                    structure.remove_field(field)
+                structures.append(structure.to_string())
+            return ";".join(structures)
+
+        info = asset.get_info()
+        stream_info = info.get_stream_info()
+        return (type(stream_info).__name__,
+                caps_key(stream_info) if stream_info else None,
+                tuple(caps_key(stream) for stream in info.get_audio_streams()),
+                tuple(caps_key(stream) for stream in info.get_video_streams()))
+
+    def __assetMatchesEncodingFormats(self, asset, name, encoding_profiles):
+        """Returns whether the asset matches one of the encoding profiles.
+
+        The decision is memoized by the caps fingerprint of the asset.
+        """
+        key = (self.__capsFingerprint(asset), name)
+        matches = self.__format_matches.get(key)
+        if matches is None:
+            matches = any(self._assetMatchesEncodingFormat(asset, profile)
+                          for profile in encoding_profiles)
+            self.__format_matches[key] = matches
+        return matches
+
+    def __loadEncodingProfile(self, encoding_target_file):
+        """Loads the encoding profile if it can be encoded and decoded."""
+        generation = self.capabilities.generation()
+        try:
+            profile_generation, encoding_profile = \
+                self.__encoding_profiles[encoding_target_file]
+            if profile_generation == generation:
+                return encoding_profile
+        except KeyError:
+            pass
+
         encoding_target = GstPbutils.EncodingTarget.load_from_file(
             os.path.join(get_gstpresets_dir(), encoding_target_file))
         encoding_profile = encoding_target.get_profile("default")
 
+        if encoding_profile:
+            for profile in encoding_profile.get_profiles():
+                if not self.capabilities.can_encode(profile.get_format()) or \
+                        not self.capabilities.can_decode(profile.get_format()):
+                    encoding_profile = None
+                    break
+
+        self.__encoding_profiles[encoding_target_file] = (generation, encoding_profile)
+        return encoding_profile
+
+    def __getEncodingProfile(self, encoding_target_file, asset=None):
+        encoding_profile = self.__loadEncodingProfile(encoding_target_file)
         if not encoding_profile:
             return None
 
-        for profile in encoding_profile.get_profiles():
-            if not Gst.ElementFactory.list_filter(
-                Gst.ElementFactory.list_get_elements(
-                    Gst.ELEMENT_FACTORY_TYPE_ENCODER, Gst.Rank.MARGINAL),
-                    profile.get_format(), Gst.PadDirection.SRC, False):
-                return None
-            if not Gst.ElementFactory.list_filter(
-                Gst.ElementFactory.list_get_elements(
-                    Gst.ELEMENT_FACTORY_TYPE_DECODER, Gst.Rank.MARGINAL),
-                    profile.get_format(), Gst.PadDirection.SINK, False):
-                return None
+        # The profile is modified below and used by the transcoder.
+        encoding_profile = encoding_profile.copy()
 
         if asset:
             # If we have an asset, we force audioconvert to keep
@@ -226,33 +903,101 @@ class ProxyManager(GObject.Object, Loggable):
         self.emit("error-preparing-asset", None, proxy, proxy.get_error())
         return False
 
-    def getTargetUri(self, proxy_asset):
-        return ".".join(proxy_asset.props.id.split(".")[:-3])
+    def __getStore(self):
+        """Gets the proxy store, if one is configured."""
+        directory = self.app.settings.proxyStoreDir
+        if not directory:
+            return None
 
-    def getProxyUri(self, asset):
+        if not self.__store or self.__store.directory != os.path.abspath(directory):
+            try:
+                self.__store = ProxyStore(directory, self.proxy_extension,
+                                          file_infos=self.file_infos)
+            except OSError as e:
+                self.error("Cannot use the proxy store %s: %s", directory, e)
+                self.__store = None
+        return self.__store
+
+    def getTargetUri(self, proxy_asset):
+        store = self.__getStore()
+        if store:
+            target_uri = store.target_uri(proxy_asset.props.id)
+            if target_uri:
+                return target_uri
+
+        parts = proxy_asset.props.id.split(".")[:-2]
+        if parts[-1] in ProxyLevel.SUFFIXES.values():
+            parts.pop()
+        return ".".join(parts[:-1])
+
+    def getProxyUri(self, asset, level=ProxyLevel.FULL):
         """Returns the URI of a possible proxy file.
 
+        When a proxy store is configured, the proxies of the local files
+        are in the store, see `ProxyStore`. Otherwise the proxy is next to
+        the original file.
+        """
+        store = self.__getStore()
+        if store and Gst.uri_has_protocol(asset.get_id(), "file"):
+            return store.proxy_uri(asset.get_id(), ProxyLevel.SUFFIXES.get(level))
+
+        return self.__getLegacyProxyUri(asset, level)
+
+    def __getLegacyProxyUri(self, asset, level=ProxyLevel.FULL):
+        """Returns the URI of a possible proxy file next to the asset.
+
         The name looks like:
             <filename>.<file_size>.<proxy_extension>
+        or, for the lower levels of the proxy ladder:
+            <filename>.<file_size>.<level_suffix>.<proxy_extension>
         """
-        asset_file = Gio.File.new_for_uri(asset.get_id())
-        try:
-            file_size = asset_file.query_info(Gio.FILE_ATTRIBUTE_STANDARD_SIZE,
-                                              Gio.FileQueryInfoFlags.NONE,
-                                              None).get_size()
-        except GLib.Error as err:
-            if err.matches(Gio.io_error_quark(), Gio.IOErrorEnum.NOT_FOUND):
-                return None
-            else:
-                raise
+        file_size = self.file_infos.query_size(asset.get_id())
+        if file_size is None:
+            return None
 
+        if level != ProxyLevel.FULL:
+            return "%s.%s.%s.%s" % (asset.get_id(), file_size,
+                                    ProxyLevel.SUFFIXES[level], self.proxy_extension)
         return "%s.%s.%s" % (asset.get_id(), file_size, self.proxy_extension)
 
+    def get_ladder_proxy(self, asset, level):
+        """Gets the proxy of the asset for the specified ladder level.
+
+        Args:
+            asset (GES.UriClipAsset): The original asset.
+            level (int): One of the `ProxyLevel` values.
+
+        Returns:
+            GES.UriClipAsset: The proxy of the level if it exists,
+                otherwise the full resolution proxy, if any.
+        """
+        if level != ProxyLevel.FULL:
+            proxy = self.__ladder_proxies.get(asset.get_id(), {}).get(level)
+            if proxy:
+                return proxy
+        return asset.get_proxy()
+
+    def get_ladder_target(self, proxy):
+        """Gets the original asset of a proxy of any ladder level.
+
+        Args:
+            proxy (GES.UriClipAsset): The proxy.
+
+        Returns:
+            GES.UriClipAsset: The original asset, or None if `proxy` is
+                not a proxy.
+        """
+        target = LADDER_TARGETS.get(proxy.props.id)
+        if target:
+            return target
+        if self.is_proxy_asset(proxy):
+            return proxy.get_proxy_target()
+        return None
+
     def isAssetFormatWellSupported(self, asset):
-        for encoding_format in self.WHITELIST_FORMATS:
-            if self._assetMatchesEncodingFormat(asset, encoding_format):
-                self.info("Automatically not proxying")
-                return True
+        if self.__assetMatchesEncodingFormats(asset, None, self.WHITELIST_FORMATS):
+            self.info("Automatically not proxying")
+            return True
 
         return False
 
@@ -274,12 +1019,72 @@ class ProxyManager(GObject.Object, Loggable):
                 self.isAssetFormatWellSupported(asset):
             return False
 
-        if not self._assetMatchesEncodingFormat(asset, self.__encoding_profile):
+        if not self.__assetMatchesEncodingFormats(asset, self.__encoding_target_file,
+                                                  [self.__encoding_profile]):
             return True
 
         self.info("%s does not need proxy", asset.get_id())
         return False
 
+    def __getMaxRunningJobs(self):
+        """Gets how many transcoders can run at the same time."""
+        if self.app.settings.numTranscodingJobs > 0:
+            return self.app.settings.numTranscodingJobs
+
+        # The encoders and decoders use several threads already.
+        max_jobs = max(1, multiprocessing.cpu_count() // 2)
+        available_memory = get_available_memory()
+        if available_memory is not None:
+            # The memory used by the running transcoders is not available.
+            max_jobs = min(max_jobs,
+                           len(self.__running_transcoders) +
+                           available_memory // TRANSCODING_JOB_MEMORY)
+        return max(1, max_jobs)
+
+    def __estimateJobCost(self, asset):
+        """Estimates how long transcoding the asset takes, in arbitrary units."""
+        cost = asset.get_duration()
+        for video_stream in asset.get_info().get_video_streams():
+            cost *= max(1, video_stream.get_width() * video_stream.get_height())
+            break
+        return cost
+
+    def __jobSortKey(self, transcoder):
+        asset_uri = transcoder.props.src_uri
+        return (self.__job_priorities.get(asset_uri, ProxyJobPriority.NORMAL),
+                self.__job_costs.get(asset_uri, 0))
+
+    def __forgetJob(self, asset_uri):
+        """Forgets the scheduling details of a finished or cancelled job."""
+        self.__job_costs.pop(asset_uri, None)
+        self.__job_priorities.pop(asset_uri, None)
+
+    def __startPendingTranscoders(self):
+        """Starts the most urgent pending transcoders, if possible."""
+        while self.__pending_transcoders and \
+                len(self.__running_transcoders) < self.__getMaxRunningJobs():
+            # min() keeps the queue order for jobs with the same key.
+            transcoder = min(self.__pending_transcoders, key=self.__jobSortKey)
+            self.__pending_transcoders.remove(transcoder)
+            self.__startTranscoder(transcoder)
+
+    def set_job_priority(self, asset, priority):
+        """Sets the priority of the transcoding job for the specified asset.
+
+        If the job is pending, it is reordered in the queue. Jobs created
+        later for this asset get the same priority, until a job for it
+        finishes or is cancelled.
+
+        Args:
+            asset (GES.Asset): The original asset.
+            priority (int): One of the `ProxyJobPriority` values.
+        """
+        asset_uri = asset.get_id()
+        if self.__job_priorities.get(asset_uri, ProxyJobPriority.NORMAL) == priority:
+            return
+        self.debug("Setting priority %s for %s", priority, asset_uri)
+        self.__job_priorities[asset_uri] = priority
+
     def __startTranscoder(self, transcoder):
         self.debug("Starting %s", transcoder.props.src_uri)
         if self._start_proxying_time == 0:
@@ -312,6 +1117,9 @@ class ProxyManager(GObject.Object, Loggable):
         if not transcoder:
             if not self.__assetsMatch(asset, proxy):
                 return self.__createTranscoder(asset)
+        elif isinstance(transcoder, SegmentedProxyJob):
+            transcoder.finalize_previews(proxy)
+            transcoder.remove()
         else:
             transcoder.props.pipeline.props.video_filter.finalize(proxy)
             transcoder.props.pipeline.props.audio_filter.finalize(proxy)
@@ -320,8 +1128,116 @@ class ProxyManager(GObject.Object, Loggable):
 
         self.emit("proxy-ready", asset, proxy)
         self.__emitProgress(proxy, 100)
+        self.__createLadder(asset, proxy)
+
+    def __createLadder(self, asset, proxy):
+        """Creates the lower levels of the proxy ladder, if enabled.
+
+        The levels are transcoded from the full resolution proxy, which is
+        much faster to decode than the original asset.
+        """
+        if not self.app.settings.proxyLadder or proxy is None:
+            return
+
+        if not asset.get_info().get_video_streams():
+            return
+
+        for level in (ProxyLevel.HALF, ProxyLevel.QUARTER):
+            level_uri = self.getProxyUri(asset, level)
+            if not level_uri:
+                self.warning("Not creating the proxy ladder of %s, the file is missing",
+                             asset.get_id())
+                return
+            if self.file_infos.exists(level_uri):
+                GES.Asset.request_async(GES.UriClip, level_uri, None,
+                                        self.__ladderProxyLoadedCb, asset, level)
+                continue
+
+            duplicates = self.__getDuplicates(level_uri)
+            if duplicates:
+                self.__linkDuplicateProxy(asset, level_uri, duplicates, level, proxy)
+                continue
+
+            self.__transcodeLadderLevel(asset, proxy, level, level_uri)
+
+    def __transcodeLadderLevel(self, asset, proxy, level, level_uri):
+        video_stream = asset.get_info().get_video_streams()[0]
+        width = video_stream.get_width()
+        height = video_stream.get_height()
+        encoding_profile = self.__getEncodingProfile(self.__encoding_target_file, asset)
+        scale = 2 ** level
+        for profile in encoding_profile.get_profiles():
+            if isinstance(profile, GstPbutils.EncodingVideoProfile):
+                # Keep even dimensions, required by most encoders.
+                profile.set_restriction(Gst.Caps.from_string(
+                    "video/x-raw,width=(int)%d,height=(int)%d" %
+                    (max(2, width // scale // 2 * 2), max(2, height // scale // 2 * 2))))
+
+        dispatcher = GstTranscoder.TranscoderGMainContextSignalDispatcher.new()
+        transcoder = GstTranscoder.Transcoder.new_full(
+            proxy.props.id, level_uri + ".part", encoding_profile, dispatcher)
+        transcoder.set_cpu_usage(self.app.settings.max_cpu_usage)
+        transcoder.connect("done", self.__ladderTranscoderDoneCb, asset, level)
+        transcoder.connect("error", self.__ladderTranscoderErrorCb, asset, level)
+        self.__pending_transcoders.append(transcoder)
+
+        self.__job_priorities[proxy.props.id] = ProxyJobPriority.LOW
+        self.__startPendingTranscoders()
+
+    def __ladderTranscoderFinished(self, transcoder):
+        transcoder.disconnect_by_func(self.__ladderTranscoderDoneCb)
+        transcoder.disconnect_by_func(self.__ladderTranscoderErrorCb)
+        self.__running_transcoders.remove(transcoder)
+        src_uri = transcoder.props.src_uri
+        if not any(other.props.src_uri == src_uri
+                   for other in self.__running_transcoders + self.__pending_transcoders):
+            # All the levels of the ladder are done.
+            self.__forgetJob(src_uri)
+        self.__startPendingTranscoders()
+        self.__resetProgressIfIdle()
+
+    def __ladderTranscoderDoneCb(self, transcoder, asset, level):
+        self.debug("Transcoder done with level %d of %s", level, asset.get_id())
+        self.__ladderTranscoderFinished(transcoder)
+
+        level_uri = self.getProxyUri(asset, level)
+        if not level_uri:
+            self.warning("The file of %s vanished, dropping level %d of its proxy",
+                         asset.get_id(), level)
+            os.remove(Gst.uri_get_location(transcoder.props.dest_uri))
+            return
+        os.rename(Gst.uri_get_location(transcoder.props.dest_uri),
+                  Gst.uri_get_location(level_uri))
+        self.file_infos.invalidate(level_uri)
+        GES.Asset.request_async(GES.UriClip, level_uri, None,
+                                self.__ladderProxyLoadedCb, asset, level)
+
+    def __ladderTranscoderErrorCb(self, transcoder, error, unused_details, asset, level):
+        self.warning("Failed creating level %d of the proxy of %s: %s",
+                     level, asset.get_id(), error)
+        self.__ladderTranscoderFinished(transcoder)
+
+    def __ladderProxyLoadedCb(self, level_proxy, res, asset, level):
+        try:
+            GES.Asset.request_finish(res)
+        except GLib.Error as e:
+            self.warning("Failed loading level %d of the proxy of %s: %s",
+                         level, asset.get_id(), e)
+            return
+
+        self.__ladder_proxies.setdefault(asset.get_id(), {})[level] = level_proxy
+        LADDER_TARGETS[level_proxy.props.id] = asset
 
     def __transcoderErrorCb(self, transcoder, error, unused_details, asset):
+        segment = self.__segments.get(transcoder)
+        if segment:
+            job, index, unused_clipper = segment
+            self.warning("Failed transcoding segment %d of %s: %s",
+                         index, asset.get_id(), error)
+            # The segments done are kept, so retrying resumes the job.
+            self.__dropSegmentedJob(job)
+            self.__startPendingTranscoders()
+            self.__resetProgressIfIdle()
         self.emit("error-preparing-asset", asset, None, error)
 
     def __transcoderDoneCb(self, transcoder, asset):
@@ -336,6 +1252,7 @@ class ProxyManager(GObject.Object, Loggable):
         proxy_uri = self.getProxyUri(asset)
         os.rename(Gst.uri_get_location(transcoder.props.dest_uri),
                   Gst.uri_get_location(proxy_uri))
+        self.file_infos.invalidate(proxy_uri)
 
         # Make sure that if it first failed loading, the proxy is forced to be
         # reloaded in the GES cache.
@@ -343,13 +1260,50 @@ class ProxyManager(GObject.Object, Loggable):
         GES.Asset.request_async(GES.UriClip, proxy_uri, None,
                                 self.__assetLoadedCb, asset, transcoder)
 
-        try:
-            self.__startTranscoder(self.__pending_transcoders.pop())
-        except IndexError:
-            if not self.__running_transcoders:
-                self._transcoded_durations = {}
-                self._total_time_to_transcode = 0
-                self._start_proxying_time = 0
+        self.__forgetJob(asset.get_id())
+        self.__startPendingTranscoders()
+        self.__resetProgressIfIdle()
+
+    def __resetProgressIfIdle(self):
+        if not self.__running_transcoders:
+            self._transcoded_durations = {}
+            self._total_time_to_transcode = 0
+            self._start_proxying_time = 0
+
+    def __segmentDoneCb(self, transcoder, asset):
+        transcoder.disconnect_by_func(self.__segmentDoneCb)
+        transcoder.disconnect_by_func(self.__transcoderErrorCb)
+        transcoder.disconnect_by_func(self.__proxyingPositionChangedCb)
+
+        job, index, unused_clipper = self.__segments.pop(transcoder)
+        self.debug("Transcoder done with segment %d of %s", index, asset.get_id())
+        self.__running_transcoders.remove(transcoder)
+
+        start, stop = job.segments[index]
+        pipeline = transcoder.props.pipeline
+        # Save the thumbnails, in case the job is resumed later.
+        pipeline.props.video_filter.finalize()
+        pipeline.props.audio_filter.save_segment(job.waveform_path(index), start, stop)
+        job.segment_done(index)
+
+        self.__queueSegments(job)
+        self.__startPendingTranscoders()
+        self.__resetProgressIfIdle()
+
+    def __segmentsConcatenatedCb(self, job, error):
+        asset = job.asset
+        del self.__segmented_jobs[asset.get_id()]
+        self.__forgetJob(asset.get_id())
+        if error:
+            self.emit("error-preparing-asset", asset, None, error)
+            return
+
+        os.rename(Gst.uri_get_location(job.proxy_uri) + ".part",
+                  Gst.uri_get_location(job.proxy_uri))
+        self.file_infos.invalidate(job.proxy_uri)
+        GES.Asset.needs_reload(GES.UriClip, job.proxy_uri)
+        GES.Asset.request_async(GES.UriClip, job.proxy_uri, None,
+                                self.__assetLoadedCb, asset, job)
 
     def __emitProgress(self, asset, creation_progress):
         """Handles the transcoding progress of the specified asset."""
@@ -369,7 +1323,15 @@ class ProxyManager(GObject.Object, Loggable):
             self.info("Position changed after job cancelled!")
             return
 
-        self._transcoded_durations[asset] = position / Gst.SECOND
+        segment = self.__segments.get(transcoder)
+        if segment:
+            job, index, unused_clipper = segment
+            job.positions[index] = position
+            position = job.transcoded_duration()
+            self._transcoded_durations[asset] = \
+                (position - job.resumed_duration) / Gst.SECOND
+        else:
+            self._transcoded_durations[asset] = position / Gst.SECOND
 
         duration = transcoder.props.duration
         if duration <= 0 or duration == Gst.CLOCK_TIME_NONE:
@@ -390,6 +1352,10 @@ class ProxyManager(GObject.Object, Loggable):
         Returns:
             bool: True iff the asset is being transcoded or pending.
         """
+        if asset.props.id in self.__segmented_jobs or \
+                asset.props.id in self.__migrating:
+            return True
+
         all_transcoders = self.__running_transcoders + self.__pending_transcoders
         for transcoder in all_transcoders:
             if asset.props.id == transcoder.props.src_uri:
@@ -398,14 +1364,52 @@ class ProxyManager(GObject.Object, Loggable):
         return False
 
     def __createTranscoder(self, asset):
-        self._total_time_to_transcode += asset.get_duration() / Gst.SECOND
         asset_uri = asset.get_id()
         proxy_uri = self.getProxyUri(asset)
+        self.__job_costs[asset_uri] = self.__estimateJobCost(asset)
+
+        if asset.get_duration() >= 2 * PROXY_SEGMENT_DURATION:
+            job = SegmentedProxyJob(asset, proxy_uri, self.__encoding_target_file)
+            self.__segmented_jobs[asset_uri] = job
+            self._total_time_to_transcode += \
+                (asset.get_duration() - job.resumed_duration) / Gst.SECOND
+            self.__queueSegments(job)
+            self.__startPendingTranscoders()
+            return
+
+        self._total_time_to_transcode += asset.get_duration() / Gst.SECOND
+        transcoder = self.__newTranscoder(asset, proxy_uri + ".part")
+        transcoder.connect("done", self.__transcoderDoneCb, asset)
+        self.__pending_transcoders.append(transcoder)
+        self.__startPendingTranscoders()
+
+    def __queueSegments(self, job):
+        """Queues the next segments of the job, or concatenates the segments.
+
+        The segments of a job are queued as separate transcoders, so several
+        of them can run in parallel, each with its own encoders.
+        """
+        if job.is_complete():
+            self.debug("Concatenating the segments of %s", job.asset.get_id())
+            job.concatenate(job.proxy_uri + ".part", self.__segmentsConcatenatedCb)
+            return
+
+        max_segments = self.app.settings.numSegmentTranscodingJobs or \
+            self.__getMaxRunningJobs()
+        # Queue only a few transcoders, as each one creates a pipeline.
+        for index in job.pending_segments()[:max(0, max_segments - len(job.positions))]:
+            start, stop = job.segments[index]
+            transcoder = self.__newTranscoder(job.asset, job.start_segment(index))
+            clipper = SegmentClipper(transcoder.props.pipeline, start, stop)
+            self.__segments[transcoder] = (job, index, clipper)
+            transcoder.connect("done", self.__segmentDoneCb, job.asset)
+            self.__pending_transcoders.append(transcoder)
 
+    def __newTranscoder(self, asset, dest_uri):
         dispatcher = GstTranscoder.TranscoderGMainContextSignalDispatcher.new()
         encoding_profile = self.__getEncodingProfile(self.__encoding_target_file, asset)
         transcoder = GstTranscoder.Transcoder.new_full(
-            asset_uri, proxy_uri + ".part", encoding_profile,
+            asset.get_id(), dest_uri, encoding_profile,
             dispatcher)
         transcoder.props.position_update_interval = 1000
 
@@ -424,20 +1428,29 @@ class ProxyManager(GObject.Object, Loggable):
                            self.__proxyingPositionChangedCb,
                            asset)
 
-        transcoder.connect("done", self.__transcoderDoneCb, asset)
         transcoder.connect("error", self.__transcoderErrorCb, asset)
-        if len(self.__running_transcoders) < self.app.settings.numTranscodingJobs:
-            self.__startTranscoder(transcoder)
-        else:
-            self.__pending_transcoders.append(transcoder)
+        return transcoder
 
     def cancel_job(self, asset):
         """Cancels the transcoding job for the specified asset, if any.
 
+        The priority set for the asset is forgotten even if it has no job,
+        for example when the asset is removed from the project.
+
         Args:
             asset (GES.Asset): The original asset.
         """
         if not self.is_asset_queued(asset):
+            self.__forgetJob(asset.props.id)
+            return
+
+        job = self.__segmented_jobs.get(asset.props.id)
+        if job:
+            self.info("Cancelling segmented job %s, keeping %d done segments",
+                      asset.props.id, len(job.done))
+            self.__dropSegmentedJob(job)
+            self.emit("asset-preparing-cancelled", asset)
+            self.__startPendingTranscoders()
             return
 
         for transcoder in self.__running_transcoders:
@@ -446,7 +1459,9 @@ class ProxyManager(GObject.Object, Loggable):
                           transcoder.props.src_uri,
                           transcoder.__grefcount__)
                 self.__running_transcoders.remove(transcoder)
+                self.__forgetJob(asset.props.id)
                 self.emit("asset-preparing-cancelled", asset)
+                self.__startPendingTranscoders()
                 return
 
         for transcoder in self.__pending_transcoders:
@@ -457,9 +1472,28 @@ class ProxyManager(GObject.Object, Loggable):
                 # will lead to its destruction (only reference)
                 # here, which means it will be stopped.
                 self.__pending_transcoders.remove(transcoder)
+                self.__forgetJob(asset.props.id)
                 self.emit("asset-preparing-cancelled", asset)
                 return
 
+    def __dropSegmentedJob(self, job):
+        """Stops the transcoders of the segments of the job and forgets it."""
+        job.cancel()
+        for transcoder, segment in list(self.__segments.items()):
+            if segment[0] is not job:
+                continue
+            del self.__segments[transcoder]
+            job.discard_segment(segment[1])
+            transcoder.disconnect_by_func(self.__segmentDoneCb)
+            transcoder.disconnect_by_func(self.__transcoderErrorCb)
+            transcoder.disconnect_by_func(self.__proxyingPositionChangedCb)
+            if transcoder in self.__running_transcoders:
+                self.__running_transcoders.remove(transcoder)
+            else:
+                self.__pending_transcoders.remove(transcoder)
+        del self.__segmented_jobs[job.asset.get_id()]
+        self.__forgetJob(job.asset.get_id())
+
     def add_job(self, asset):
         """Adds a transcoding job for the specified asset if needed.
 
@@ -479,7 +1513,14 @@ class ProxyManager(GObject.Object, Loggable):
             return
 
         proxy_uri = self.getProxyUri(asset)
-        if Gio.File.new_for_uri(proxy_uri).query_exists(None):
+        if proxy_uri is None:
+            self.warning("Cannot proxy %s, the file is missing", asset.get_id())
+            self.emit("error-preparing-asset", asset, None,
+                      GLib.Error("File not found: %s" % asset.get_id(),
+                                 "g-io-error-quark", Gio.IOErrorEnum.NOT_FOUND))
+            return
+
+        if self.file_infos.exists(proxy_uri):
             self.debug("Using proxy already generated: %s", proxy_uri)
             GES.Asset.request_async(GES.UriClip,
                                     proxy_uri, None,
@@ -487,11 +1528,108 @@ class ProxyManager(GObject.Object, Loggable):
                                     None)
             return
 
+        duplicates = self.__getDuplicates(proxy_uri)
+        if duplicates:
+            self.__linkDuplicateProxy(asset, proxy_uri, duplicates)
+            return
+
+        self.__createProxy(asset, proxy_uri)
+
+    def __createProxy(self, asset, proxy_uri):
+        store = self.__getStore()
+        if store and store.contains(proxy_uri):
+            legacy_uri = self.__getLegacyProxyUri(asset)
+            if legacy_uri and self.file_infos.exists(legacy_uri):
+                self.__migrateLegacyProxy(asset, legacy_uri, proxy_uri)
+                return
+
         self.debug("Creating a proxy for %s (strategy: %s, force: %s)",
                    asset.get_id(), self.app.settings.proxyingStrategy,
-                   force_proxying)
+                   asset.force_proxying)
         self.__createTranscoder(asset)
-        return
+
+    def __getDuplicates(self, proxy_uri):
+        """Gets the proxies of the files which might be identical."""
+        store = self.__getStore()
+        if not store or not store.contains(proxy_uri):
+            return []
+        return store.duplicates(proxy_uri)
+
+    def __linkDuplicateProxy(self, asset, proxy_uri, duplicates, level=None, proxy=None):
+        """Creates the proxy from the proxy of an identical file, if any."""
+        if level is None:
+            self.__migrating.add(asset.get_id())
+        # Comparing the files entirely can take a while.
+        thread = threading.Thread(target=self.__compareDuplicates,
+                                  args=(asset, proxy_uri, duplicates, level, proxy),
+                                  daemon=True)
+        thread.start()
+
+    def __compareDuplicates(self, asset, proxy_uri, duplicates, level, proxy):
+        try:
+            linked = self.__getStore().link_duplicate(asset.get_id(), proxy_uri, duplicates)
+        except OSError as e:
+            self.warning("Failed reusing a proxy for %s: %s", proxy_uri, e)
+            linked = False
+        GLib.idle_add(self.__duplicateComparedCb, asset, proxy_uri, linked, level, proxy)
+
+    def __duplicateComparedCb(self, asset, proxy_uri, linked, level, proxy):
+        if level is None:
+            self.__migrating.discard(asset.get_id())
+        if linked:
+            self.file_infos.invalidate(proxy_uri)
+            self.debug("Using the proxy of a duplicate: %s", proxy_uri)
+            if level is None:
+                GES.Asset.request_async(GES.UriClip, proxy_uri, None,
+                                        self.__assetLoadedCb, asset, None)
+            else:
+                GES.Asset.request_async(GES.UriClip, proxy_uri, None,
+                                        self.__ladderProxyLoadedCb, asset, level)
+        elif level is None:
+            self.__createProxy(asset, proxy_uri)
+        else:
+            self.__transcodeLadderLevel(asset, proxy, level, proxy_uri)
+        return False
+
+    def __migrateLegacyProxy(self, asset, legacy_uri, proxy_uri):
+        """Moves a proxy created next to the asset into the store."""
+        self.info("Moving %s to the proxy store", legacy_uri)
+        self.__migrating.add(asset.get_id())
+        # Copying to another file system can take a while.
+        thread = threading.Thread(target=self.__moveProxyFile,
+                                  args=(asset, Gst.uri_get_location(legacy_uri), proxy_uri),
+                                  daemon=True)
+        thread.start()
+
+    def __moveProxyFile(self, asset, legacy_path, proxy_uri):
+        path = Gst.uri_get_location(proxy_uri)
+        error = None
+        try:
+            try:
+                os.rename(legacy_path, path)
+            except OSError:
+                shutil.copyfile(legacy_path, path + ".part")
+                os.replace(path + ".part", path)
+                try:
+                    os.remove(legacy_path)
+                except OSError as e:
+                    # For example on read-only media.
+                    self.warning("Cannot remove %s: %s", legacy_path, e)
+        except OSError as e:
+            error = e
+        GLib.idle_add(self.__legacyProxyMovedCb, asset, proxy_uri, error)
+
+    def __legacyProxyMovedCb(self, asset, proxy_uri, error):
+        self.__migrating.discard(asset.get_id())
+        self.file_infos.invalidate(proxy_uri)
+        if error:
+            self.warning("Failed moving the proxy of %s to the store: %s",
+                         asset.get_id(), error)
+            self.__createTranscoder(asset)
+        else:
+            GES.Asset.request_async(GES.UriClip, proxy_uri, None,
+                                    self.__assetLoadedCb, asset, None)
+        return False
 
 
 def get_proxy_target(obj):
@@ -503,7 +1641,7 @@ def get_proxy_target(obj):
         asset = obj
 
     if ProxyManager.is_proxy_asset(asset):
-        target = asset.get_proxy_target()
+        target = asset.get_proxy_target() or LADDER_TARGETS.get(asset.props.id)
         if target and target.get_error() is None:
             asset = target
 
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Content-addressed storage of the proxy files."""
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+
+from gi.repository import GLib
+from gi.repository import Gst
+
+from pitivi.utils.loggable import Loggable
+from pitivi.utils.misc import hash_file
+
+
+class ProxyStore(Loggable):
+    """Directory where the proxies are created, keyed by asset fingerprint.
+
+    The fingerprint of a file is computed from its size and the hash of
+    its first bytes, see `hash_file`. The proxies of files with the same
+    fingerprint and the same content, for example copies of a file,
+    share their content.
+
+    Each source file still gets its own proxy file, named
+        <fingerprint>.<uri_hash>[.<suffix>].<proxy_extension>
+    because a GES.Asset can be the proxy of a single asset. The proxies
+    of identical files are hard links to the same content.
+
+    The index file maps the source files to their fingerprints, so the
+    files are not hashed again while their size and mtime are unchanged,
+    and so the source of a proxy can be found.
+
+    Args:
+        directory (str): The path of the store.
+        proxy_extension (str): The extension of the proxy files.
+        file_infos (Optional[FileInfoCache]): The cache for querying the
+            source files. If None, the files are queried every time.
+    """
+
+    INDEX_VERSION = 1
+    # How long to wait before saving the changed index, in ms.
+    INDEX_SAVE_DELAY = 1000
+
+    def __init__(self, directory, proxy_extension, file_infos=None):
+        Loggable.__init__(self)
+        self.directory = os.path.abspath(directory)
+        self.proxy_extension = proxy_extension
+        self.file_infos = file_infos
+        self.index_path = os.path.join(self.directory, "index.json")
+
+        # The fingerprint, size and mtime of the source files, by URI.
+        self.__sources = {}
+        # The source URIs, by proxy name prefix.
+        self.__targets = {}
+        # The source URIs, by fingerprint.
+        self.__duplicates = {}
+        self.__save_id = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.__load_index()
+
+    def __load_index(self):
+        try:
+            with open(self.index_path) as index_file:
+                index = json.load(index_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.warning("Ignoring unreadable proxy store index %s: %s",
+                         self.index_path, e)
+            return
+
+        if index.get("version") != self.INDEX_VERSION:
+            self.info("Ignoring proxy store index version %s", index.get("version"))
+            return
+
+        for uri, source in index.get("sources", {}).items():
+            self.__add_source(uri, source)
+
+    def __add_source(self, uri, source):
+        previous = self.__sources.get(uri)
+        if previous:
+            self.__duplicates[previous["fingerprint"]].discard(uri)
+        self.__sources[uri] = source
+        self.__targets[self.__prefix(uri, source["fingerprint"])] = uri
+        self.__duplicates.setdefault(source["fingerprint"], set()).add(uri)
+
+    def save_index(self):
+        """Saves the index on disk, atomically."""
+        if self.__save_id is not None:
+            GLib.source_remove(self.__save_id)
+            self.__save_id = None
+
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as index_file:
+            json.dump({"version": self.INDEX_VERSION,
+                       "sources": self.__sources}, index_file)
+        os.replace(tmp_path, self.index_path)
+
+    def __schedule_save(self):
+        if self.__save_id is None:
+            self.__save_id = GLib.timeout_add(self.INDEX_SAVE_DELAY, self.__save_cb)
+
+    def __save_cb(self):
+        self.__save_id = None
+        try:
+            self.save_index()
+        except OSError as e:
+            self.error("Failed saving the proxy store index: %s", e)
+        return False
+
+    @staticmethod
+    def __prefix(uri, fingerprint):
+        uri_hash = hashlib.sha1(uri.encode("utf-8")).hexdigest()[:12]
+        return "%s.%s" % (fingerprint, uri_hash)
+
+    def __stat(self, uri):
+        """Gets the size and the mtime of the file, or None if missing."""
+        if self.file_infos:
+            try:
+                return self.file_infos.query_stat(uri)
+            except GLib.Error as e:
+                self.warning("Failed querying %s: %s", uri, e)
+
+        try:
+            stat = os.stat(Gst.uri_get_location(uri))
+        except FileNotFoundError:
+            return None
+        # The same precision as FileInfoCache, so the index stays valid
+        # whichever is used.
+        return stat.st_size, stat.st_mtime_ns // Gst.USECOND * Gst.USECOND
+
+    def fingerprint(self, uri):
+        """Gets the fingerprint of the specified source file.
+
+        Args:
+            uri (str): The URI of a local file.
+
+        Returns:
+            str: The fingerprint, or None if the file does not exist.
+        """
+        stat = self.__stat(uri)
+        if stat is None:
+            return None
+        size, mtime = stat
+
+        source = self.__sources.get(uri)
+        if source and source["size"] == size and source["mtime"] == mtime:
+            return source["fingerprint"]
+
+        fingerprint = "%s-%d" % (hash_file(Gst.uri_get_location(uri)), size)
+        self.__add_source(uri, {"fingerprint": fingerprint,
+                                "size": size,
+                                "mtime": mtime})
+        self.__schedule_save()
+        return fingerprint
+
+    def proxy_uri(self, uri, suffix=None):
+        """Gets the URI of the proxy of the specified source file.
+
+        Args:
+            uri (str): The URI of a local file.
+            suffix (Optional[str]): A suffix identifying a variant of the
+                proxy, for example a lower resolution.
+
+        Returns:
+            str: The URI of the proxy, or None if the file does not exist.
+        """
+        fingerprint = self.fingerprint(uri)
+        if fingerprint is None:
+            return None
+
+        parts = [self.__prefix(uri, fingerprint)]
+        if suffix:
+            parts.append(suffix)
+        parts.append(self.proxy_extension)
+        return Gst.filename_to_uri(os.path.join(self.directory, ".".join(parts)))
+
+    def __split(self, proxy_uri):
+        """Gets the prefix and the suffix of a proxy file in the store."""
+        path = Gst.uri_get_location(proxy_uri)
+        if os.path.dirname(path) != self.directory:
+            return None, None
+
+        name = os.path.basename(path)[:-len(self.proxy_extension) - 1]
+        parts = name.split(".")
+        if len(parts) < 2:
+            return None, None
+        return ".".join(parts[:2]), ".".join(parts[2:])
+
+    def contains(self, proxy_uri):
+        """Returns whether the specified proxy URI is in the store."""
+        return self.__split(proxy_uri)[0] is not None
+
+    def target_uri(self, proxy_uri):
+        """Gets the URI of the source file of the specified proxy.
+
+        Returns:
+            str: The URI, or None if the proxy is not in the store or its
+                source is not known.
+        """
+        prefix, unused_suffix = self.__split(proxy_uri)
+        return self.__targets.get(prefix)
+
+    def duplicates(self, proxy_uri):
+        """Gets the existing proxies of the sources which might be identical.
+
+        The sources have the same fingerprint, which covers only the first
+        bytes, so they must be compared with `link_duplicate`.
+
+        Args:
+            proxy_uri (str): A proxy URI returned by `proxy_uri`.
+
+        Returns:
+            List[Tuple[str, str]]: The paths of the sources and of their
+                proxies.
+        """
+        target_uri = self.target_uri(proxy_uri)
+        if not target_uri:
+            return []
+
+        unused_prefix, suffix = self.__split(proxy_uri)
+        fingerprint = self.__sources[target_uri]["fingerprint"]
+        duplicates = []
+        for uri in self.__duplicates.get(fingerprint, ()):
+            if uri == target_uri:
+                continue
+            duplicate_uri = self.proxy_uri(uri, suffix)
+            if duplicate_uri and os.path.exists(Gst.uri_get_location(duplicate_uri)):
+                duplicates.append((Gst.uri_get_location(uri),
+                                   Gst.uri_get_location(duplicate_uri)))
+        return duplicates
+
+    def link_duplicate(self, source_uri, proxy_uri, duplicates):
+        """Creates the proxy from the proxy of an identical source, if any.
+
+        The source files are compared entirely, which can take a while, so
+        this is meant to be called in a thread. The index is not used.
+
+        Args:
+            source_uri (str): The URI of the source file.
+            proxy_uri (str): The proxy URI of the source file.
+            duplicates (List[Tuple[str, str]]): The duplicates returned by
+                `duplicates`.
+
+        Returns:
+            bool: Whether the proxy has been created.
+        """
+        source_path = Gst.uri_get_location(source_uri)
+        path = Gst.uri_get_location(proxy_uri)
+        for duplicate_source_path, duplicate_path in duplicates:
+            try:
+                if not filecmp.cmp(duplicate_source_path, source_path, shallow=False):
+                    self.debug("%s and %s have the same fingerprint but differ",
+                               duplicate_source_path, source_path)
+                    continue
+            except OSError as e:
+                self.warning("Failed comparing %s and %s: %s",
+                             duplicate_source_path, source_path, e)
+                continue
+
+            self.info("Sharing the proxy of %s for %s", duplicate_source_path, source_path)
+            try:
+                os.link(duplicate_path, path)
+            except OSError as e:
+                self.warning("Cannot link %s, copying it: %s", duplicate_path, e)
+                shutil.copyfile(duplicate_path, path + ".part")
+                os.replace(path + ".part", path)
+            return True
+
+        return False
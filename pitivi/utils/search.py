@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Full text search of items by the prefixes of their words."""
+import bisect
+import re
+import unicodedata
+
+
+# The underscores separate words too, as in "DSC_0001.MOV".
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    """Splits the text in normalized words.
+
+    The words are case folded and stripped of their accents, so "Été"
+    matches "ete".
+
+    Returns:
+        List[str]: The words.
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return WORD_RE.findall(text)
+
+
+class SearchIndex(object):
+    """Index of items by the words describing them.
+
+    An item matches a query when each word of the query is the prefix of
+    a word of the item. The result of the last query is kept, so a query
+    refining it, for example while the user is typing, only has to check
+    the items of the previous result.
+    """
+
+    def __init__(self):
+        # The words of each item, by item.
+        self.__items = {}
+        # The items, by word.
+        self.__postings = {}
+        # The sorted indexed words, for finding the words with a prefix.
+        self.__words = []
+        # The (words, result) of the last search.
+        self.__last_search = None
+
+    def __len__(self):
+        return len(self.__items)
+
+    def add(self, item, text):
+        """Indexes the item, replacing its previous text if any.
+
+        Args:
+            item (object): A hashable item.
+            text (str): The text describing the item.
+        """
+        self.remove(item)
+        words = frozenset(tokenize(text))
+        self.__items[item] = words
+        for word in words:
+            items = self.__postings.get(word)
+            if items is None:
+                items = self.__postings[word] = set()
+                bisect.insort(self.__words, word)
+            items.add(item)
+        self.__last_search = None
+
+    def remove(self, item):
+        """Removes the item from the index, if indexed."""
+        words = self.__items.pop(item, None)
+        if words is None:
+            return
+        for word in words:
+            items = self.__postings[word]
+            items.discard(item)
+            if not items:
+                del self.__postings[word]
+                del self.__words[bisect.bisect_left(self.__words, word)]
+        self.__last_search = None
+
+    def clear(self):
+        """Removes all the items."""
+        self.__items = {}
+        self.__postings = {}
+        self.__words = []
+        self.__last_search = None
+
+    def __items_with_prefix(self, prefix):
+        items = set()
+        index = bisect.bisect_left(self.__words, prefix)
+        while index < len(self.__words) and self.__words[index].startswith(prefix):
+            items.update(self.__postings[self.__words[index]])
+            index += 1
+        return items
+
+    @staticmethod
+    def __item_matches(item_words, words):
+        return all(any(item_word.startswith(word) for item_word in item_words)
+                   for word in words)
+
+    @staticmethod
+    def __refines(words, previous_words):
+        """Returns whether all the matches of words match previous_words."""
+        return all(any(word.startswith(previous) for word in words)
+                   for previous in previous_words)
+
+    def matches(self, item, query):
+        """Returns whether the indexed item matches the query."""
+        words = tokenize(query)
+        return self.__item_matches(self.__items.get(item, ()), words)
+
+    def search(self, query):
+        """Finds the items matching the query.
+
+        Args:
+            query (str): The words to look for.
+
+        Returns:
+            Set[object]: The matching items, all the items if the query
+            has no words.
+        """
+        words = tokenize(query)
+        if not words:
+            return set(self.__items)
+
+        if self.__last_search and self.__refines(words, self.__last_search[0]):
+            # Narrow down the previous result.
+            result = {item for item in self.__last_search[1]
+                      if self.__item_matches(self.__items[item], words)}
+        else:
+            # Start with the least common word.
+            candidates = sorted((self.__items_with_prefix(word) for word in words),
+                                key=len)
+            result = candidates[0].intersection(*candidates[1:])
+
+        self.__last_search = (words, result)
+        return set(result)
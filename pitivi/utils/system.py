@@ -118,6 +118,28 @@ class WindowsSystem(System):
         System.__init__(self)
 
 
+def get_available_memory():
+    """Gets the amount of physical memory currently available.
+
+    Returns:
+        Optional[int]: The number of bytes, or None if unknown.
+    """
+    # MemAvailable includes the page cache which can be reclaimed,
+    # unlike the free pages reported by sysconf.
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
 def get_system():
     """Creates a System object.
 
@@ -72,16 +72,21 @@ class ThreadMaster(Loggable):
         Loggable.__init__(self)
         self.threads = []
 
-    def addThread(self, threadclass, *args):
-        """Instantiates the specified Thread class and starts it."""
+    def addThread(self, threadclass, *args, **kwargs):
+        """Instantiates the specified Thread class and starts it.
+
+        Returns:
+            Thread: The started thread.
+        """
         assert issubclass(threadclass, Thread)
         self.log("Adding thread of type %r", threadclass)
-        thread = threadclass(*args)
+        thread = threadclass(*args, **kwargs)
         thread.connect("done", self._threadDoneCb)
         self.threads.append(thread)
         self.log("starting it...")
         thread.start()
         self.log("started !")
+        return thread
 
     def _threadDoneCb(self, thread):
         self.log("thread %r is done", thread)
@@ -34,6 +34,7 @@ from gi.repository import Gio
 from gi.repository import GLib
 from gi.repository import GObject
 from gi.repository import Gst
+from gi.repository import GstPbutils
 from gi.repository import Gtk
 from gi.repository.GstPbutils import DiscovererAudioInfo
 from gi.repository.GstPbutils import DiscovererInfo
@@ -59,6 +60,8 @@ PLAYHEAD_COLOR = (255, 0, 0)
 SNAPBAR_WIDTH = 5
 SNAPBAR_COLOR = (127, 153, 204)
 LAYER_HEIGHT = 130
+# The color of the clips shown while the project is loading.
+SKELETON_CLIP_COLOR = (80, 80, 80)
 # The space between two layers.
 SEPARATOR_HEIGHT = PADDING
 
@@ -409,6 +412,41 @@ def beautify_asset(asset):
     return "\n".join(res)
 
 
+# The tags of the assets which can be searched in the media library.
+SEARCHABLE_TAGS = (Gst.TAG_TITLE, Gst.TAG_ARTIST, Gst.TAG_ALBUM, Gst.TAG_GENRE,
+                   Gst.TAG_COMMENT, Gst.TAG_DESCRIPTION, Gst.TAG_KEYWORDS)
+
+
+def asset_search_text(asset):
+    """Gets the text describing the asset, for searching it.
+
+    Includes the path, the duration, the codecs, the dimensions and the
+    main tags of the asset.
+
+    Args:
+        asset (GES.UriClipAsset): The asset to describe.
+    """
+    uri = get_proxy_target(asset).props.id
+    res = [path_from_uri(uri), beautify_length(asset.get_duration())]
+
+    info = asset.get_info()
+    for stream in info.get_stream_list():
+        caps = stream.get_caps()
+        if caps and not caps.is_empty() and caps.is_fixed():
+            res.append(GstPbutils.pb_utils_get_codec_description(caps) or "")
+        if isinstance(stream, DiscovererVideoInfo):
+            res.append("%dx%d" % (stream.get_width(), stream.get_height()))
+
+    tags = info.get_tags()
+    if tags:
+        for tag in SEARCHABLE_TAGS:
+            found, value = tags.get_string(tag)
+            if found:
+                res.append(value)
+
+    return "\n".join(res)
+
+
 def beautify_missing_asset(asset):
     """Formats the specified missing asset for display.
 
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Benchmarks measuring how Pitivi copes with large projects.
+
+Run with:
+    python3 -m tests.benchmark [--layers N] [--clips M] [--output FILE]
+
+The report is a JSON object with the durations of the stages, in s, and
+the peak memory usage after each stage, in KiB. Compare the reports of
+two versions with:
+    python3 -m tests.benchmark --compare OLD.json NEW.json
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from gi.repository import GES
+from gi.repository import GLib
+from gi.repository import Gst
+from gi.repository import GstController
+from gi.repository import Gtk
+
+from pitivi import configure
+from pitivi.timeline.previewers import Previewer
+from pitivi.timeline.timeline import TimelineContainer
+from tests import common
+
+
+# The sample used for all the clips of the generated projects.
+SAMPLE = "1sec_simpsons_trailer.mp4"
+# The duration of the generated clips.
+CLIP_DURATION = Gst.SECOND // 2
+# Every how many clips an effect is added.
+EFFECT_INTERVAL = 4
+# The number of keyframes of the alpha property of each video source.
+NUM_KEYFRAMES = 3
+
+REPORT_FORMAT_VERSION = 1
+
+
+def generate_project(path, num_layers, clips_per_layer, sample=SAMPLE):
+    """Writes a project file with layers of clips laid out end to end.
+
+    Every EFFECT_INTERVAL-th clip has an effect, and all the video sources
+    have keyframes.
+
+    Args:
+        path (str): The path of the project file to create.
+        num_layers (int): The number of layers in the timeline.
+        clips_per_layer (int): The number of clips in each layer.
+        sample (str): The name of the sample used by all the clips.
+    """
+    ges_timeline = GES.Timeline.new_audio_video()
+    asset = GES.UriClipAsset.request_sync(common.get_sample_uri(sample))
+    for unused_i in range(num_layers):
+        ges_layer = ges_timeline.append_layer()
+        for index in range(clips_per_layer):
+            ges_clip = ges_layer.add_asset(asset, index * CLIP_DURATION, 0,
+                                           CLIP_DURATION, GES.TrackType.UNKNOWN)
+            if index % EFFECT_INTERVAL == 0:
+                ges_clip.add(GES.Effect.new("agingtv"))
+
+            for source in common.get_clip_children(ges_clip, GES.TrackType.VIDEO):
+                if not isinstance(source, GES.VideoSource):
+                    continue
+                control_source = GstController.InterpolationControlSource()
+                control_source.props.mode = GstController.InterpolationMode.LINEAR
+                source.set_control_source(control_source, "alpha", "direct")
+                for keyframe in range(NUM_KEYFRAMES):
+                    control_source.set(keyframe * CLIP_DURATION // NUM_KEYFRAMES,
+                                       keyframe / NUM_KEYFRAMES)
+
+    if not ges_timeline.save_to_uri(Gst.filename_to_uri(path), None, True):
+        raise Exception("Failed to generate the project %s" % path)
+
+
+def max_rss():
+    """Gets the peak memory usage of the process, in KiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Benchmark(object):
+    """Opens a project and measures the duration of operations on it.
+
+    The full application is used, so the undo observers, the timeline
+    widgets and the previewers are all part of the measurements.
+
+    Attributes:
+        timings (dict): The duration of each stage, in s.
+        memory (dict): The peak memory usage after each stage, in KiB.
+    """
+
+    def __init__(self, project_uri, timeout=600):
+        self.project_uri = project_uri
+        self.timeout = timeout
+        self.timings = {}
+        self.memory = {}
+
+        self.app = common.create_pitivi(leftClickAlsoSeeks=False)
+        self.timeline_container = TimelineContainer(self.app)
+        self.app.gui.timeline_ui = self.timeline_container
+        self.window = Gtk.OffscreenWindow()
+        self.window.set_default_size(1280, 400)
+        self.window.add(self.timeline_container)
+        self.window.show_all()
+
+    def _record(self, name, start):
+        self.timings[name] = time.monotonic() - start
+        self.memory[name] = max_rss()
+
+    @contextmanager
+    def measured(self, name):
+        """Measures the duration of the wrapped code."""
+        start = time.monotonic()
+        yield
+        self._record(name, start)
+
+    def open_project(self):
+        """Measures the loading of the project until the UI is responsive.
+
+        The stages are:
+            load: Until the project is loaded by GES.
+            observe: Until the undo observers are set up.
+            populate: Until the timeline widgets are created.
+            first_draw: Until the timeline has been drawn.
+            first_interaction: Until the main loop is idle.
+        """
+        project_manager = self.app.project_manager
+        mainloop = common.create_main_loop()
+        start = time.monotonic()
+
+        def interactive_cb():
+            self._record("first_interaction", start)
+            mainloop.quit()
+            return False
+
+        def timeline_drawn_cb(timeline, unused_cr):
+            timeline.disconnect_by_func(timeline_drawn_cb)
+            self._record("first_draw", start)
+            # The previewers start generating at a lower priority.
+            GLib.idle_add(interactive_cb, priority=GLib.PRIORITY_DEFAULT_IDLE)
+            return False
+
+        def project_loaded_cb(unused_project, unused_ges_timeline):
+            self._record("load", start)
+
+        def new_project_loading_cb(unused_project_manager, project):
+            project.connect("loaded", project_loaded_cb)
+
+        def new_project_loaded_cb(unused_project_manager, project):
+            # The app sets up the undo observers before we get here.
+            self._record("observe", start)
+            self.timeline_container.setProject(project)
+            self._record("populate", start)
+            self.timeline_container.timeline.connect_after("draw", timeline_drawn_cb)
+            self.timeline_container.timeline.queue_draw()
+
+        project_manager.connect("new-project-loading", new_project_loading_cb)
+        project_manager.connect("new-project-loaded", new_project_loaded_cb)
+        try:
+            if not project_manager.loadProject(self.project_uri):
+                raise Exception("Failed to load %s" % self.project_uri)
+            mainloop.run(timeout_seconds=self.timeout)
+        finally:
+            project_manager.disconnect_by_func(new_project_loading_cb)
+            project_manager.disconnect_by_func(new_project_loaded_cb)
+
+    def save_project(self, uri):
+        """Measures saving the project to the specified URI."""
+        with self.measured("save"):
+            if not self.app.project_manager.saveProject(uri):
+                raise Exception("Failed to save %s" % uri)
+
+    def _undo_redo(self, name):
+        action_log = self.app.action_log
+        with self.measured("undo_" + name):
+            action_log.undo()
+        with self.measured("redo_" + name):
+            action_log.redo()
+
+    def move_all_clips(self):
+        """Measures moving all the clips at once, and undoing/redoing it."""
+        ges_timeline = self.app.project_manager.current_project.ges_timeline
+        with self.measured("move"):
+            with self.app.action_log.started("move all clips",
+                                             toplevel=True):
+                for ges_layer in ges_timeline.get_layers():
+                    # Start from the end so the clips never overlap.
+                    for ges_clip in reversed(ges_layer.get_clips()):
+                        ges_clip.set_start(ges_clip.props.start + CLIP_DURATION)
+        self._undo_redo("move")
+
+    def remove_all_clips(self):
+        """Measures removing all the clips at once, and undoing/redoing it."""
+        ges_timeline = self.app.project_manager.current_project.ges_timeline
+        with self.measured("remove"):
+            with self.app.action_log.started("remove all clips",
+                                             toplevel=True):
+                for ges_layer in ges_timeline.get_layers():
+                    for ges_clip in ges_layer.get_clips():
+                        ges_layer.remove_clip(ges_clip)
+        self._undo_redo("remove")
+
+    def queued_previewers(self):
+        """Gets the number of previewers waiting for their turn."""
+        manager = Previewer.manager
+        return sum(len(previewers) for previewers in manager._previewers.values())
+
+    def close(self):
+        self.timeline_container.setProject(None)
+        self.app.project_manager.closeRunningProject()
+        self.window.destroy()
+
+
+def run(num_layers, clips_per_layer, timeout=600):
+    """Runs all the benchmarks on a generated project.
+
+    Args:
+        num_layers (int): The number of layers in the timeline.
+        clips_per_layer (int): The number of clips in each layer.
+        timeout (int): The maximum duration of each mainloop run, in s.
+
+    Returns:
+        dict: The report.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "benchmark.xges")
+        start = time.monotonic()
+        generate_project(path, num_layers, clips_per_layer)
+        generate_duration = time.monotonic() - start
+        project_size = os.path.getsize(path)
+
+        benchmark = Benchmark(Gst.filename_to_uri(path), timeout=timeout)
+        try:
+            benchmark.open_project()
+            queued_previewers = benchmark.queued_previewers()
+            benchmark.save_project(Gst.filename_to_uri(os.path.join(tmp_dir, "saved.xges")))
+            benchmark.move_all_clips()
+            benchmark.remove_all_clips()
+        finally:
+            benchmark.close()
+
+    return {"format": REPORT_FORMAT_VERSION,
+            "pitivi_version": configure.VERSION,
+            "gst_version": Gst.version_string(),
+            "layers": num_layers,
+            "clips_per_layer": clips_per_layer,
+            "project_size": project_size,
+            "generate": generate_duration,
+            "queued_previewers": queued_previewers,
+            "timings": benchmark.timings,
+            "max_rss": benchmark.memory}
+
+
+def compare(old_report, new_report):
+    """Gets the lines describing the changes between two reports."""
+    lines = []
+    for section, unit in (("timings", "s"), ("max_rss", "KiB")):
+        old_values = old_report.get(section, {})
+        new_values = new_report.get(section, {})
+        for name in sorted(set(old_values) | set(new_values)):
+            old = old_values.get(name)
+            new = new_values.get(name)
+            if old is None or new is None:
+                lines.append("%s.%s: %s -> %s" % (section, name, old, new))
+                continue
+            change = (new - old) * 100 / old if old else 0
+            lines.append("%s.%s: %.3f%s -> %.3f%s (%+.1f%%)" %
+                         (section, name, old, unit, new, unit, change))
+    return lines
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--layers", type=int, default=1,
+                        help="The number of layers in the generated project")
+    parser.add_argument("--clips", type=int, default=5000,
+                        help="The number of clips in each layer")
+    parser.add_argument("--timeout", type=int, default=600,
+                        help="The maximum duration of each stage, in s")
+    parser.add_argument("--output", help="The file where to write the report")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="Compare two reports instead of running")
+    options = parser.parse_args(argv)
+
+    if options.compare:
+        reports = []
+        for path in options.compare:
+            with open(path) as report_file:
+                reports.append(json.load(report_file))
+        print("\n".join(compare(*reports)))
+        return
+
+    report = run(options.layers, options.clips, timeout=options.timeout)
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
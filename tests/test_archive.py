@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.archive module."""
+# pylint: disable=missing-docstring,protected-access,no-self-use
+import os
+import tarfile
+import tempfile
+
+from pitivi.utils.archive import ProjectArchiver
+from tests import common
+
+
+class TestProjectArchiver(common.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.archive_path = os.path.join(self.tmp_dir, "project.xges_tar")
+
+        self.files = []
+        for name, content in (("a.mov", b"a" * 100000), ("b.mov", b"b" * 10)):
+            path = os.path.join(self.tmp_dir, name)
+            with open(path, "wb") as media_file:
+                media_file.write(content)
+            self.files.append((path, os.path.join("project-export", "media", name)))
+
+    def archive(self, cancel=False):
+        mainloop = common.create_main_loop()
+        errors = []
+
+        def done_cb(archiver, error):
+            errors.append(error)
+            mainloop.quit()
+
+        archiver = ProjectArchiver(self.archive_path,
+                                   "project-export/project.xges", b"<ges/>",
+                                   self.files, done_cb=done_cb)
+        if cancel:
+            archiver.abort()
+        archiver.start()
+        mainloop.run()
+        archiver.join()
+        return archiver, errors[0]
+
+    def test_archive(self):
+        archiver, error = self.archive()
+        self.assertIsNone(error)
+        self.assertEqual(archiver.written, 100010)
+        self.assertEqual(archiver.total, 100010)
+
+        with tarfile.open(self.archive_path) as tar:
+            self.assertEqual(tar.getnames(),
+                             ["project-export/project.xges",
+                              "project-export/media/a.mov",
+                              "project-export/media/b.mov"])
+            self.assertEqual(tar.extractfile("project-export/project.xges").read(),
+                             b"<ges/>")
+            self.assertEqual(tar.extractfile("project-export/media/a.mov").read(),
+                             b"a" * 100000)
+        self.assertEqual(os.listdir(self.tmp_dir).count("project.xges_tar.part"), 0)
+
+    def test_cancel(self):
+        unused_archiver, error = self.archive(cancel=True)
+        self.assertIsNone(error)
+        self.assertFalse(os.path.exists(self.archive_path))
+        self.assertFalse(os.path.exists(self.archive_path + ".part"))
+
+    def test_missing_file(self):
+        self.files.append((os.path.join(self.tmp_dir, "missing.mov"), "missing.mov"))
+        unused_archiver, error = self.archive()
+        self.assertIsInstance(error, OSError)
+        self.assertFalse(os.path.exists(self.archive_path))
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the autoaligner module."""
+# pylint: disable=missing-docstring,protected-access,no-self-use
+import time
+import unittest
+from unittest import mock
+
+from pitivi.autoaligner import affinealign
+from pitivi.autoaligner import rigidalign
+from tests import common
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipUnless(numpy, "numpy is required for the autoaligner")
+class TestAffineAlign(common.TestCase):
+    """Tests the drift estimation on synthetic drifting signals."""
+
+    def setUp(self):
+        super().setUp()
+        random = numpy.random.RandomState(42)
+        # One hour of envelope at the AutoAligner's BLOCKRATE.
+        noise = random.standard_normal(25 * 3600 + 10000)
+        self.reference = numpy.abs(numpy.convolve(noise, numpy.ones(5), "same"))
+        self.random = random
+
+    def drifting_target(self, offset, drift, length):
+        """Resamples the reference as recorded by a drifting device."""
+        positions = offset + (1 + drift) * numpy.arange(length)
+        target = numpy.interp(positions, numpy.arange(len(self.reference)),
+                              self.reference)
+        return target + 0.3 * self.random.random_sample(length)
+
+    def test_drift_estimation(self):
+        for offset, drift in ((1234.3, 2e-5), (500, -3e-4), (8000, 1.5e-3)):
+            target = self.drifting_target(offset, drift, 60000)
+            offsets, drifts = affinealign(self.reference, [target], 0.002)
+            self.assertAlmostEqual(offsets[0], offset, delta=0.5)
+            self.assertAlmostEqual(drifts[0], drift, delta=2e-5)
+
+    def test_no_drift(self):
+        target = self.drifting_target(3000, 0, 20000)
+        offsets, drifts = affinealign(self.reference, [target], 0.002)
+        self.assertAlmostEqual(offsets[0], 3000, delta=0.5)
+        self.assertAlmostEqual(drifts[0], 0, delta=2e-5)
+        self.assertAlmostEqual(rigidalign(self.reference, [target])[0], 3000, delta=0.5)
+
+    def test_windowed_correlations(self):
+        """Checks only the coarse alignment uses full-length transforms."""
+        target = self.drifting_target(1000, 1e-4, 80000)
+        rfft = numpy.fft.rfft
+        sizes = []
+
+        def rfft_spy(signal, n=None, *args, **kwargs):
+            sizes.append(n or len(signal))
+            return rfft(signal, n, *args, **kwargs)
+
+        start = time.time()
+        with mock.patch.object(numpy.fft, "rfft", rfft_spy):
+            offsets, drifts = affinealign(self.reference, [target], 0.002)
+        self.debug("Aligned %d samples in %fs", len(target), time.time() - start)
+        self.assertAlmostEqual(offsets[0], 1000, delta=0.5)
+        self.assertAlmostEqual(drifts[0], 1e-4, delta=2e-5)
+
+        full_length = [size for size in sizes if size >= len(target)]
+        # The reference and the target in rigidalign.
+        self.assertEqual(len(full_length), 2)
+        self.assertLess(max(size for size in sizes if size < len(target)),
+                        len(target) // 4)
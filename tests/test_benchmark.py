@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the benchmark harness, so it keeps working."""
+# pylint: disable=missing-docstring,protected-access,no-self-use
+from tests import benchmark
+from tests import common
+
+
+class TestBenchmark(common.TestCase):
+
+    def test_run(self):
+        report = benchmark.run(num_layers=2, clips_per_layer=3, timeout=30)
+        self.assertEqual(report["layers"], 2)
+        self.assertEqual(report["clips_per_layer"], 3)
+        for stage in ("load", "observe", "populate", "first_draw",
+                      "first_interaction", "save", "move", "undo_move",
+                      "redo_move", "remove", "undo_remove", "redo_remove"):
+            self.assertIn(stage, report["timings"])
+            self.assertIn(stage, report["max_rss"])
+
+    def test_compare(self):
+        old = {"timings": {"load": 2.0, "save": 1.0}, "max_rss": {"load": 100}}
+        new = {"timings": {"load": 1.0, "populate": 3.0}, "max_rss": {"load": 150}}
+        self.assertEqual(benchmark.compare(old, new),
+                         ["timings.load: 2.000s -> 1.000s (-50.0%)",
+                          "timings.populate: None -> 3.0",
+                          "timings.save: 1.0 -> None",
+                          "max_rss.load: 100.000KiB -> 150.000KiB (+50.0%)"])
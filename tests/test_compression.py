@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.compression module."""
+# pylint: disable=missing-docstring,protected-access,no-self-use
+import lzma
+import os
+import tempfile
+
+from pitivi.utils.compression import decompress_file
+from pitivi.utils.compression import is_compressed
+from pitivi.utils.compression import read_project_file
+from pitivi.utils.misc import write_file_atomically
+from tests import common
+
+
+CONTENT = b"<?xml version='1.0' encoding='UTF-8'?>\n<ges version='0.4'/>\n" * 1000
+
+
+class TestCompression(common.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "project.xges")
+
+    def test_plain(self):
+        write_file_atomically(self.path, CONTENT)
+        self.assertFalse(is_compressed(self.path))
+        self.assertEqual(read_project_file(self.path), CONTENT)
+
+    def test_gzip(self):
+        write_file_atomically(self.path, CONTENT, compress=True)
+        self.assertTrue(is_compressed(self.path))
+        self.assertLess(os.path.getsize(self.path), len(CONTENT))
+        self.assertEqual(read_project_file(self.path), CONTENT)
+
+        decompressed_path = self.path + ".decompressed"
+        decompress_file(self.path, decompressed_path)
+        with open(decompressed_path, "rb") as decompressed:
+            self.assertEqual(decompressed.read(), CONTENT)
+
+    def test_xz(self):
+        with lzma.open(self.path, "wb") as project_file:
+            project_file.write(CONTENT)
+        self.assertTrue(is_compressed(self.path))
+        self.assertEqual(read_project_file(self.path), CONTENT)
+
+    def test_corrupted(self):
+        write_file_atomically(self.path, CONTENT, compress=True)
+        with open(self.path, "rb") as project_file:
+            data = project_file.read()
+        with open(self.path, "wb") as project_file:
+            project_file.write(data[:len(data) // 2])
+
+        self.assertTrue(is_compressed(self.path))
+        with self.assertRaises(OSError):
+            read_project_file(self.path)
+        with self.assertRaises(OSError):
+            decompress_file(self.path, self.path + ".decompressed")
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.discovery module."""
+# pylint: disable=missing-docstring,protected-access,no-self-use
+import os
+import tempfile
+from unittest import mock
+
+from gi.repository import GLib
+from gi.repository import Gst
+
+from pitivi.utils.discovery import DiscoveryCache
+from pitivi.utils.discovery import DiscoveryQueue
+from pitivi.utils.discovery import io_order
+from tests import common
+
+
+class TestIoOrder(common.TestCase):
+
+    def test_grouped_by_directory(self):
+        uris = ["file:///b/2.mov", "file:///a/2.mov", "file:///b/1.mov",
+                "file:///a/1.mov"]
+        with mock.patch("os.stat") as stat:
+            stat.return_value.st_dev = 1
+            self.assertEqual(io_order(uris),
+                             ["file:///a/1.mov", "file:///a/2.mov",
+                              "file:///b/1.mov", "file:///b/2.mov"])
+
+    def test_devices_interleaved(self):
+        uris = ["file:///a/1.mov", "file:///a/2.mov", "file:///b/1.mov",
+                "file:///b/2.mov", "http://example.com/1.mov"]
+
+        def stat(path):
+            return mock.Mock(st_dev=path)
+
+        with mock.patch("os.stat", side_effect=stat):
+            self.assertEqual(io_order(uris),
+                             ["file:///a/1.mov", "file:///b/1.mov",
+                              "http://example.com/1.mov",
+                              "file:///a/2.mov", "file:///b/2.mov"])
+
+
+class TestDiscoveryQueue(common.TestCase):
+
+    def test_bounded_jobs(self):
+        started = []
+        queue = DiscoveryQueue(lambda uri: started.append(uri) or True, 2)
+        uris = ["file:///a/%d.mov" % i for i in range(5)]
+        queue.push(uris)
+        self.assertEqual(started, uris[:2])
+        self.assertEqual(len(queue), 5)
+
+        # Files already queued are ignored.
+        queue.push(uris[:3])
+        self.assertEqual(len(queue), 5)
+
+        queue.job_done(uris[1])
+        self.assertEqual(started, uris[:3])
+        queue.job_done(uris[0])
+        self.assertEqual(started, uris[:4])
+
+        # Unknown files are ignored.
+        queue.job_done("file:///other.mov")
+        self.assertEqual(len(queue), 3)
+
+    def test_not_started(self):
+        queue = DiscoveryQueue(lambda uri: uri != "file:///a/1.mov", 1)
+        queue.push(["file:///a/1.mov", "file:///a/2.mov"])
+        self.assertNotIn("file:///a/1.mov", queue)
+        self.assertIn("file:///a/2.mov", queue)
+
+    def test_remove(self):
+        started = []
+        queue = DiscoveryQueue(lambda uri: started.append(uri) or True, 1)
+        queue.push(["file:///a/1.mov", "file:///a/2.mov", "file:///a/3.mov"])
+        # The discovery of the first file already started.
+        self.assertFalse(queue.remove("file:///a/1.mov"))
+        self.assertTrue(queue.remove("file:///a/2.mov"))
+        self.assertNotIn("file:///a/2.mov", queue)
+
+        queue.job_done("file:///a/1.mov")
+        self.assertEqual(started, ["file:///a/1.mov", "file:///a/3.mov"])
+
+
+class TestDiscoveryCache(common.TestCase):
+
+    def test_errors_of_unchanged_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "broken.mov")
+            with open(path, "w") as broken:
+                broken.write("broken")
+            uri = Gst.filename_to_uri(path)
+            errors_path = os.path.join(tmp_dir, "errors.json")
+
+            errors = DiscoveryCache(errors_path)
+            self.assertIsNone(errors.get_error(uri))
+            errors.add_error(uri, GLib.Error("Cannot decode", "gst-stream-error-quark", 6))
+            errors.save()
+
+            error = DiscoveryCache(errors_path).get_error(uri)
+            self.assertEqual(error.message, "Cannot decode")
+            self.assertEqual(error.domain, "gst-stream-error-quark")
+            self.assertEqual(error.code, 6)
+
+            # The file is discovered again when the plugins change.
+            with mock.patch.object(DiscoveryCache, "_DiscoveryCache__plugins_fingerprint",
+                                   return_value="other plugins"):
+                self.assertIsNone(DiscoveryCache(errors_path).get_error(uri))
+
+            # A modified file is discovered again.
+            with open(path, "w") as broken:
+                broken.write("modified")
+            self.assertIsNone(errors.get_error(uri))
+
+    def test_durations_of_unchanged_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "clip.mov")
+            with open(path, "w") as clip:
+                clip.write("clip")
+            uri = Gst.filename_to_uri(path)
+            cache_path = os.path.join(tmp_dir, "cache.json")
+
+            cache = DiscoveryCache(cache_path)
+            self.assertEqual(cache.get_duration(uri), 0)
+            cache.add_error(uri, GLib.Error("Cannot decode"))
+            # The file has been discovered successfully meanwhile.
+            cache.add_duration(uri, Gst.SECOND)
+            cache.save()
+
+            cache = DiscoveryCache(cache_path)
+            self.assertEqual(cache.get_duration(uri), Gst.SECOND)
+            self.assertIsNone(cache.get_error(uri))
+
+            with open(path, "w") as clip:
+                clip.write("modified")
+            self.assertEqual(cache.get_duration(uri), 0)
+
+    def test_missing_files_ignored(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            errors = DiscoveryCache(os.path.join(tmp_dir, "errors.json"))
+            uri = Gst.filename_to_uri(os.path.join(tmp_dir, "missing.mov"))
+            errors.add_error(uri, GLib.Error("Missing"))
+            self.assertIsNone(errors.get_error(uri))
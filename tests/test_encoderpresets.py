@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.encoderpresets module."""
+# pylint: disable=missing-docstring,protected-access,no-self-use
+import os
+import tempfile
+from unittest import mock
+
+from gi.repository import Gst
+from gi.repository import GstPbutils
+
+from pitivi.utils import encoderpresets
+from pitivi.utils.encoderpresets import preset_name
+from pitivi.utils.encoderpresets import referenced_presets
+from pitivi.utils.encoderpresets import remove_unused_presets
+from tests import common
+
+
+PRESETS = """[_presets_]
+version=1.14.1
+element-name=GstX264Enc
+
+[encoder_settings_aaa]
+bitrate=2048
+
+[encoder_settings_bbb]
+bitrate=1024
+
+[encoder_settings_ccc]
+bitrate=512
+
+[My preset]
+bitrate=1
+"""
+
+
+class TestEncoderPresets(common.TestCase):
+
+    def test_preset_name(self):
+        name = preset_name("x264enc", {"bitrate": 2048, "pass": 0})
+        self.assertTrue(name.startswith("encoder_settings_"))
+        self.assertEqual(preset_name("x264enc", {"pass": 0, "bitrate": 2048}), name)
+        self.assertNotEqual(preset_name("x264enc", {"bitrate": 1024, "pass": 0}), name)
+        self.assertNotEqual(preset_name("vp8enc", {"bitrate": 2048, "pass": 0}), name)
+
+    def test_preset_name_stable(self):
+        settings = {"pass": GstPbutils.DiscovererResult.OK,
+                    "caps": Gst.Caps.from_string("video/x-raw")}
+        name = preset_name("x264enc", settings)
+        self.assertEqual(preset_name("x264enc", dict(settings)), name)
+        self.assertEqual(name, preset_name("x264enc", {"pass": 0,
+                                                       "caps": Gst.Caps.from_string("video/x-raw")}))
+
+    def test_remove_unused_presets(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            project_path = os.path.join(tmp_dir, "project.xges")
+            with open(project_path, "w") as project:
+                project.write("<stream-profile preset='encoder_settings_aaa'/>")
+            presets_path = os.path.join(tmp_dir, "GstX264Enc.prs")
+            with open(presets_path, "w") as presets:
+                presets.write(PRESETS)
+
+            used = referenced_presets([project_path, project_path + "~"])
+            self.assertEqual(used, {"encoder_settings_aaa"})
+
+            with mock.patch.object(encoderpresets, "session_presets",
+                                   {"encoder_settings_bbb"}):
+                self.assertEqual(remove_unused_presets(used, tmp_dir), 1)
+
+            with open(presets_path) as presets:
+                content = presets.read()
+            self.assertIn("[_presets_]", content)
+            self.assertIn("[encoder_settings_aaa]", content)
+            self.assertIn("[encoder_settings_bbb]", content)
+            self.assertNotIn("[encoder_settings_ccc]", content)
+            self.assertIn("[My preset]", content)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.extract module."""
+# pylint: disable=missing-docstring,protected-access,no-self-use
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from gi.repository import Gst
+
+from pitivi.utils.extract import AudioExtractionPool
+from pitivi.utils.extract import AudioExtractor
+from pitivi.utils.extract import Extractee
+from pitivi.utils.extract import ExtractionError
+from tests import common
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class CollectingExtractee(Extractee):
+
+    def __init__(self, done_cb=None):
+        self.blocks = []
+        self.finalized = False
+        self.done_cb = done_cb
+
+    def receive(self, array):
+        self.blocks.append(array)
+
+    def finalize(self):
+        self.finalized = True
+        if self.done_cb:
+            self.done_cb()
+
+
+@unittest.skipUnless(numpy, "numpy is required for extracting samples")
+class TestAudioExtractor(common.TestCase):
+
+    def test_blocks(self):
+        uri = common.get_sample_uri("mp3_sample.mp3")
+        extractor = AudioExtractor(uri, Gst.SECOND // 2, Gst.SECOND,
+                                   rate=8000, channels=1, block_size=1000)
+        blocks = list(extractor.blocks())
+        self.assertTrue(all(block.dtype == numpy.float32 for block in blocks))
+        self.assertTrue(all(block.shape == (1000,) for block in blocks[:-1]))
+        # The range is clipped to the requested duration.
+        self.assertAlmostEqual(sum(len(block) for block in blocks), 8000, delta=10)
+
+    def test_channels(self):
+        uri = common.get_sample_uri("mp3_sample.mp3")
+        extractor = AudioExtractor(uri, 0, Gst.SECOND // 10,
+                                   rate=10000, channels=2)
+        blocks = list(extractor.blocks())
+        self.assertTrue(blocks)
+        self.assertTrue(all(block.shape[1] == 2 for block in blocks))
+
+    def test_special_characters(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "a b!c,d.mp3")
+            shutil.copyfile(Gst.uri_get_location(common.get_sample_uri("mp3_sample.mp3")),
+                            path)
+            extractor = AudioExtractor(Gst.filename_to_uri(path), 0, Gst.SECOND // 10)
+            self.assertTrue(list(extractor.blocks()))
+
+    def test_error(self):
+        uri = common.get_sample_uri("missing.mp3")
+        extractor = AudioExtractor(uri, 0, Gst.SECOND)
+        with self.assertRaises(ExtractionError):
+            list(extractor.blocks())
+
+    def test_unexpected_error(self):
+        mainloop = common.create_main_loop()
+        uri = common.get_sample_uri("mp3_sample.mp3")
+        extractor = AudioExtractor(uri, 0, Gst.SECOND)
+        errors = []
+
+        def error_cb(error):
+            errors.append(error)
+            mainloop.quit()
+
+        with mock.patch.object(extractor, "blocks", side_effect=ValueError("bug")):
+            extractor.extract(CollectingExtractee(), error_cb=error_cb)
+            mainloop.run()
+        self.assertIsInstance(errors[0], ExtractionError)
+
+    def test_extract_async(self):
+        mainloop = common.create_main_loop()
+        uri = common.get_sample_uri("mp3_sample.mp3")
+        extractor = AudioExtractor(uri, 0, Gst.SECOND,
+                                   rate=8000, block_size=500)
+        extractee = CollectingExtractee(mainloop.quit)
+        extractor.extract(extractee, max_pending_blocks=1)
+        mainloop.run()
+
+        self.assertTrue(extractee.finalized)
+        self.assertAlmostEqual(sum(len(block) for block in extractee.blocks),
+                               8000, delta=10)
+
+    def test_pool(self):
+        mainloop = common.create_main_loop()
+        uri = common.get_sample_uri("mp3_sample.mp3")
+        pool = AudioExtractionPool(max_jobs=2)
+        extractees = []
+
+        def done_cb():
+            if all(extractee.finalized for extractee in extractees):
+                mainloop.quit()
+
+        for start in range(3):
+            extractee = CollectingExtractee(done_cb)
+            extractees.append(extractee)
+            pool.add(AudioExtractor(uri, start * Gst.SECOND // 4, Gst.SECOND // 4,
+                                    rate=8000), extractee)
+        self.assertEqual(len(pool._running), 2)
+        mainloop.run()
+
+        for extractee in extractees:
+            self.assertAlmostEqual(sum(len(block) for block in extractee.blocks),
+                                   2000, delta=10)
+        self.assertFalse(pool._running)
+
+    def test_error_after_cancel(self):
+        mainloop = common.create_main_loop()
+        errors = []
+        pool = AudioExtractionPool(max_jobs=2)
+        extractors = [AudioExtractor(common.get_sample_uri("missing.mp3"), 0, Gst.SECOND)
+                      for unused_i in range(2)]
+        for extractor in extractors:
+            pool.add(extractor, CollectingExtractee(), error_cb=errors.append)
+        pool.cancel()
+        for extractor in extractors:
+            extractor._thread.join()
+        mainloop.run(until_empty=True)
+        self.assertEqual(errors, [])
+
+        # A failure notified before being cancelled is ignored by the pool.
+        pool._job_done(extractors[0])
+        self.assertFalse(pool._running)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the undo.journal module."""
+# pylint: disable=missing-docstring,protected-access,no-self-use
+import os
+import tempfile
+from unittest import mock
+
+from gi.repository import Gst
+
+from pitivi.undo.journal import ActionJournal
+from pitivi.undo.journal import get_snapshot_seq
+from pitivi.undo.journal import read_journal
+from pitivi.undo.journal import tag_snapshot
+from pitivi.undo.undo import UndoableAction
+from pitivi.undo.undo import UndoableActionLog
+from tests import common
+
+
+class NamedAction(UndoableAction):
+
+    def __init__(self, name):
+        UndoableAction.__init__(self)
+        self.name = name
+
+    def do(self):
+        pass
+
+    def undo(self):
+        pass
+
+    def asScenarioAction(self):
+        if self.name is None:
+            return None
+        st = Gst.Structure.new_empty("named-action")
+        st.set_value("name", self.name)
+        return st
+
+
+class ValueChangedAction(NamedAction):
+
+    def __init__(self, value):
+        NamedAction.__init__(self, str(value))
+
+    def coalesce_key(self):
+        return "value"
+
+    def expand(self, action):
+        self.name = action.name
+        return True
+
+
+class TestActionJournal(common.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "project.xges.journal~")
+        self.action_log = UndoableActionLog()
+        self.break_cb = mock.Mock()
+        self.journal = ActionJournal(self.path, self.action_log, self.break_cb)
+        self.addCleanup(self.journal.close)
+
+    def do_action(self, name):
+        with self.action_log.started(str(name)):
+            self.action_log.push(NamedAction(name))
+
+    def replayed_names(self, seq=0):
+        return [action["name"] for action in read_journal(self.path, seq)]
+
+    def test_actions_journaled_on_commit(self):
+        self.action_log.begin("operation")
+        self.action_log.push(NamedAction("a"))
+        self.action_log.push(NamedAction("b"))
+        self.assertEqual(self.replayed_names(), [])
+        self.action_log.commit("operation")
+        self.assertEqual(self.replayed_names(), ["a", "b"])
+        self.assertEqual(self.journal.seq, 2)
+
+        self.action_log.begin("rolled back")
+        self.action_log.push(NamedAction("c"))
+        self.action_log.rollback()
+        self.do_action("d")
+        self.assertEqual(self.replayed_names(), ["a", "b", "d"])
+        self.assertEqual(self.replayed_names(seq=2), ["d"])
+
+    def test_replay_stops_at_break(self):
+        self.do_action("a")
+        self.action_log.undo()
+        self.do_action("b")
+        self.assertEqual(self.replayed_names(), ["a"])
+
+        # A snapshot includes everything done before it.
+        seq = self.journal.snapshot()
+        self.do_action("c")
+        self.do_action(None)
+        self.do_action("d")
+        self.assertEqual(self.replayed_names(), ["a"])
+        self.assertEqual(self.replayed_names(seq), ["c"])
+
+        self.journal.compact(seq)
+        self.assertEqual(self.replayed_names(), ["c"])
+        self.do_action("e")
+        with open(self.path) as journal:
+            self.assertEqual(len(journal.readlines()), 2)
+
+    def test_coalesced_actions_journaled(self):
+        with self.action_log.started("slider"):
+            for value in range(10):
+                self.action_log.push(ValueChangedAction(value))
+        self.assertEqual(self.replayed_names(), ["9"])
+
+    def test_snapshot_requested_at_break(self):
+        self.do_action("a")
+        self.assertFalse(self.break_cb.called)
+        self.do_action(None)
+        self.action_log.undo()
+        self.assertEqual(self.break_cb.call_count, 1)
+
+        seq = self.journal.snapshot()
+        self.do_action("b")
+        self.assertEqual(self.replayed_names(seq), ["b"])
+        self.action_log.undo()
+        self.assertEqual(self.break_cb.call_count, 2)
+
+    def test_snapshot_during_operation(self):
+        self.action_log.begin("operation")
+        self.action_log.push(NamedAction("a"))
+        seq = self.journal.snapshot()
+        self.action_log.commit("operation")
+        self.do_action("b")
+        self.assertEqual(self.replayed_names(seq), [])
+
+    def test_truncated_entry_ignored(self):
+        self.do_action("a")
+        self.do_action("b")
+        with open(self.path) as journal:
+            content = journal.read()
+        with open(self.path, "w") as journal:
+            journal.write(content[:-5])
+        self.assertEqual(self.replayed_names(), ["a"])
+
+
+class TestSnapshotTag(common.TestCase):
+
+    def test_tag(self):
+        data = b"<?xml version='1.0' encoding='UTF-8'?>\n<ges version='0.4'/>\n"
+        self.assertIsNone(get_snapshot_seq(data))
+        tagged = tag_snapshot(data, 42)
+        self.assertTrue(tagged.startswith(b"<?xml version='1.0' encoding='UTF-8'?>\n<!--"))
+        self.assertTrue(tagged.endswith(b"<ges version='0.4'/>\n"))
+        self.assertEqual(get_snapshot_seq(tagged), 42)
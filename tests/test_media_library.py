@@ -21,7 +21,9 @@ import tempfile
 from gettext import gettext as _
 from unittest import mock
 
+from gi.repository import GdkPixbuf
 from gi.repository import GES
+from gi.repository import GLib
 from gi.repository import Gst
 
 from pitivi import medialibrary
@@ -31,6 +33,58 @@ from pitivi.utils.proxy import ProxyingStrategy
 from tests import common
 
 
+class TestThumbnailLoader(common.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        patcher = mock.patch.object(medialibrary.AssetThumbnail,
+                                    "get_thumbnails_from_xdg_cache",
+                                    return_value=(None, None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_image(self, width, height):
+        path = os.path.join(self.tmp_dir.name, "image.png")
+        pixbuf = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, False, 8, width, height)
+        pixbuf.fill(0xff0000ff)
+        pixbuf.savev(path, "png", [], [])
+        return Gst.filename_to_uri(path)
+
+    def load(self, loader, uri):
+        results = []
+        loader.load(uri, True, lambda *thumbnails: results.append(thumbnails))
+        context = GLib.MainContext.default()
+        while not results:
+            context.iteration(True)
+        return results[0]
+
+    def test_load_image(self):
+        loader = medialibrary.ThumbnailLoader()
+        uri = self.create_image(1000, 500)
+        small_thumb, large_thumb = self.load(loader, uri)
+        self.assertEqual(large_thumb.props.width, medialibrary.LARGE_THUMB_WIDTH)
+        self.assertEqual(large_thumb.props.height, medialibrary.LARGE_THUMB_WIDTH // 2)
+        self.assertEqual(small_thumb.props.width, medialibrary.SMALL_THUMB_WIDTH)
+
+        # The thumbnails are cached.
+        with mock.patch.object(loader, "load_thumbnails") as load_thumbnails:
+            self.assertEqual(self.load(loader, uri), (small_thumb, large_thumb))
+            self.assertEqual(loader.load_sync(uri, True), (small_thumb, large_thumb))
+            load_thumbnails.assert_not_called()
+
+        # Changed files are loaded again.
+        uri = self.create_image(500, 500)
+        unused_small_thumb, large_thumb = self.load(loader, uri)
+        self.assertEqual(large_thumb.props.height, medialibrary.LARGE_THUMB_WIDTH)
+
+    def test_load_missing(self):
+        loader = medialibrary.ThumbnailLoader()
+        uri = Gst.filename_to_uri(os.path.join(self.tmp_dir.name, "missing.png"))
+        self.assertEqual(self.load(loader, uri), (None, None))
+
+
 class BaseTestMediaLibrary(common.TestCase):
 
     def __init__(self, *args):
@@ -228,3 +282,47 @@ class TestMediaLibrary(BaseTestMediaLibrary):
             with common.created_project_file(asset_uri) as uri:
                 self._customSetUp(project_uri=uri)
         self.assertTrue(self.medialibrary._import_warning_infobar.props.visible)
+
+    def test_flush_pending_assets_in_chunks(self):
+        self._customSetUp()
+        assets = []
+        for i in range(2 * medialibrary.MediaLibraryWidget.ROWS_CHUNK_SIZE + 10):
+            asset = mock.Mock()
+            asset.props.id = "file:///%03d.mov" % (1000 - i)
+            asset.ready = True
+            assets.append(asset)
+
+        def get_id(asset):
+            return asset.props.id
+
+        with mock.patch.object(medialibrary, "AssetThumbnail") as thumbnail, \
+                mock.patch.object(medialibrary, "info_name", get_id), \
+                mock.patch.object(medialibrary, "beautify_asset", get_id), \
+                mock.patch.object(medialibrary, "asset_search_text", get_id):
+            thumbnail.return_value.small_thumb = None
+            thumbnail.return_value.large_thumb = None
+            self.medialibrary._pending_assets.extend(assets)
+            self.medialibrary._flushPendingAssets()
+
+            # The rest of the rows are inserted when idle.
+            self.assertEqual(len(self.medialibrary.storemodel),
+                             medialibrary.MediaLibraryWidget.ROWS_CHUNK_SIZE)
+            self.assertIsNone(self.medialibrary.treeview.get_model())
+            self.assertTrue(all(call[1] == {"lazy": True}
+                                for call in thumbnail.call_args_list))
+
+            context = GLib.MainContext.default()
+            while self.medialibrary.treeview.get_model() is None:
+                context.iteration(True)
+
+        self.assertEqual(len(self.medialibrary.storemodel), len(assets))
+        self.assertIs(self.medialibrary.iconview.get_model(),
+                      self.medialibrary.modelFilter)
+        uris = [row[medialibrary.COL_URI] for row in self.medialibrary.storemodel]
+        self.assertEqual(uris, sorted(uris))
+
+        self.medialibrary.search("100")
+        self.assertEqual([row[medialibrary.COL_URI] for row in self.medialibrary.modelFilter],
+                         ["file:///1000.mov"])
+        self.medialibrary.search("")
+        self.assertEqual(len(self.medialibrary.modelFilter), len(assets))
@@ -19,11 +19,14 @@
 """Tests for the utils.misc module."""
 # pylint: disable=protected-access,no-self-use
 import os
+import tempfile
 from unittest import mock
 
 from gi.repository import GdkPixbuf
+from gi.repository import GLib
 from gi.repository import Gst
 
+from pitivi.utils.misc import FileInfoCache
 from pitivi.utils.misc import PathWalker
 from pitivi.utils.misc import scale_pixbuf
 from tests import common
@@ -66,10 +69,8 @@ class PathWalkerTest(common.TestCase):
         mainloop = common.create_main_loop()
         received_uris = []
 
-        def done_cb(uris):  # pylint: disable=missing-docstring
-            received_uris.extend(uris)
-            mainloop.quit()
-        walker = PathWalker(uris, done_cb)
+        walker = PathWalker(uris, received_uris.extend,
+                            done_cb=lambda walker: mainloop.quit())
         walker.run()
         mainloop.run()
         return received_uris
@@ -92,3 +93,122 @@ class PathWalkerTest(common.TestCase):
         self.assertGreater(len(received_uris), 1, received_uris)
         valid_uri = common.get_sample_uri("tears_of_steel.webm")
         self.assertIn(valid_uri, received_uris)
+
+    def _create_tree(self, root):
+        """Creates files in nested directories."""
+        paths = []
+        for folder in ("", "a", os.path.join("a", "b"), "c"):
+            os.makedirs(os.path.join(root, folder), exist_ok=True)
+            for name in ("video.webm", "notes.txt"):
+                path = os.path.join(root, folder, name)
+                with open(path, "w"):
+                    pass
+                paths.append(path)
+        return paths
+
+    def test_scanning_in_batches(self):
+        """Checks the files are passed in batches as they are found."""
+        with tempfile.TemporaryDirectory() as root:
+            paths = self._create_tree(root)
+            mainloop = common.create_main_loop()
+            batches = []
+            progress = []
+
+            def accept(name):  # pylint: disable=missing-docstring
+                return name.endswith(".webm")
+
+            def done_cb(walker):  # pylint: disable=missing-docstring
+                self.assertEqual(walker.scanned_dirs, 4)
+                mainloop.quit()
+
+            with mock.patch.object(PathWalker, "BATCH_SIZE", 2):
+                walker = PathWalker([Gst.filename_to_uri(root)], batches.append,
+                                    accept=accept,
+                                    progress_cb=lambda walker: progress.append(walker.found_files),
+                                    done_cb=done_cb)
+                walker.run()
+                mainloop.run()
+
+        expected_uris = [Gst.filename_to_uri(path) for path in paths
+                         if path.endswith(".webm")]
+        self.assertEqual(sorted(sum(batches, [])), sorted(expected_uris))
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(progress[-1], len(expected_uris))
+
+    def test_abort(self):
+        """Checks the aborted scanning stops passing files."""
+        with tempfile.TemporaryDirectory() as root:
+            self._create_tree(root)
+            mainloop = common.create_main_loop()
+            batches = []
+            walker = PathWalker([Gst.filename_to_uri(root)], batches.append,
+                                done_cb=lambda walker: mainloop.quit())
+            walker.abort()
+            walker.run()
+            mainloop.run()
+
+        self.assertEqual(batches, [])
+
+
+class FileInfoCacheTest(common.TestCase):
+    """Tests for the `FileInfoCache` class."""
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def _create_file(self, name, content=b"content"):
+        """Creates a file in the temporary directory."""
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, "wb") as afile:
+            afile.write(content)
+        return Gst.filename_to_uri(path)
+
+    def test_prefetch(self):
+        """Checks the files are known after enumerating their directory."""
+        cache = FileInfoCache()
+        cache.enable()
+        uris = [self._create_file("file%d.mov" % i, b"x" * i) for i in range(5)]
+        cache.prefetch(uris[0])
+        context = GLib.MainContext.default()
+        while cache._FileInfoCache__listing:
+            context.iteration(True)
+
+        for i, uri in enumerate(uris):
+            self.assertEqual(cache.query_size(uri), i)
+
+        # The files created later are unknown until invalidated.
+        new_uri = self._create_file("new file.mov")
+        self.assertIsNone(cache.query_size(new_uri))
+        self.assertFalse(cache.exists(new_uri))
+        cache.invalidate(new_uri)
+        self.assertTrue(cache.exists(new_uri))
+
+        cache.clear()
+        os.remove(Gst.uri_get_location(uris[1]))
+        self.assertFalse(cache.exists(uris[1]))
+        self.assertEqual(cache.query_size(uris[2]), 2)
+
+    def test_missing_directory(self):
+        """Checks the files of a missing directory are queried directly."""
+        cache = FileInfoCache()
+        cache.enable()
+        uri = Gst.filename_to_uri(os.path.join(self.tmp_dir.name, "missing", "a.mov"))
+        cache.prefetch(uri)
+        context = GLib.MainContext.default()
+        while cache._FileInfoCache__listing:
+            context.iteration(True)
+
+        self.assertIsNone(cache.query_size(uri))
+
+    def test_disabled(self):
+        """Checks the files are queried every time when not enabled."""
+        cache = FileInfoCache()
+        uri = self._create_file("a.mov")
+        cache.prefetch(uri)
+        self.assertFalse(cache._FileInfoCache__listing)
+        self.assertEqual(cache.query_size(uri), len(b"content"))
+
+        self._create_file("a.mov", b"modified content")
+        self.assertEqual(cache.query_size(uri), len(b"modified content"))
@@ -28,6 +28,9 @@ from gi.repository import GES
 from gi.repository import Gst
 
 from pitivi.timeline.previewers import get_wavefile_location_for_uri
+from pitivi.timeline.previewers import PREVIEW_GENERATOR_SIGNALS
+from pitivi.timeline.previewers import Previewer
+from pitivi.timeline.previewers import PreviewGeneratorManager
 from pitivi.timeline.previewers import THUMB_HEIGHT
 from pitivi.timeline.previewers import THUMB_PERIOD
 from pitivi.timeline.previewers import ThumbnailCache
@@ -70,6 +73,65 @@ SIMPSON_WAVFORM_VALUES = [
     3.6256085412966614, 0.0]
 
 
+class FakePreviewer(Previewer):
+    """A previewer keeping track of when it's been started."""
+
+    __gsignals__ = PREVIEW_GENERATOR_SIGNALS
+
+    def __init__(self, start):
+        Previewer.__init__(self, GES.TrackType.VIDEO, 90)
+        self.ges_elem = mock.Mock()
+        self.ges_elem.props.start = start
+        self.ges_elem.props.duration = 5
+        self.started = False
+
+    def start_generation(self):
+        self.started = True
+
+    def stop_generation(self):
+        self.started = False
+        self.emit("done")
+
+
+class TestPreviewGeneratorManager(common.TestCase):
+    """Tests for the `PreviewGeneratorManager` class."""
+
+    def test_previewers_started_when_drawn(self):
+        """Checks the previewers run once drawn, from the leftmost one."""
+        previewers = [FakePreviewer(start) for start in (30, 10, 20, 0)]
+        for previewer in previewers:
+            previewer.become_controlled()
+        self.assertFalse(any(previewer.started for previewer in previewers))
+
+        # The last previewer is never drawn, as if it's outside the viewport.
+        for previewer in previewers[:3]:
+            previewer._Previewer__draw_cb(previewer, None)
+            self.assertTrue(previewer.exposed)
+        self.assertFalse(previewers[3].exposed)
+
+        started = []
+        while any(previewer.started for previewer in previewers):
+            previewer = [previewer for previewer in previewers if previewer.started][0]
+            started.append(previewer.ges_elem.props.start)
+            previewer.stop_generation()
+        self.assertEqual(started, [30, 10, 20])
+
+    def test_nearest_to_viewport_first(self):
+        """Checks the previewers in view start before the ones scrolled away."""
+        manager = PreviewGeneratorManager()
+        previewers = [FakePreviewer(start) for start in (0, 100, 10, 50, 120)]
+        manager.set_viewport(90, 110)
+        for previewer in previewers:
+            manager.add_previewer(previewer)
+
+        started = []
+        while any(previewer.started for previewer in previewers):
+            previewer = [previewer for previewer in previewers if previewer.started][0]
+            started.append(previewer.ges_elem.props.start)
+            previewer.stop_generation()
+        self.assertEqual(started, [0, 100, 120, 50, 10])
+
+
 class TestAudioPreviewer(BaseTestMediaLibrary):
     """Tests for the `AudioPreviewer` class."""
 
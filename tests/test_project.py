@@ -24,11 +24,16 @@ import time
 from unittest import mock
 
 from gi.repository import GES
+from gi.repository import GLib
 from gi.repository import Gst
 
 from pitivi import medialibrary
+from pitivi.project import AssetsLoadingProgress
 from pitivi.project import Project
 from pitivi.project import ProjectManager
+from pitivi.utils.compression import is_compressed
+from pitivi.utils.compression import read_project_file
+from pitivi.utils.compression import write_compressed
 from pitivi.utils.misc import path_from_uri
 from pitivi.utils.proxy import ProxyingStrategy
 from tests import common
@@ -258,6 +263,100 @@ class TestProjectManager(common.TestCase):
         self.assertFalse(os.path.isfile(path_from_uri(backup_uri)),
                          "Backup file not deleted when project closed")
 
+    def test_backup_project_async(self):
+        self.setupApp(app=common.create_pitivi_mock())
+        self.manager.newBlankProject()
+        unused, xges_path = tempfile.mkstemp(suffix=".xges")
+        self.addCleanup(os.remove, xges_path)
+        self.manager.current_project.uri = Gst.filename_to_uri(xges_path)
+        backup_path = path_from_uri(self.manager._makeBackupURI(
+            self.manager.current_project.uri))
+
+        mainloop = common.create_main_loop()
+
+        def check_done_cb():
+            if self.manager.is_saving_backup():
+                return True
+            mainloop.quit()
+            return False
+
+        with mock.patch.object(self.manager.current_project, "save_snapshot",
+                               wraps=self.manager.current_project.save_snapshot) as save_snapshot:
+            self.assertTrue(self.manager.saveBackup())
+            # The second backup waits for the first one to be written.
+            self.assertTrue(self.manager.saveBackup())
+            self.assertTrue(self.manager.saveBackup())
+            self.assertEqual(save_snapshot.call_count, 1)
+
+            GLib.timeout_add(10, check_done_cb)
+            mainloop.run()
+            self.assertEqual(save_snapshot.call_count, 2)
+
+        with open(backup_path, "rb") as backup:
+            self.assertIn(b"<ges", backup.read())
+
+        self.manager.closeRunningProject()
+        self.assertFalse(os.path.isfile(backup_path))
+
+    def test_backup_deferred_while_playing(self):
+        self.setupApp(app=common.create_pitivi_mock())
+        self.manager.newBlankProject()
+        unused, xges_path = tempfile.mkstemp(suffix=".xges")
+        self.addCleanup(os.remove, xges_path)
+        project = self.manager.current_project
+        project.uri = Gst.filename_to_uri(xges_path)
+
+        mainloop = common.create_main_loop()
+        with mock.patch.object(project, "save_snapshot",
+                               wraps=project.save_snapshot) as save_snapshot:
+            with mock.patch.object(project.pipeline, "playing", return_value=True):
+                self.assertTrue(self.manager.saveBackup())
+                self.assertTrue(self.manager.saveBackup())
+            self.assertEqual(save_snapshot.call_count, 0)
+
+            project.pipeline.emit("state-change", Gst.State.PLAYING, Gst.State.PAUSED)
+            self.assertEqual(save_snapshot.call_count, 0)
+            project.pipeline.emit("state-change", Gst.State.PAUSED, Gst.State.PLAYING)
+            GLib.idle_add(mainloop.quit, priority=GLib.PRIORITY_LOW)
+            mainloop.run()
+            self.assertEqual(save_snapshot.call_count, 1)
+
+        self.manager.closeRunningProject()
+
+    def test_compressed_backup(self):
+        self.setupApp(app=common.create_pitivi_mock(compressBackups=True))
+        self.manager.newBlankProject()
+        unused, xges_path = tempfile.mkstemp(suffix=".xges")
+        self.addCleanup(os.remove, xges_path)
+        self.manager.current_project.uri = Gst.filename_to_uri(xges_path)
+        backup_path = path_from_uri(self.manager._makeBackupURI(
+            self.manager.current_project.uri))
+
+        self.assertTrue(self.manager.saveProject(backup=True))
+        self.assertTrue(is_compressed(backup_path))
+        self.assertIn(b"<ges", read_project_file(backup_path))
+        self.manager.closeRunningProject()
+
+    def test_compressed_project(self):
+        self.setupApp(app=common.create_pitivi_mock(compressProjects=True))
+        self.manager.newBlankProject()
+        unused, xges_path = tempfile.mkstemp(suffix=".xges")
+        self.addCleanup(os.remove, xges_path)
+        uri = Gst.filename_to_uri(xges_path)
+
+        self.assertTrue(self.manager.saveProject(uri=uri))
+        self.assertTrue(is_compressed(xges_path))
+        self.assertIn(b"<ges", read_project_file(xges_path))
+        self.manager.closeRunningProject()
+
+        mainloop = common.create_main_loop()
+        self.manager.connect("new-project-loaded", lambda *args: mainloop.quit())
+        self.assertTrue(self.manager.loadProject(uri))
+        mainloop.run()
+        self.assertEqual(self.manager.current_project.uri, uri)
+        # The uncompressed copy loaded by GES has been removed.
+        self.assertIsNone(self.manager._ProjectManager__decompressed_path)
+
 
 class TestProjectLoading(common.TestCase):
 
@@ -487,6 +586,40 @@ class TestProjectLoading(common.TestCase):
             mainloop.run()
         self.assertEqual(medialib._progressbar.get_fraction(), 1.0)
 
+    def test_loading_compressed_project_with_moved_asset(self):
+        """Loads a compressed project whose asset moved along with it."""
+        app = common.create_pitivi(proxyingStrategy=ProxyingStrategy.NOTHING)
+        project_manager = app.project_manager
+
+        mainloop = common.create_main_loop()
+
+        def missing_uri_cb(*args):
+            self.fail("The asset has not been found next to the project")
+
+        project_manager.connect("missing-uri", missing_uri_cb)
+        project_manager.connect("new-project-loaded", lambda *args: mainloop.quit())
+
+        with common.cloned_sample("1sec_simpsons_trailer.mp4") as tmpdir:
+            xges_path = os.path.join(tmpdir, "moved.xges")
+            with open(xges_path, "wb") as xges_file:
+                write_compressed(xges_file, b"""<ges version='0.3'>
+            <project properties='properties;' metadatas='metadatas;'>
+                <ressources>
+                    <asset id='file:///this/is/a/moved/1sec_simpsons_trailer.mp4' extractable-type-name='GESUriClip'
+                        properties='properties, supported-formats=(int)6, duration=(guint64)1228000000;' metadatas='metadatas' />
+                </ressources>
+            </project>
+            </ges>""")
+            self.assertTrue(project_manager.loadProject(Gst.filename_to_uri(xges_path)))
+            mainloop.run()
+
+            assets = project_manager.current_project.list_assets(GES.UriClip)
+            self.assertEqual([asset.props.id for asset in assets],
+                             [common.get_sample_uri("1sec_simpsons_trailer.mp4")])
+            # The uncompressed copy loaded by GES has been removed.
+            self.assertFalse([name for name in os.listdir(tmpdir)
+                              if name.startswith(".moved.xges.")])
+
     def test_loading_project_with_moved_assets_and_deleted_proxy(self):
         """Loads a project with moved asset as deleted proxy file."""
 
@@ -539,6 +672,48 @@ class TestProjectLoading(common.TestCase):
                              medialibrary.AssetThumbnail.IN_PROGRESS)
 
 
+class TestAssetsLoadingProgress(common.TestCase):
+
+    def test_totals(self):
+        def create_asset(duration, creation_progress):
+            asset = mock.Mock()
+            asset.get_duration.return_value = duration
+            asset.creation_progress = creation_progress
+            return asset
+
+        progress = AssetsLoadingProgress()
+        asset1 = create_asset(10, 0)
+        asset2 = create_asset(30, 100)
+        progress.update(asset1)
+        progress.update(asset2)
+        self.assertEqual(len(progress), 2)
+        self.assertEqual(progress.total_duration, 40)
+        self.assertEqual(progress.weighted_progress, 3000)
+        self.assertEqual(progress.unfinished, 1)
+
+        asset1.creation_progress = 50
+        asset1.get_duration.return_value = 20
+        progress.update(asset1)
+        self.assertEqual(len(progress), 2)
+        self.assertEqual(progress.total_duration, 50)
+        self.assertEqual(progress.weighted_progress, 4000)
+        self.assertEqual(progress.unfinished, 1)
+
+        asset1.creation_progress = 100
+        progress.update(asset1)
+        self.assertEqual(progress.unfinished, 0)
+
+        progress.discard(asset2)
+        progress.discard(asset2)
+        self.assertEqual(len(progress), 1)
+        self.assertEqual(progress.total_duration, 20)
+        self.assertEqual(progress.weighted_progress, 2000)
+
+        progress.clear()
+        self.assertEqual(len(progress), 0)
+        self.assertEqual(progress.total_duration, 0)
+
+
 class TestProjectSettings(common.TestCase):
 
     def testAudio(self):
@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.proxy module."""
+# pylint: disable=missing-docstring,protected-access,no-self-use
+import os
+import tempfile
+from unittest import mock
+
+from gi.repository import GES
+from gi.repository import Gst
+
+from pitivi.utils.proxy import PROXY_SEGMENT_DURATION
+from pitivi.utils.proxy import ProxyJobPriority
+from pitivi.utils.proxy import ProxyLadderSwitcher
+from pitivi.utils.proxy import ProxyLevel
+from pitivi.utils.proxy import SegmentedProxyJob
+from tests import common
+
+
+def create_asset_mock(name, duration, width=1920, height=1080):
+    asset = mock.Mock()
+    uri = "file:///%s" % name
+    asset.get_id.return_value = uri
+    asset.props.id = uri
+    asset.get_duration.return_value = duration
+    video_stream = mock.Mock()
+    video_stream.get_width.return_value = width
+    video_stream.get_height.return_value = height
+    asset.get_info.return_value.get_video_streams.return_value = [video_stream]
+    asset.get_info.return_value.get_audio_streams.return_value = []
+    return asset
+
+
+class TestProxyManagerScheduling(common.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.app = common.create_pitivi_mock(numTranscodingJobs=1)
+        self.manager = self.app.proxy_manager
+        self.running = self.manager._ProxyManager__running_transcoders
+        self.started = []
+
+        def start_transcoder(transcoder):
+            self.started.append(transcoder.props.src_uri)
+            self.running.append(transcoder)
+
+        def new_transcoder(asset, dest_uri):
+            transcoder = mock.Mock()
+            transcoder.props.src_uri = asset.get_id()
+            transcoder.props.dest_uri = dest_uri
+            return transcoder
+
+        self.proxies_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.proxies_dir.cleanup)
+
+        def get_proxy_uri(asset):
+            return Gst.filename_to_uri(os.path.join(
+                self.proxies_dir.name, os.path.basename(asset.get_id()) + ".proxy.mkv"))
+
+        for name, side_effect in (("_ProxyManager__startTranscoder", start_transcoder),
+                                  ("_ProxyManager__newTranscoder", new_transcoder),
+                                  ("getProxyUri", get_proxy_uri)):
+            patcher = mock.patch.object(self.manager, name, side_effect=side_effect)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def queue(self, *assets):
+        for asset in assets:
+            self.manager._ProxyManager__createTranscoder(asset)
+
+    def finish_running_job(self):
+        self.running.pop(0)
+        self.manager._ProxyManager__startPendingTranscoders()
+
+    def test_shortest_job_first(self):
+        first = create_asset_mock("first", 10 * Gst.SECOND)
+        very_long = create_asset_mock("long", 4 * 3600 * Gst.SECOND)
+        short = create_asset_mock("short", 30 * Gst.SECOND)
+        small = create_asset_mock("small", 60 * Gst.SECOND, 320, 240)
+        self.queue(first, very_long, short, small)
+        self.assertEqual(self.started, [first.get_id()])
+
+        for unused_i in range(3):
+            self.finish_running_job()
+        self.assertEqual(self.started, [first.get_id(), small.get_id(),
+                                        short.get_id(), very_long.get_id()])
+
+    def test_reprioritizing(self):
+        first = create_asset_mock("first", 10 * Gst.SECOND)
+        short = create_asset_mock("short", 30 * Gst.SECOND)
+        very_long = create_asset_mock("long", 4 * 3600 * Gst.SECOND)
+        self.queue(first, short, very_long)
+
+        # The long asset has been selected, it must be transcoded first.
+        self.manager.set_job_priority(very_long, ProxyJobPriority.HIGH)
+        self.finish_running_job()
+        self.assertEqual(self.started[-1], very_long.get_id())
+
+        self.finish_running_job()
+        self.assertEqual(self.started[-1], short.get_id())
+
+    def test_cancelling_starts_pending_job(self):
+        first = create_asset_mock("first", 10 * Gst.SECOND)
+        second = create_asset_mock("second", 10 * Gst.SECOND)
+        self.queue(first, second)
+        self.assertEqual(self.started, [first.get_id()])
+
+        self.manager.cancel_job(first)
+        self.assertEqual(self.started, [first.get_id(), second.get_id()])
+
+    def test_priorities_forgotten(self):
+        asset = create_asset_mock("asset", 10 * Gst.SECOND)
+        self.queue(asset)
+        self.manager.set_job_priority(asset, ProxyJobPriority.HIGH)
+        priorities = self.manager._ProxyManager__job_priorities
+        self.assertIn(asset.get_id(), priorities)
+
+        self.manager.cancel_job(asset)
+        self.assertNotIn(asset.get_id(), priorities)
+
+        # The priorities of the assets without a job are forgotten too.
+        self.manager.set_job_priority(asset, ProxyJobPriority.HIGH)
+        self.assertIn(asset.get_id(), priorities)
+        self.manager.cancel_job(asset)
+        self.assertNotIn(asset.get_id(), priorities)
+
+    def test_automatic_number_of_jobs(self):
+        self.app.settings.numTranscodingJobs = 0
+        max_jobs = self.manager._ProxyManager__getMaxRunningJobs
+        with mock.patch("multiprocessing.cpu_count", return_value=16):
+            with mock.patch("pitivi.utils.proxy.get_available_memory",
+                            return_value=None):
+                self.assertEqual(max_jobs(), 8)
+            with mock.patch("pitivi.utils.proxy.get_available_memory",
+                            return_value=1024 * 1024 * 1024):
+                self.assertEqual(max_jobs(), 2)
+            with mock.patch("pitivi.utils.proxy.get_available_memory",
+                            return_value=0):
+                self.assertEqual(max_jobs(), 1)
+
+    def test_segmented_job(self):
+        asset = create_asset_mock("long", 3 * PROXY_SEGMENT_DURATION + Gst.SECOND)
+        self.queue(asset)
+        self.assertTrue(self.manager.is_asset_queued(asset))
+        job = self.manager._ProxyManager__segmented_jobs[asset.get_id()]
+        self.assertEqual(len(job.segments), 4)
+        self.assertEqual(job.segments[-1],
+                         (3 * PROXY_SEGMENT_DURATION, 3 * PROXY_SEGMENT_DURATION + Gst.SECOND))
+
+        # The segments are transcoded one after the other.
+        self.assertEqual(len(self.running), 1)
+        self.assertEqual(self.running[0].props.dest_uri,
+                         Gst.filename_to_uri(job.segment_path(0) + ".part"))
+
+        # Cancelling keeps the segments already done.
+        open(job.segment_path(0) + ".part", "w").close()
+        job.segment_done(0)
+        self.manager.cancel_job(asset)
+        self.assertFalse(self.manager.is_asset_queued(asset))
+
+        self.running.clear()
+        self.queue(asset)
+        job = self.manager._ProxyManager__segmented_jobs[asset.get_id()]
+        self.assertEqual(job.done, {0})
+        self.assertEqual(job.resumed_duration, PROXY_SEGMENT_DURATION)
+        self.assertEqual(self.running[0].props.dest_uri,
+                         Gst.filename_to_uri(job.segment_path(1) + ".part"))
+
+    def test_parallel_segments(self):
+        self.app.settings.numTranscodingJobs = 3
+        asset = create_asset_mock("long", 5 * PROXY_SEGMENT_DURATION)
+        other = create_asset_mock("other", 10 * Gst.SECOND)
+        self.queue(asset, other)
+        job = self.manager._ProxyManager__segmented_jobs[asset.get_id()]
+        self.assertEqual(sorted(job.positions), [0, 1, 2])
+        self.assertEqual(len(self.running), 3)
+
+        # Finishing a segment queues the next one.
+        transcoder = self.running[1]
+        open(Gst.uri_get_location(transcoder.props.dest_uri), "w").close()
+        with mock.patch.object(transcoder.props.pipeline.props.audio_filter,
+                               "save_segment") as save_segment:
+            self.manager._ProxyManager__segmentDoneCb(transcoder, asset)
+        save_segment.assert_called_once_with(job.waveform_path(1),
+                                             PROXY_SEGMENT_DURATION,
+                                             2 * PROXY_SEGMENT_DURATION)
+        self.assertEqual(job.done, {1})
+        self.assertEqual(sorted(job.positions), [0, 2, 3])
+        # The shortest job goes first.
+        self.assertEqual(self.started[-1], other.get_id())
+
+        self.manager.cancel_job(asset)
+        self.assertEqual([transcoder.props.src_uri for transcoder in self.running],
+                         [other.get_id()])
+        self.app.settings.numSegmentTranscodingJobs = 2
+        self.queue(asset)
+        job = self.manager._ProxyManager__segmented_jobs[asset.get_id()]
+        self.assertEqual(sorted(job.positions), [0, 2])
+
+    def test_failed_segment(self):
+        self.app.settings.numTranscodingJobs = 2
+        asset = create_asset_mock("long", 3 * PROXY_SEGMENT_DURATION)
+        self.queue(asset)
+        job = self.manager._ProxyManager__segmented_jobs[asset.get_id()]
+        self.assertEqual(len(self.running), 2)
+        transcoder = self.running[1]
+        open(Gst.uri_get_location(transcoder.props.dest_uri), "w").close()
+        with mock.patch.object(transcoder.props.pipeline.props.audio_filter,
+                               "save_segment"):
+            self.manager._ProxyManager__segmentDoneCb(transcoder, asset)
+        self.assertEqual(job.done, {1})
+
+        failed = self.running[0]
+        open(Gst.uri_get_location(failed.props.dest_uri), "w").close()
+        error_cb = mock.Mock()
+        self.manager.connect("error-preparing-asset", error_cb)
+        self.manager._ProxyManager__transcoderErrorCb(failed, "error", None, asset)
+        error_cb.assert_called_once_with(self.manager, asset, None, "error")
+        # The other segment has been stopped.
+        self.assertFalse(self.running)
+        self.assertFalse(self.manager.is_asset_queued(asset))
+        self.assertFalse(os.path.exists(Gst.uri_get_location(failed.props.dest_uri)))
+
+        # Retrying resumes with the segments done.
+        self.queue(asset)
+        job = self.manager._ProxyManager__segmented_jobs[asset.get_id()]
+        self.assertEqual(job.done, {1})
+        self.assertEqual(sorted(job.positions), [0, 2])
+
+
+def create_stream_info_mock(caps):
+    stream_info = mock.Mock()
+    stream_info.get_caps.return_value = Gst.Caps.from_string(caps)
+    return stream_info
+
+
+class TestProxyManagerCapabilities(common.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.manager = common.create_pitivi_mock().proxy_manager
+
+    def test_encoding_profile_loaded_once(self):
+        target_file = self.manager._ProxyManager__encoding_target_file
+        get_profile = self.manager._ProxyManager__getEncodingProfile
+        with mock.patch("gi.repository.GstPbutils.EncodingTarget.load_from_file") as load:
+            profile1 = get_profile(target_file)
+            profile2 = get_profile(target_file)
+        self.assertFalse(load.called)
+        # The transcoders get their own copy of the profile.
+        self.assertIsNot(profile1, profile2)
+        self.assertTrue(profile1.is_equal(profile2))
+
+    def test_decisions_by_fingerprint(self):
+        def create_asset(codec_data):
+            asset = mock.Mock()
+            info = asset.get_info.return_value
+            info.get_stream_info.return_value = create_stream_info_mock("video/quicktime")
+            info.get_audio_streams.return_value = [
+                create_stream_info_mock("audio/mpeg, mpegversion=(int)1, layer=(int)3")]
+            info.get_video_streams.return_value = [
+                create_stream_info_mock("video/x-h264, codec_data=(buffer)%s" % codec_data)]
+            return asset
+
+        matches = self.manager._assetMatchesEncodingFormat
+        with mock.patch.object(self.manager, "_assetMatchesEncodingFormat",
+                               side_effect=matches) as matches_spy:
+            self.assertTrue(self.manager.isAssetFormatWellSupported(create_asset("0123")))
+            calls = matches_spy.call_count
+            self.assertGreater(calls, 0)
+            # Only the codec data differs.
+            self.assertTrue(self.manager.isAssetFormatWellSupported(create_asset("4567")))
+            self.assertEqual(matches_spy.call_count, calls)
+
+
+class TestProxyLadder(common.TestCase):
+
+    def test_ladder_uris(self):
+        manager = common.create_pitivi_mock().proxy_manager
+        with tempfile.NamedTemporaryFile(suffix=".mov") as source:
+            source.write(b"1234")
+            source.flush()
+            asset = create_asset_mock(source.name, Gst.SECOND)
+            asset.get_id.return_value = asset.props.id = Gst.filename_to_uri(source.name)
+            for level in (ProxyLevel.FULL, ProxyLevel.HALF, ProxyLevel.QUARTER):
+                proxy = mock.Mock()
+                proxy.props.id = manager.getProxyUri(asset, level)
+                self.assertTrue(manager.is_proxy_asset(proxy))
+                self.assertEqual(manager.getTargetUri(proxy), asset.get_id())
+            self.assertTrue(proxy.props.id.endswith(".4.quarter.proxy.mkv"))
+
+    def test_level_for_layers(self):
+        self.assertEqual(ProxyLadderSwitcher.level_for_layers(1), ProxyLevel.FULL)
+        self.assertEqual(ProxyLadderSwitcher.level_for_layers(2), ProxyLevel.HALF)
+        self.assertEqual(ProxyLadderSwitcher.level_for_layers(6), ProxyLevel.QUARTER)
+
+    def test_switching(self):
+        target = mock.Mock()
+        proxies = {level: mock.Mock() for level in (ProxyLevel.FULL, ProxyLevel.HALF)}
+        manager = mock.Mock()
+        manager.get_ladder_target.side_effect = \
+            lambda asset: target if asset in proxies.values() else None
+        # The quarter level is not available.
+        manager.get_ladder_proxy.side_effect = \
+            lambda asset, level: proxies.get(level, proxies[ProxyLevel.FULL])
+
+        clip = mock.Mock(spec=GES.UriClip)
+        clip.get_asset.return_value = proxies[ProxyLevel.FULL]
+        unproxied_clip = mock.Mock(spec=GES.UriClip)
+        pipeline = mock.Mock()
+        pipeline.props.timeline.get_layers.return_value = [mock.Mock()]
+        pipeline.props.timeline.get_layers.return_value[0].get_clips.return_value = \
+            [clip, unproxied_clip]
+        pipeline.getState.return_value = Gst.State.PLAYING
+
+        switcher = ProxyLadderSwitcher(manager, pipeline)
+        switcher.switch(ProxyLevel.HALF)
+        clip.set_asset.assert_called_once_with(proxies[ProxyLevel.HALF])
+        self.assertFalse(unproxied_clip.set_asset.called)
+        pipeline.commit_timeline.assert_called_once_with()
+
+        clip.get_asset.return_value = proxies[ProxyLevel.HALF]
+        clip.set_asset.reset_mock()
+        pipeline.commit_timeline.reset_mock()
+        with switcher.full_resolution(commit=False):
+            clip.set_asset.assert_called_once_with(proxies[ProxyLevel.FULL])
+            clip.get_asset.return_value = proxies[ProxyLevel.FULL]
+            # Playback load does not switch while saving.
+            switcher.switch(ProxyLevel.QUARTER)
+            self.assertEqual(switcher.level, ProxyLevel.FULL)
+        self.assertEqual(switcher.level, ProxyLevel.HALF)
+        clip.set_asset.assert_called_with(proxies[ProxyLevel.HALF])
+        self.assertFalse(pipeline.commit_timeline.called)
+
+    def test_switching_on_load_change(self):
+        pipeline = mock.Mock()
+        pipeline.get_mode.return_value = GES.PipelineFlags.FULL_PREVIEW
+        pipeline.getState.return_value = Gst.State.PLAYING
+        switcher = ProxyLadderSwitcher(mock.Mock(), pipeline)
+        state_change_cb = pipeline.connect.call_args[0][1]
+        layers = [1]
+
+        with mock.patch.object(switcher, "_ProxyLadderSwitcher__visibleVideoLayers",
+                               side_effect=lambda: layers[0]), \
+                mock.patch.object(switcher, "switch") as switch, \
+                mock.patch("gi.repository.GLib.idle_add",
+                           side_effect=lambda func: func() or 0):
+            state_change_cb(pipeline, Gst.State.PLAYING, Gst.State.PAUSED)
+            self.assertFalse(switch.called)
+
+            layers[0] = 2
+            state_change_cb(pipeline, Gst.State.PLAYING, Gst.State.PAUSED)
+            switch.assert_called_once_with(ProxyLevel.HALF)
+
+            # Pausing and playing again with the same load keeps the level.
+            switch.reset_mock()
+            state_change_cb(pipeline, Gst.State.PAUSED, Gst.State.PLAYING)
+            state_change_cb(pipeline, Gst.State.PLAYING, Gst.State.PAUSED)
+            self.assertFalse(switch.called)
+
+
+class TestSegmentedProxyJob(common.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.proxies_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.proxies_dir.cleanup)
+        self.proxy_uri = Gst.filename_to_uri(
+            os.path.join(self.proxies_dir.name, "asset.proxy.mkv"))
+        self.asset = create_asset_mock("asset", 25 * Gst.SECOND)
+
+    def create_job(self, segment_duration=10 * Gst.SECOND, encoding_format="jpeg"):
+        return SegmentedProxyJob(self.asset, self.proxy_uri, encoding_format,
+                                 segment_duration)
+
+    def transcode_segment(self, job, index):
+        open(Gst.uri_get_location(job.start_segment(index)), "w").close()
+        job.segment_done(index)
+
+    def test_resume(self):
+        job = self.create_job()
+        self.assertEqual(job.segments, [(0, 10 * Gst.SECOND),
+                                        (10 * Gst.SECOND, 20 * Gst.SECOND),
+                                        (20 * Gst.SECOND, 25 * Gst.SECOND)])
+        self.transcode_segment(job, 1)
+        job.start_segment(0)
+        job.positions[0] = 4 * Gst.SECOND
+        self.assertEqual(job.transcoded_duration(), 14 * Gst.SECOND)
+        self.assertEqual(job.pending_segments(), [2])
+
+        job = self.create_job()
+        self.assertEqual(job.done, {1})
+        self.assertEqual(job.resumed_duration, 10 * Gst.SECOND)
+        self.assertEqual(job.pending_segments(), [0, 2])
+        self.transcode_segment(job, 0)
+        self.transcode_segment(job, 2)
+        self.assertTrue(job.is_complete())
+
+    def test_missing_segment(self):
+        job = self.create_job()
+        self.transcode_segment(job, 0)
+        self.transcode_segment(job, 1)
+        os.remove(job.segment_path(0))
+
+        job = self.create_job()
+        self.assertEqual(job.done, {1})
+
+    def test_discard_outdated_segments(self):
+        job = self.create_job()
+        self.transcode_segment(job, 0)
+
+        for job in (self.create_job(segment_duration=5 * Gst.SECOND),
+                    self.create_job(encoding_format="prores")):
+            self.assertEqual(job.done, set())
+            self.assertFalse(os.path.exists(job.directory))
+
+    def test_corrupted_manifest(self):
+        job = self.create_job()
+        self.transcode_segment(job, 0)
+        with open(job.manifest_path, "w") as manifest:
+            manifest.write("{")
+
+        job = self.create_job()
+        self.assertEqual(job.done, set())
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.proxystore module."""
+# pylint: disable=missing-docstring,protected-access,no-self-use
+import os
+import tempfile
+from unittest import mock
+
+from gi.repository import Gst
+
+from pitivi.utils import proxystore
+from pitivi.utils.misc import FileInfoCache
+from pitivi.utils.proxystore import ProxyStore
+from tests import common
+
+
+class TestProxyStore(common.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.store_dir = os.path.join(self.tmp_dir.name, "store")
+
+    def create_source(self, name, content=b"content"):
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, "wb") as source:
+            source.write(content)
+        return Gst.filename_to_uri(path)
+
+    def create_store(self):
+        return ProxyStore(self.store_dir, "proxy.mkv")
+
+    def test_fingerprints_are_cached(self):
+        store = self.create_store()
+        uri = self.create_source("a.mov")
+        with mock.patch.object(proxystore, "hash_file",
+                               wraps=proxystore.hash_file) as hash_file:
+            proxy_uri = store.proxy_uri(uri)
+            self.assertEqual(store.proxy_uri(uri), proxy_uri)
+            store.save_index()
+            self.assertEqual(self.create_store().proxy_uri(uri), proxy_uri)
+            self.assertEqual(hash_file.call_count, 1)
+
+        self.assertEqual(os.path.dirname(Gst.uri_get_location(proxy_uri)),
+                         store.directory)
+        self.assertTrue(proxy_uri.endswith(".proxy.mkv"))
+        self.assertEqual(self.create_store().target_uri(proxy_uri), uri)
+
+        # A modified file gets a new proxy.
+        self.create_source("a.mov", b"modified content")
+        self.assertNotEqual(store.proxy_uri(uri), proxy_uri)
+
+    def test_file_infos(self):
+        uri = self.create_source("a.mov")
+        file_infos = FileInfoCache()
+        store = ProxyStore(self.store_dir, "proxy.mkv", file_infos=file_infos)
+        with mock.patch.object(proxystore, "hash_file",
+                               wraps=proxystore.hash_file) as hash_file:
+            with mock.patch.object(file_infos, "query_stat",
+                                   wraps=file_infos.query_stat) as query_stat:
+                proxy_uri = store.proxy_uri(uri)
+                query_stat.assert_called_once_with(uri)
+            store.save_index()
+            # The files are identified the same way without the cache.
+            self.assertEqual(self.create_store().proxy_uri(uri), proxy_uri)
+            self.assertEqual(hash_file.call_count, 1)
+
+    def test_missing_source(self):
+        store = self.create_store()
+        uri = Gst.filename_to_uri(os.path.join(self.tmp_dir.name, "missing.mov"))
+        self.assertIsNone(store.proxy_uri(uri))
+
+    def test_duplicates_share_proxies(self):
+        store = self.create_store()
+        uri1 = self.create_source("a.mov")
+        uri2 = self.create_source("copy of a.mov")
+        other_uri = self.create_source("b.mov", b"other content")
+
+        proxy1 = store.proxy_uri(uri1)
+        proxy2 = store.proxy_uri(uri2)
+        other_proxy = store.proxy_uri(other_uri)
+        self.assertNotEqual(proxy1, proxy2)
+        self.assertEqual(store.target_uri(proxy2), uri2)
+        self.assertEqual(store.duplicates(proxy2), [])
+
+        with open(Gst.uri_get_location(proxy1), "wb") as proxy:
+            proxy.write(b"proxy")
+        self.assertEqual(store.duplicates(other_proxy), [])
+        duplicates = store.duplicates(proxy2)
+        self.assertEqual(duplicates, [(Gst.uri_get_location(uri1),
+                                       Gst.uri_get_location(proxy1))])
+        self.assertTrue(store.link_duplicate(uri2, proxy2, duplicates))
+        self.assertTrue(os.path.samefile(Gst.uri_get_location(proxy1),
+                                         Gst.uri_get_location(proxy2)))
+
+        # The variants are shared separately.
+        self.assertEqual(store.duplicates(store.proxy_uri(uri2, "half")), [])
+
+    def test_same_fingerprint_different_content(self):
+        store = self.create_store()
+        header = b"x" * 256 * 1024
+        uri1 = self.create_source("a.mov", header + b"a")
+        uri2 = self.create_source("b.mov", header + b"b")
+        self.assertEqual(store.fingerprint(uri1), store.fingerprint(uri2))
+
+        with open(Gst.uri_get_location(store.proxy_uri(uri1)), "wb") as proxy:
+            proxy.write(b"proxy")
+        proxy2 = store.proxy_uri(uri2)
+        duplicates = store.duplicates(proxy2)
+        self.assertEqual(len(duplicates), 1)
+        self.assertFalse(store.link_duplicate(uri2, proxy2, duplicates))
+
+    def test_proxy_manager_uses_store(self):
+        app = common.create_pitivi_mock(proxyStoreDir=self.store_dir)
+        manager = app.proxy_manager
+        uri = self.create_source("a.mov")
+        asset = mock.Mock()
+        asset.get_id.return_value = uri
+
+        proxy = mock.Mock()
+        proxy.props.id = manager.getProxyUri(asset)
+        self.assertTrue(proxy.props.id.startswith(Gst.filename_to_uri(self.store_dir)))
+        self.assertTrue(manager.is_proxy_asset(proxy))
+        self.assertEqual(manager.getTargetUri(proxy), uri)
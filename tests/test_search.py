@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the utils.search module."""
+# pylint: disable=missing-docstring,protected-access,no-self-use
+from pitivi.utils.search import SearchIndex
+from pitivi.utils.search import tokenize
+from tests import common
+
+
+class TestSearchIndex(common.TestCase):
+
+    def create_index(self):
+        index = SearchIndex()
+        index.add("beach", "/home/me/Été à la plage.MOV\n12 seconds\nH.264")
+        index.add("interview", "/home/me/interview_take2.mkv\n3 minutes\nVorbis")
+        index.add("music", "/home/me/song.ogg\nVorbis\nThe Artist")
+        return index
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Été à la plage.MOV"),
+                         ["ete", "a", "la", "plage", "mov"])
+        self.assertEqual(tokenize("DSC_0001.MOV"), ["dsc", "0001", "mov"])
+
+    def test_search(self):
+        index = self.create_index()
+        self.assertEqual(index.search(""), {"beach", "interview", "music"})
+        self.assertEqual(index.search("vorb"), {"interview", "music"})
+        self.assertEqual(index.search("ete"), {"beach"})
+        self.assertEqual(index.search("vorbis art"), {"music"})
+        self.assertEqual(index.search("ogg mkv"), set())
+        self.assertEqual(index.search("orbis"), set())
+        self.assertTrue(index.matches("music", "the SONG"))
+        self.assertFalse(index.matches("music", "interview"))
+
+    def test_refined_search(self):
+        index = self.create_index()
+        self.assertEqual(index.search("v"), {"interview", "music"})
+        self.assertEqual(index.search("vo"), {"interview", "music"})
+        self.assertEqual(index.search("vo art"), {"music"})
+        # A query which does not refine the previous one.
+        self.assertEqual(index.search("home"), {"beach", "interview", "music"})
+
+    def test_update(self):
+        index = self.create_index()
+        self.assertEqual(index.search("vorbis"), {"interview", "music"})
+        index.remove("music")
+        self.assertEqual(index.search("vorbis"), {"interview"})
+        index.add("interview", "/home/me/interview_take3.mkv")
+        self.assertEqual(index.search("vorbis"), set())
+        self.assertEqual(index.search("interview_take3"), {"interview"})
+        self.assertEqual(index.search("take3"), {"interview"})
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index._SearchIndex__words,
+                         sorted(index._SearchIndex__postings))
+
+        index.clear()
+        self.assertEqual(index.search("interview"), set())
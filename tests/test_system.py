@@ -18,8 +18,10 @@
 # Boston, MA 02110-1301, USA.
 """Tests for the utils.system module."""
 # pylint: disable=missing-docstring
+from unittest import mock
 from unittest import TestCase
 
+from pitivi.utils.system import get_available_memory
 from pitivi.utils.system import System
 
 
@@ -34,3 +36,14 @@ class TestSystem(TestCase):
         self.assertNotEqual(system.getUniqueFilename("a%/b"),
                             system.getUniqueFilename("a%37%3747b"))
         self.assertEqual("a b", system.getUniqueFilename("a b"))
+
+    def test_available_memory(self):
+        meminfo = "MemTotal:       16000000 kB\n" \
+            "MemFree:          500000 kB\n" \
+            "MemAvailable:    8000000 kB\n"
+        with mock.patch("builtins.open", mock.mock_open(read_data=meminfo)):
+            self.assertEqual(get_available_memory(), 8000000 * 1024)
+
+        with mock.patch("builtins.open", side_effect=OSError):
+            with mock.patch("os.sysconf", side_effect=[10, 4096]):
+                self.assertEqual(get_available_memory(), 10 * 4096)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Pitivi video editor
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+"""Tests for the timeline.skeleton module."""
+# pylint: disable=missing-docstring,protected-access,no-self-use
+import os
+import tempfile
+
+from pitivi.timeline.skeleton import TimelineSkeleton
+from pitivi.utils.compression import write_compressed
+from tests import common
+
+
+PROJECT = b"""<ges version='0.4'>
+  <project properties='properties;' metadatas='metadatas;'>
+    <timeline properties='properties;' metadatas='metadatas;'>
+      <track caps='video/x-raw(ANY)' track-type='4' track-id='0'/>
+      <layer priority='1'>
+        <clip id='2' asset-id='file:///a.ogg' type-name='GESUriClip' layer-priority='1' track-types='6' start='0' duration='10' inpoint='0' rate='0'/>
+      </layer>
+      <layer priority='0'>
+        <clip id='1' asset-id='file:///b.ogg' type-name='GESUriClip' layer-priority='0' track-types='6' start='20' duration='10' inpoint='0' rate='0'/>
+        <clip id='3' asset-id='crossfade' type-name='GESTransitionClip' layer-priority='0' track-types='6' start='5' duration='5' inpoint='0' rate='0'/>
+        <clip id='0' asset-id='file:///a.ogg' type-name='GESUriClip' layer-priority='0' track-types='6' start='0' duration='10' inpoint='0' rate='0'/>
+      </layer>
+    </timeline>
+  </project>
+</ges>
+"""
+
+
+class TestTimelineSkeleton(common.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = os.path.join(tmp_dir.name, "project.xges")
+
+    def check_skeleton(self, skeleton):
+        self.assertEqual(skeleton.layers, [[(0, 10), (20, 30)], [(0, 10)]])
+        self.assertEqual(skeleton.duration, 30)
+
+    def test_from_file(self):
+        with open(self.path, "wb") as project_file:
+            project_file.write(PROJECT)
+        self.check_skeleton(TimelineSkeleton.from_file(self.path))
+
+    def test_from_compressed_file(self):
+        with open(self.path, "wb") as project_file:
+            write_compressed(project_file, PROJECT)
+        self.check_skeleton(TimelineSkeleton.from_file(self.path))
+
+    def test_clips_between(self):
+        skeleton = TimelineSkeleton([[(0, 100), (50, 60), (200, 210)]])
+        self.assertEqual(skeleton.clips_between(0, 70, 150), [(0, 100)])
+        self.assertEqual(skeleton.clips_between(0, 55, 200), [(0, 100), (50, 60), (200, 210)])
+        self.assertEqual(skeleton.clips_between(0, 100, 200), [(200, 210)])
+        self.assertEqual(skeleton.clips_between(0, 211, 300), [])
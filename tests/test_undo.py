@@ -16,6 +16,7 @@
 # License along with this program; if not, write to the
 # Free Software Foundation, Inc., 51 Franklin St, Fifth Floor,
 # Boston, MA 02110-1301, USA.
+import time
 from unittest import mock
 
 from gi.repository import GES
@@ -407,6 +408,36 @@ class TestUndoableActionLog(common.TestCase):
         self.assertEqual(len(self.log.undo_stacks), 0)
         self.assertEqual(len(self.log.redo_stacks), 0)
 
+    def _commit_operation(self, name, num_actions=1):
+        with self.log.started(name):
+            for unused_i in range(num_actions):
+                self.log.push(mock.Mock(spec=UndoableAction))
+        return self.log.undo_stacks[-1]
+
+    def test_dirty_constant_time(self):
+        def measure():
+            start = time.monotonic()
+            for unused_i in range(1000):
+                self.log.checkpoint()
+                self.log.dirty()
+            return time.monotonic() - start
+
+        self._commit_operation("meh")
+        reference = measure()
+
+        for unused_i in range(100000):
+            with self.log.started("meh"):
+                self.log.push(UndoableAction())
+        self._commit_operation("meh")
+        self.assertEqual(len(self.log.undo_stacks), 100002)
+        self.assertLess(measure(), reference * 10 + 0.05)
+
+        self.assertFalse(self.log.dirty())
+        self.log.undo()
+        self.assertTrue(self.log.dirty())
+        self.log.redo()
+        self.assertFalse(self.log.dirty())
+
 
 class TestGObjectObserver(common.TestCase):
 
@@ -449,3 +480,23 @@ class TestPropertyChangedAction(common.TestCase):
 
         stack.push(PropertyChangedAction(mock.Mock(), "field", 0, 1))
         self.assertEqual(len(stack.done_actions), 3, stack.done_actions)
+
+    def test_coalescing(self):
+        stack = UndoableActionStack("dragging sliders")
+        gobject = mock.Mock()
+        for value in range(1, 1000):
+            stack.push(PropertyChangedAction(gobject, "posx", value - 1, value))
+            stack.push(PropertyChangedAction(gobject, "posy", -value + 1, -value))
+        self.assertEqual(len(stack.done_actions), 2, stack.done_actions)
+        posx, posy = stack.done_actions
+        self.assertEqual((posx.old_value, posx.new_value), (0, 999))
+        self.assertEqual((posy.old_value, posy.new_value), (0, -999))
+
+        # The changes are not merged across other actions.
+        other_action = mock.Mock(spec=UndoableAction)
+        other_action.coalesce_key.return_value = None
+        stack.push(other_action)
+        stack.push(PropertyChangedAction(gobject, "posx", 999, 1000))
+        self.assertEqual(len(stack.done_actions), 4, stack.done_actions)
+        self.assertEqual(posx.new_value, 999)
+        self.assertEqual(stack.done_actions[-1].new_value, 1000)
@@ -72,6 +72,34 @@ class TestProjectUndo(common.TestCase):
         self.assertTrue(self.action_log.has_assets_operations())
         self.assertEqual(len(self.project.list_assets(GES.Extractable)), 1)
 
+    def test_asset_added_undone_while_queued(self):
+        uris = [common.get_sample_uri("tears_of_steel.webm"),
+                common.get_sample_uri("1sec_simpsons_trailer.mp4")]
+        mainloop = common.create_main_loop()
+        self.app.settings.numDiscoveryJobs = 1
+
+        def loaded_cb(unused_project, unused_timeline):
+            self.project.addUris(uris)
+            # One file is being discovered and the other one is queued.
+            self.action_log.undo()
+
+        self.project.connect_after("loaded", loaded_cb)
+
+        def progress_cb(unused_project, progress, unused_estimated_time):
+            if progress == 100:
+                mainloop.quit()
+
+        self.project.connect_after("asset-loading-progress", progress_cb)
+
+        mainloop.run()
+
+        # The file being discovered has been removed once added.
+        self.assertEqual(self.project.list_assets(GES.Extractable), [])
+
+        self.action_log.redo()
+        mainloop.run()
+        self.assertEqual(len(self.project.list_assets(GES.Extractable)), 2)
+
     def test_use_proxy(self):
         # Import an asset.
         uris = [common.get_sample_uri("tears_of_steel.webm")]
@@ -897,6 +897,29 @@ class TestTimelineElementObserver(BaseTestUndoTimeline):
         self.action_log.redo()
         self.assertEqual(effect1.get_child_property("scratch-lines")[1], 0)
 
+    def test_child_property_changes_coalesced(self):
+        stacks = []
+        self.action_log.connect("commit", BaseTestUndoTimeline.commit_cb, stacks)
+
+        clip1 = GES.TitleClip()
+        self.layer.add_clip(clip1)
+        source = clip1.get_children(False)[0]
+
+        with self.action_log.started("drag sliders"):
+            for i in range(1, 100):
+                source.set_child_property("xpos", i / 100)
+                source.set_child_property("ypos", 1 - i / 100)
+
+        self.assertEqual(1, len(stacks))
+        self.assertEqual(2, len(stacks[0].done_actions), stacks[0].done_actions)
+
+        self.action_log.undo()
+        self.assertEqual(source.get_child_property("xpos")[1], 0.5)
+        self.assertEqual(source.get_child_property("ypos")[1], 0.5)
+        self.action_log.redo()
+        self.assertEqual(source.get_child_property("xpos")[1], 0.99)
+        self.assertAlmostEqual(source.get_child_property("ypos")[1], 0.01)
+
 
 class TestGObjectObserver(BaseTestUndoTimeline):
 